@@ -1,16 +1,7 @@
 import http.server
-import socketserver
 import webbrowser
 import os
-import sys
-from urllib.parse import urlparse, parse_qs
 import json
-import tempfile
-import zipfile
-from io import BytesIO
-import pandas as pd
-from bs4 import BeautifulSoup
-import gdown
 
 class SimpleHTMLServer:
     def __init__(self, port=8080):
@@ -61,7 +52,8 @@ class SimpleHTMLServer:
     
     def start(self):
         try:
-            with socketserver.TCPServer(("", self.port), self.handler) as httpd:
+            # One thread per connection, so a slow client does not hold up the others
+            with http.server.ThreadingHTTPServer(("", self.port), self.handler) as httpd:
                 print(f"🌐 Alternative server started at http://localhost:{self.port}")
                 print(f"📂 Serving from: {os.getcwd()}")
                 print(f"🛑 Press Ctrl+C to stop")
@@ -1,69 +1,166 @@
-from flask import Flask, render_template, request, jsonify, send_file
-from werkzeug.utils import secure_filename
-from io import StringIO, BytesIO
-from bs4 import BeautifulSoup
-import pandas as pd
-import zipfile
-import gdown
-import tempfile
+from flask import Flask, Response, abort, make_response, render_template, request, jsonify, send_file
+from functools import wraps
 import os
+import metrics
+import request_profile
+import zip_processing
+from table_cache import TableCache
+from result_store import ResultStore
+from excel_export import EXCEL_FILENAME, EXCEL_MIMETYPE, export_workbook, iter_file_chunks, remove_file
+from drive_download import open_drive_archive
+from table_payload import COLUMNAR, HTML, columnar_table, encode_json
+import static_assets
+
+# pandas, lxml and plotly are imported by the routes that use them, so the
+# server starts without loading them
 
 app = Flask(__name__)
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['UPLOAD_FOLDER'] = 'uploads'
-
-if not os.path.exists(app.config['UPLOAD_FOLDER']):
-    os.makedirs(app.config['UPLOAD_FOLDER'])
-
-def download_zip_from_drive(file_id):
-    try:
-        url = f"https://drive.google.com/uc?id={file_id}"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as tmp_file:
-            gdown.download(url, tmp_file.name, quiet=False)
-            with open(tmp_file.name, "rb") as f:
-                return BytesIO(f.read())
-    except Exception as e:
-        return None
-
-def extract_tables_from_html(html_content):
-    soup = BeautifulSoup(html_content, "html.parser")
-    tables = soup.find_all("table")
-    if tables:
-        try:
-            df = pd.read_html(StringIO(str(tables[0])))[0]
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = [' '.join(map(str, col)).strip() for col in df.columns]
-            df.iloc[0, 0] = str(df.iloc[0, 0]).replace('.', '').replace(')', '').replace('(', '-').replace(',', '')
-            for col in df.columns[1:]:
-                df[col] = df[col].astype(str).str.replace('.', '', regex=False)
-                df[col] = df[col].astype(str).str.replace(')', '', regex=False)
-                df[col] = df[col].astype(str).str.replace('(', '-', regex=False)
-                df[col] = df[col].astype(str).str.replace(',', '', regex=False)
-                df[col] = pd.to_numeric(df[col], errors="coerce")
-            return df
-        except Exception as e:
-            return f"Error reading table: {e}"
-    return "No tables found in HTML file."
+# Uploads are spooled to disk by Werkzeug and read in place, so this no
+# longer bounds memory per request
+app.config['MAX_CONTENT_LENGTH'] = 200 * 1024 * 1024  # 200MB max file size
+# index.html links the content-hashed assets built by static_assets.py
+app.jinja_env.globals.update(asset_url=static_assets.asset_url, image_set=static_assets.image_set)
+
+table_cache = TableCache('tables')
+result_store = ResultStore('tables')
+RESULT_EXPIRED_ERROR = 'These tables are no longer on the server, please load them again'
+INVALID_JSON_ERROR = 'The request body must be a JSON object'
+# Seconds browsers may reuse the chart template
+CHART_TEMPLATE_MAX_AGE = 86400
+
+def warm_up():
+    """Load the parser, renderer and chart modules and run them once, then start the extraction pool
+
+    Called by each production worker at boot (see gunicorn_conf.py).
+    """
+    from table_extract import WARM_UP_HTML, extract_tables_from_html
+    from table_render import rendered_table
+    from chart_factory import chart_specs, template_json
+
+    df = extract_tables_from_html(WARM_UP_HTML)
+    rendered_table(df)
+    columnar_table(df)
+    chart_specs(df)
+    template_json()
+    static_assets.manifest()
+    zip_processing.start_pool()
 
 def process_zip_file(zip_file):
-    html_tables = {}
-    try:
-        with zipfile.ZipFile(zip_file, "r") as zip_ref:
-            html_files = [f for f in zip_ref.namelist() if f.lower().endswith(".html")]
-            for html_file in html_files:
-                with zip_ref.open(html_file) as file:
-                    html_content = file.read().decode("utf-8")
-                    result = extract_tables_from_html(html_content)
-                    html_tables[html_file] = result
-    except zipfile.BadZipFile:
-        return None
-    return html_tables
+    from table_extract import extract_tables_from_html
+
+    # Unchanged statements come from the cache; large archives are spread
+    # over a process pool, results stay in archive order
+    return zip_processing.process_zip_file(zip_file, extract_tables_from_html, stream=True, cache=table_cache)
+
+def json_body():
+    """The request's JSON object, or None if the body is missing, not JSON or not an object"""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+def tables_response(tables):
+    """Tables as records, headers once plus value arrays with ?format=columnar,
+    or rendered on the server with ?format=html
+
+    The body is brotli/gzip compressed when the client accepts it.
+    """
+    import pandas as pd
+    from table_render import rendered_table
+
+    table_format = request.args.get('format')
+    tables_data = {}
+    for name, df in tables.items():
+        if not isinstance(df, pd.DataFrame):
+            tables_data[name] = {'error': str(df)}
+        elif table_format == COLUMNAR:
+            tables_data[name] = columnar_table(df)
+        elif table_format == HTML:
+            tables_data[name] = rendered_table(df)
+        else:
+            tables_data[name] = df.to_dict('records')
+    
+    # Kept server-side so /export_excel only needs the id
+    payload = {'tables': tables_data, 'result_id': result_store.put(tables)}
+    # Cells of each table that did not read as numbers (they are empty in the table)
+    payload['coerce_failures'] = {
+        name: df.attrs.get('coerce_failures', 0) for name, df in tables.items() if isinstance(df, pd.DataFrame)
+    }
+    body, headers = encode_json(payload, request.headers.get('Accept-Encoding'))
+    return Response(body, mimetype='application/json', headers=headers)
+
+def excel_response(tables):
+    """Stream the workbook from a temporary file instead of holding it in memory"""
+    path = export_workbook(tables)
+    response = Response(
+        iter_file_chunks(path),
+        mimetype=EXCEL_MIMETYPE,
+        headers={
+            'Content-Disposition': f'attachment; filename={EXCEL_FILENAME}',
+            'Content-Length': str(os.path.getsize(path)),
+        },
+    )
+    # The server closes every response, even one whose body was never read
+    response.call_on_close(lambda: remove_file(path))
+    return response
+
+def profiled(view):
+    """Profile requests carrying the admin profiling token; without FS_PROFILE_TOKEN the view is left as is"""
+    if not request_profile.ENABLED:
+        return view
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not request_profile.authorized(request.headers, request.args):
+            return view(*args, **kwargs)
+        with request_profile.RequestProfile(request.method, request.path) as profile:
+            response = make_response(view(*args, **kwargs))
+        if profile.id:
+            response.headers[request_profile.ID_HEADER] = profile.id
+        return response
+    return wrapper
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/static/dist/<path:filename>')
+def static_asset(filename):
+    """A content-hashed static file, pre-compressed if the client accepts it; browsers keep it for a year"""
+    asset = static_assets.dist_file(filename, request.headers.get('Accept-Encoding'))
+    if asset is None:
+        abort(404)
+    path, mimetype, headers = asset
+    if static_assets.not_modified(request.headers.get('If-None-Match'), headers['ETag']):
+        return Response(status=304, headers=headers)
+    response = send_file(path, mimetype=mimetype, conditional=False, etag=False)
+    response.headers.update(headers)
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Pipeline stage timings, byte and table counts in the Prometheus text format"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/profiles')
+def list_profiles():
+    """Stored request profiles, newest first; admin only"""
+    if not request_profile.authorized(request.headers, request.args):
+        abort(403)
+    return jsonify(request_profile.list_profiles())
+
+@app.route('/profiles/<profile_id>/<kind>')
+def download_profile(profile_id, kind):
+    """A profile's folded stacks ("cpu" or "memory") or its "meta" JSON; admin only"""
+    if not request_profile.authorized(request.headers, request.args):
+        abort(403)
+    path = request_profile.profile_path(profile_id, kind)
+    if path is None:
+        abort(404)
+    if kind == 'meta':
+        return send_file(path, mimetype='application/json')
+    return send_file(path, mimetype='text/plain', as_attachment=True, download_name=os.path.basename(path))
+
 @app.route('/upload', methods=['POST'])
+@profiled
 def upload_file():
     if 'file' not in request.files:
         return jsonify({'error': 'No file uploaded'})
@@ -73,82 +170,93 @@ def upload_file():
         return jsonify({'error': 'No file selected'})
     
     if file and file.filename.lower().endswith('.zip'):
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        
-        with open(file_path, 'rb') as f:
-            zip_file = BytesIO(f.read())
-        
-        tables = process_zip_file(zip_file)
-        os.remove(file_path)
+        # Read the archive straight from Werkzeug's spooled upload
+        tables = process_zip_file(file.stream)
         
         if tables is None:
             return jsonify({'error': 'Invalid ZIP file'})
         
-        tables_data = {}
-        for name, df in tables.items():
-            if isinstance(df, pd.DataFrame):
-                tables_data[name] = df.to_dict('records')
-            else:
-                tables_data[name] = {'error': str(df)}
-        
-        return jsonify({'tables': tables_data})
+        return tables_response(tables)
     
     return jsonify({'error': 'Please upload a ZIP file'})
 
 @app.route('/download_drive', methods=['POST'])
+@profiled
 def download_from_drive():
-    data = request.get_json()
+    data = json_body()
+    if data is None:
+        return jsonify({'error': INVALID_JSON_ERROR}), 400
     file_id = data.get('file_id', '')
     
     if not file_id:
         return jsonify({'error': 'No file ID provided'})
     
-    zip_file = download_zip_from_drive(file_id)
-    if zip_file is None:
-        return jsonify({'error': 'Failed to download from Google Drive'})
+    with open_drive_archive(file_id) as zip_file:
+        if zip_file is None:
+            return jsonify({'error': 'Failed to download from Google Drive'})
+        tables = process_zip_file(zip_file)
     
-    tables = process_zip_file(zip_file)
     if tables is None:
         return jsonify({'error': 'Invalid ZIP file'})
     
-    tables_data = {}
-    for name, df in tables.items():
-        if isinstance(df, pd.DataFrame):
-            tables_data[name] = df.to_dict('records')
-        else:
-            tables_data[name] = {'error': str(df)}
-    
-    return jsonify({'tables': tables_data})
+    return tables_response(tables)
 
 @app.route('/export_excel', methods=['POST'])
+@profiled
 def export_excel():
-    data = request.get_json()
-    tables_data = data.get('tables', {})
-    
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        for name, table_data in tables_data.items():
-            if 'error' not in table_data:
-                df = pd.DataFrame(table_data)
-                sheet_name = name[:31]
-                df.to_excel(writer, index=False, sheet_name=sheet_name)
-                
-                workbook = writer.book
-                worksheet = writer.sheets[sheet_name]
-                for i, col in enumerate(df.columns):
-                    column_len = max(df[col].astype(str).map(len).max(), len(str(col))) + 2
-                    align_format = workbook.add_format({'align': 'left' if i == 0 else 'right'})
-                    worksheet.set_column(i, i, column_len, align_format)
-    
-    output.seek(0)
-    return send_file(
-        output,
-        as_attachment=True,
-        download_name='all_tables.xlsx',
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+    data = json_body()
+    if data is None:
+        return jsonify({'error': INVALID_JSON_ERROR}), 400
+    if not data.get('result_id'):
+        # Older clients post the tables back
+        return excel_response(data.get('tables', {}))
+    return export_result(data['result_id'])
+
+@app.route('/export_excel/<result_id>')
+@profiled
+def export_result(result_id):
+    tables = result_store.get(result_id)
+    if tables is None:
+        return jsonify({'error': RESULT_EXPIRED_ERROR}), 404
+    return excel_response(tables)
+
+@app.route('/render/<result_id>')
+def render_table(result_id):
+    """Stream one stored table as the HTML the page would build, a chunk of rows at a time"""
+    import pandas as pd
+    from table_render import iter_browser_table
+
+    tables = result_store.get(result_id)
+    if tables is None:
+        return jsonify({'error': RESULT_EXPIRED_ERROR}), 404
+    df = tables.get(request.args.get('table', ''))
+    if not isinstance(df, pd.DataFrame):
+        return jsonify({'error': 'Table not found'}), 404
+    return Response(iter_browser_table(df), mimetype='text/html')
+
+@app.route('/charts/template')
+def chart_template():
+    """Styling shared by every chart spec; the same for all statements, so browsers cache it"""
+    from chart_factory import template_json
+
+    response = jsonify(template_json())
+    response.headers['Cache-Control'] = f'public, max-age={CHART_TEMPLATE_MAX_AGE}'
+    return response
+
+@app.route('/charts/<result_id>')
+def table_charts(result_id):
+    """Chart specs of one stored table for Plotly.js, to be drawn with /charts/template"""
+    import pandas as pd
+    from chart_factory import table_chart_specs
+
+    tables = result_store.get(result_id)
+    if tables is None:
+        return jsonify({'error': RESULT_EXPIRED_ERROR}), 404
+    df = tables.get(request.args.get('table', ''))
+    if not isinstance(df, pd.DataFrame):
+        return jsonify({'error': 'Table not found'}), 404
+    body, headers = encode_json({'charts': table_chart_specs(df)}, request.headers.get('Accept-Encoding'))
+    return Response(body, mimetype='application/json', headers=headers)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
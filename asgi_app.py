@@ -0,0 +1,392 @@
+"""Asyncio serving mode for the table extractor (run with ``python run.py --asgi``)
+
+Mirrors the routes and JSON of simple_app.py. Drive downloads and table
+extraction run on separate executors, so a slow download never holds up
+an upload and the event loop only waits on I/O.
+"""
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import wraps
+from importlib import import_module
+
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+from starlette.templating import Jinja2Templates
+
+import metrics
+import request_profile
+import simple_app
+import static_assets
+from drive_download import archive_digest, get_drive_cache
+from excel_export import EXCEL_FILENAME, EXCEL_MIMETYPE, export_workbook, iter_file_chunks, remove_file
+from table_payload import encode_json, format_tables
+from jobs import MAX_POLL_WAIT, QueueFull, StoredJob, spool_upload
+
+# Threads waiting on Google Drive; they are mostly idle on the network
+DOWNLOAD_THREADS = int(os.environ.get("FS_ASGI_DOWNLOAD_THREADS", "8"))
+# Seconds between checks while a job poll waits for new tables
+POLL_INTERVAL = 0.25
+# Threads coordinating extraction; the parsing itself runs on the process pool
+EXTRACT_THREADS = int(os.environ.get("FS_ASGI_EXTRACT_THREADS", str(os.cpu_count() or 1)))
+
+download_executor = ThreadPoolExecutor(DOWNLOAD_THREADS, thread_name_prefix="drive-download")
+extract_executor = ThreadPoolExecutor(EXTRACT_THREADS, thread_name_prefix="extract")
+
+templates = Jinja2Templates(directory="templates")
+templates.env.globals.update(asset_url=static_assets.asset_url, image_set=static_assets.image_set)
+
+
+class FlaskJSONResponse(JSONResponse):
+    """JSON encoded like Flask's jsonify (sorted keys), so clients see identical payloads"""
+
+    def render(self, content):
+        return json.dumps(content, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def encode_tables(payload, table_format, accept_encoding):
+    return encode_json(format_tables(payload, table_format), accept_encoding)
+
+
+async def tables_response(request, payload):
+    """Table payload response; rendering, serializing and compressing run on the extraction executor"""
+    body, headers = await run_in(
+        extract_executor, encode_tables, payload,
+        request.query_params.get('format'), request.headers.get('accept-encoding'),
+    )
+    return Response(body, media_type='application/json', headers=headers)
+
+
+async def json_body(request):
+    """The request's JSON object, or None if the body is missing, not JSON or not an object"""
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def store_tables(tables):
+    """Payload of extracted tables, stored for export; pickling them writes to disk"""
+    return simple_app.tables_result(simple_app.serialize_tables(tables))
+
+
+async def run_in(executor, func, *args):
+    profile = request_profile.current() if request_profile.ENABLED else None
+    if profile is not None:
+        # A profiled request is sampled in the threads doing its work
+        func = profile.traced(func)
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+async def lazy_import(name):
+    """Import a module on first use (pandas, plotly) without holding up the event loop"""
+    return await run_in(extract_executor, import_module, name)
+
+
+def profiled(handler):
+    """Profile requests carrying the admin profiling token; without FS_PROFILE_TOKEN the handler is left as is"""
+    if not request_profile.ENABLED:
+        return handler
+
+    @wraps(handler)
+    async def wrapper(request):
+        if not request_profile.authorized(request.headers, request.query_params):
+            return await handler(request)
+        # The event loop thread serves other requests too, so only executor work is sampled
+        with request_profile.RequestProfile(request.method, request.url.path, track=False) as profile:
+            response = await handler(request)
+        if profile.id:
+            response.headers[request_profile.ID_HEADER] = profile.id
+        return response
+    return wrapper
+
+
+def loop_time():
+    return asyncio.get_running_loop().time()
+
+
+async def fetch_drive_tables(file_id):
+    """Download off the event loop, then extract on the extraction executor; None if the download failed"""
+    path = await run_in(download_executor, get_drive_cache().fetch, file_id)
+    if path is None:
+        return None, None
+    return path, await run_in(extract_executor, simple_app.process_archive_path, path)
+
+
+async def index(request):
+    return templates.TemplateResponse(request, "index.html")
+
+
+async def static_asset(request):
+    asset = static_assets.dist_file(request.path_params['filename'], request.headers.get('accept-encoding'))
+    if asset is None:
+        return Response(status_code=404)
+    path, media_type, headers = asset
+    if static_assets.not_modified(request.headers.get('if-none-match'), headers['ETag']):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+async def metrics_endpoint(request):
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+async def list_profiles(request):
+    if not request_profile.authorized(request.headers, request.query_params):
+        return Response(status_code=403)
+    return FlaskJSONResponse(request_profile.list_profiles())
+
+
+async def download_profile(request):
+    if not request_profile.authorized(request.headers, request.query_params):
+        return Response(status_code=403)
+    kind = request.path_params['kind']
+    path = request_profile.profile_path(request.path_params['profile_id'], kind)
+    if path is None:
+        return Response(status_code=404)
+    if kind == 'meta':
+        return FileResponse(path, media_type='application/json')
+    return FileResponse(path, media_type='text/plain', filename=os.path.basename(path))
+
+
+@profiled
+async def upload_file(request):
+    content_length = int(request.headers.get("content-length") or 0)
+    if content_length > simple_app.app.config['MAX_CONTENT_LENGTH']:
+        return Response(status_code=413)
+
+    async with request.form() as form:
+        file = form.get('file')
+        if file is None or isinstance(file, str):
+            return FlaskJSONResponse({'error': 'No file uploaded'})
+        if file.filename == '':
+            return FlaskJSONResponse({'error': 'No file selected'})
+        if not file.filename.lower().endswith('.zip'):
+            return FlaskJSONResponse({'error': 'Please upload a ZIP file'})
+
+        # The upload is already spooled to disk; extraction reads it in place
+        tables = await run_in(extract_executor, simple_app.process_zip_file, file.file)
+
+    if tables is None:
+        return FlaskJSONResponse({'error': 'Invalid ZIP file'})
+    return await tables_response(request, await run_in(extract_executor, store_tables, tables))
+
+
+@profiled
+async def download_from_drive(request):
+    data = await json_body(request)
+    if data is None:
+        return FlaskJSONResponse({'error': simple_app.INVALID_JSON_ERROR}, status_code=400)
+    file_id = data.get('file_id', '').strip()
+
+    if not file_id:
+        return FlaskJSONResponse({'error': 'No file ID provided'})
+
+    file_id = simple_app.clean_drive_file_id(file_id)
+    if file_id is None:
+        return FlaskJSONResponse({'error': 'Invalid Google Drive URL format'})
+
+    path, tables = await fetch_drive_tables(file_id)
+    if path is None:
+        return FlaskJSONResponse({'error': simple_app.DRIVE_DOWNLOAD_ERROR})
+    if tables is None:
+        return FlaskJSONResponse({'error': 'Downloaded file is not a valid ZIP file'})
+    if not tables:
+        return FlaskJSONResponse({'error': 'No HTML files found in the ZIP archive'})
+    return await tables_response(request, await run_in(extract_executor, store_tables, tables))
+
+
+@profiled
+async def auto_load(request):
+    path = await run_in(download_executor, get_drive_cache().fetch, simple_app.DEFAULT_FILE_ID)
+    if path is None:
+        test_data = await run_in(extract_executor, simple_app.tables_result, simple_app.get_test_data())
+        return await tables_response(request, test_data)
+
+    digest = await run_in(extract_executor, archive_digest, path)
+    table_format = request.query_params.get('format')
+    not_modified = None
+    if request.method == 'GET':
+        known_etag = simple_app.auto_load_known_etag(request.headers.get('if-none-match'), digest, table_format)
+        if known_etag:
+            not_modified = Response(status_code=304, headers={'ETag': known_etag, 'Cache-Control': 'no-cache'})
+    if not_modified is not None and await run_in(extract_executor, simple_app.result_store.touch, digest):
+        return not_modified
+
+    tables = await run_in(extract_executor, simple_app.process_archive_path, path)
+    if not tables:
+        test_data = await run_in(extract_executor, simple_app.tables_result, simple_app.get_test_data())
+        return await tables_response(request, test_data)
+    tables_data = await run_in(extract_executor, simple_app.serialize_tables, tables)
+    await run_in(extract_executor, simple_app.result_store.put, tables_data, digest)
+    if not_modified is not None:
+        return not_modified
+    response = await tables_response(request, await run_in(extract_executor, simple_app.tables_payload, tables_data, digest))
+    if request.method == 'GET':
+        coding = response.headers.get('content-encoding')
+        response.headers['ETag'] = simple_app.auto_load_etag(digest, table_format, coding)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+async def excel_response(tables_data):
+    path = await run_in(extract_executor, export_workbook, tables_data, True)
+    return StreamingResponse(
+        iter_file_chunks(path),
+        media_type=EXCEL_MIMETYPE,
+        headers={
+            'Content-Disposition': f'attachment; filename={EXCEL_FILENAME}',
+            'Content-Length': str(os.path.getsize(path)),
+        },
+        # The body generator may not be closed when the stream ends early
+        background=BackgroundTask(remove_file, path),
+    )
+
+
+@profiled
+async def export_excel(request):
+    data = await json_body(request)
+    if data is None:
+        return FlaskJSONResponse({'error': simple_app.INVALID_JSON_ERROR}, status_code=400)
+    if not data.get('result_id'):
+        return await excel_response(data.get('tables', {}))
+    return await export_stored(data['result_id'])
+
+
+@profiled
+async def export_result(request):
+    return await export_stored(request.path_params['result_id'])
+
+
+async def export_stored(result_id):
+    tables_data = await run_in(extract_executor, simple_app.result_store.get, result_id)
+    if tables_data is None:
+        return FlaskJSONResponse({'error': simple_app.RESULT_EXPIRED_ERROR}, status_code=404)
+    return await excel_response(tables_data)
+
+
+async def render_table(request):
+    tables_data = await run_in(extract_executor, simple_app.result_store.get, request.path_params['result_id'])
+    if tables_data is None:
+        return FlaskJSONResponse({'error': simple_app.RESULT_EXPIRED_ERROR}, status_code=404)
+    table = tables_data.get(request.query_params.get('table', ''))
+    if not isinstance(table, list):
+        return FlaskJSONResponse({'error': 'Table not found'}, status_code=404)
+    table_render = await lazy_import('table_render')
+    # Starlette iterates a plain generator in its thread pool
+    return StreamingResponse(table_render.iter_browser_table(table), media_type='text/html')
+
+
+async def chart_template(request):
+    headers = {'Cache-Control': f'public, max-age={simple_app.CHART_TEMPLATE_MAX_AGE}'}
+    chart_factory = await lazy_import('chart_factory')
+    return FlaskJSONResponse(await run_in(extract_executor, chart_factory.template_json), headers=headers)
+
+
+async def table_charts(request):
+    tables_data = await run_in(extract_executor, simple_app.result_store.get, request.path_params['result_id'])
+    if tables_data is None:
+        return FlaskJSONResponse({'error': simple_app.RESULT_EXPIRED_ERROR}, status_code=404)
+    table = tables_data.get(request.query_params.get('table', ''))
+    if not isinstance(table, list):
+        return FlaskJSONResponse({'error': 'Table not found'}, status_code=404)
+    chart_factory = await lazy_import('chart_factory')
+    specs = await run_in(extract_executor, chart_factory.table_chart_specs, table)
+    return await tables_response(request, {'charts': specs})
+
+
+async def submit_job(request):
+    path = None
+    if request.headers.get('content-type', '').startswith('multipart/form-data'):
+        async with request.form() as form:
+            file = form.get('file')
+            if file is None or isinstance(file, str) or not file.filename.lower().endswith('.zip'):
+                return FlaskJSONResponse({'error': 'Please upload a ZIP file'}, status_code=400)
+            path = await run_in(extract_executor, spool_upload, file.file)
+        target, arg = simple_app.upload_job, path
+    else:
+        data = await json_body(request) or {}
+        file_id = simple_app.clean_drive_file_id((data.get('file_id') or '').strip() or simple_app.DEFAULT_FILE_ID)
+        if file_id is None:
+            return FlaskJSONResponse({'error': 'Invalid Google Drive URL format'}, status_code=400)
+        target, arg = simple_app.drive_job, file_id
+
+    try:
+        job = simple_app.job_queue.submit(target, arg)
+    except QueueFull as e:
+        if path:
+            os.unlink(path)
+        return FlaskJSONResponse({'error': str(e)}, status_code=503,
+                                 headers={'Retry-After': str(simple_app.JOB_RETRY_AFTER)})
+    return FlaskJSONResponse({'job_id': job.id, 'status': job.status}, status_code=202,
+                             headers={'Location': f'/jobs/{job.id}'})
+
+
+def _query_number(request, name, cast):
+    try:
+        return cast(request.query_params.get(name, 0))
+    except ValueError:
+        return 0
+
+
+async def job_status(request):
+    job = simple_app.job_queue.get(request.path_params['job_id'])
+    if job is None:
+        return FlaskJSONResponse({'error': 'Unknown job'}, status_code=404)
+
+    since = _query_number(request, 'since', int)
+    deadline = loop_time() + min(_query_number(request, 'wait', float), MAX_POLL_WAIT)
+    # Poll instead of parking a thread on the job's condition for the whole wait
+    while len(job.results) <= since and not job.finished and loop_time() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        if isinstance(job, StoredJob):
+            # Run by another worker: its progress is read back from disk
+            await run_in(download_executor, job.refresh)
+    return await tables_response(request, simple_app.job_state(job, since, request.query_params.get('format')))
+
+
+async def job_stream(request):
+    job = simple_app.job_queue.get(request.path_params['job_id'])
+    if job is None:
+        return FlaskJSONResponse({'error': 'Unknown job'}, status_code=404)
+
+    since = _query_number(request, 'since', int)
+    lines = (json.dumps(event, sort_keys=True) + '\n' for event in job.events(since))
+    return StreamingResponse(lines, media_type='application/x-ndjson')
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    download_executor.shutdown(wait=False, cancel_futures=True)
+    extract_executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/upload', upload_file, methods=['POST']),
+        Route('/download_drive', download_from_drive, methods=['POST']),
+        Route('/auto_load', auto_load, methods=['GET', 'POST']),
+        Route('/export_excel', export_excel, methods=['POST']),
+        Route('/export_excel/{result_id}', export_result),
+        Route('/render/{result_id}', render_table),
+        Route('/charts/template', chart_template),
+        Route('/charts/{result_id}', table_charts),
+        Route('/jobs', submit_job, methods=['POST']),
+        Route('/jobs/{job_id}', job_status),
+        Route('/jobs/{job_id}/stream', job_stream),
+        Route('/static/dist/{filename:path}', static_asset),
+        Route('/metrics', metrics_endpoint),
+        Route('/profiles', list_profiles),
+        Route('/profiles/{profile_id}/{kind}', download_profile),
+        Mount('/static', StaticFiles(directory='static'), name='static'),
+    ],
+    lifespan=lifespan,
+)
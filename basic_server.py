@@ -1,14 +1,7 @@
 #!/usr/bin/env python3
 import http.server
-import socketserver
 import webbrowser
 import os
-import json
-import zipfile
-import tempfile
-import urllib.request
-from urllib.parse import parse_qs, urlparse
-from io import BytesIO
 
 class TableExtractorServer(http.server.SimpleHTTPRequestHandler):
     def do_GET(self):
@@ -130,7 +123,7 @@ def start_server():
     # Try to find a free port
     for p in range(8080, 8090):
         try:
-            with socketserver.TCPServer(("", p), TableExtractorServer) as httpd:
+            with http.server.ThreadingHTTPServer(("", p), TableExtractorServer) as httpd:
                 port = p
                 break
         except OSError:
@@ -149,7 +142,8 @@ def start_server():
         print(f"Please open your browser and visit: http://localhost:{port}")
     
     try:
-        with socketserver.TCPServer(("", port), TableExtractorServer) as httpd:
+        # One thread per connection, so a slow client does not hold up the others
+        with http.server.ThreadingHTTPServer(("", port), TableExtractorServer) as httpd:
             print(f"\nServer is running successfully!")
             httpd.serve_forever()
     except KeyboardInterrupt:
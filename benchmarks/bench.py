@@ -0,0 +1,187 @@
+"""Benchmarks for the extraction, analysis, rendering and export pipeline
+
+Times each stage on synthetic statements (see generate.py), reports
+throughput and peak Python memory, and compares against a stored baseline:
+
+    python -m benchmarks.bench                  # run and compare with benchmarks/baseline.json
+    python -m benchmarks.bench --save-baseline  # record a new baseline
+    python -m benchmarks.bench --quick --only extract
+
+Exits with status 1 when a stage is slower (or uses more memory) than the
+baseline by more than ``--tolerance``. Timings depend on the machine, so
+record the baseline on the machine that runs the comparison.
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+# Run from the repository root with -m, or as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generate import statement_html, statement_zip  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# A stage regresses when it is this much slower, or uses this much more memory, than the baseline
+TOLERANCE = 0.25
+# Smaller memory increases are noise and never count as a regression
+MEMORY_NOISE_MB = 1.0
+CONFIG = {"statements": 100, "rows": 60, "years": 5, "multiindex": True, "repeat": 5}
+QUICK_CONFIG = {"statements": 20, "rows": 40, "years": 5, "multiindex": True, "repeat": 3}
+
+
+def build_cases(config):
+    """[(name, function, units, unit)] for every stage, on inputs generated from ``config``"""
+    import zip_processing
+    from chart_factory import chart_specs, figure_from_spec
+    from excel_export import export_workbook
+    from financial_metrics import statement_frame
+    from table_extract import extract_tables_from_html
+    from table_render import browser_table_html, create_growth_analysis_rows, statement_table_html
+
+    statements, rows, years = config["statements"], config["rows"], config["years"]
+    pages = [statement_html(rows, years, config["multiindex"], seed=i) for i in range(statements)]
+    archive = statement_zip(statements, rows, years, config["multiindex"])
+    tables = {f"C{i:05d}.html": extract_tables_from_html(page) for i, page in enumerate(pages)}
+    frames = [statement_frame(df) for df in tables.values()]
+    specs = [spec for frame in frames for spec in chart_specs(frame)]
+    table_rows = sum(len(df) for df in tables.values())
+
+    def extract(engine):
+        return lambda: [extract_tables_from_html(page, engine) for page in pages]
+
+    def process_zip(parallel):
+        return lambda: zip_processing.process_zip_file(io.BytesIO(archive), extract_tables_from_html, parallel=parallel)
+
+    def export():
+        os.unlink(export_workbook(tables))
+
+    return [
+        ("extract_tables_from_html[lxml]", extract("lxml"), statements, "statements"),
+        ("extract_tables_from_html[bs4]", extract("bs4"), statements, "statements"),
+        ("process_zip_file[serial]", process_zip(False), statements, "statements"),
+        ("process_zip_file[parallel]", process_zip(True), statements, "statements"),
+        ("create_growth_analysis_rows", lambda: [create_growth_analysis_rows(f) for f in frames], statements, "statements"),
+        ("chart_specs", lambda: [chart_specs(f) for f in frames], statements, "statements"),
+        ("figure_from_spec", lambda: [figure_from_spec(s) for s in specs], len(specs), "charts"),
+        ("statement_table_html", lambda: [statement_table_html(f) for f in frames], table_rows, "rows"),
+        ("browser_table_html", lambda: [browser_table_html(df) for df in tables.values()], table_rows, "rows"),
+        ("export_workbook", export, table_rows, "rows"),
+    ]
+
+
+def measure(func, units, repeat):
+    """Best and median wall time over ``repeat`` runs after a warm-up, then peak memory of one traced run
+
+    Memory is what Python allocates in this process; work done in the
+    parallel extraction's worker processes is not counted.
+    """
+    func()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    best = min(times)
+    return {
+        "seconds": best,
+        "median_seconds": statistics.median(times),
+        "throughput": units / best if best else float("inf"),
+        "peak_mb": peak / (1024 * 1024),
+    }
+
+
+def compare(result, baseline, tolerance):
+    """Relative change in time and memory against the baseline, and whether either regressed"""
+    time_change = result["seconds"] / baseline["seconds"] - 1
+    memory_change = result["peak_mb"] / baseline["peak_mb"] - 1 if baseline["peak_mb"] else 0.0
+    memory_regressed = memory_change > tolerance and result["peak_mb"] - baseline["peak_mb"] > MEMORY_NOISE_MB
+    return time_change, memory_change, time_change > tolerance or memory_regressed
+
+
+def load_baseline(path, config):
+    try:
+        with open(path, encoding="utf-8") as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline at {path}; record one with --save-baseline")
+        return None
+    if baseline.get("config") != config:
+        print(f"Baseline at {path} was recorded with {baseline.get('config')}, not {config}; not comparing")
+        return None
+    return baseline["results"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="smaller inputs, fewer repeats")
+    parser.add_argument("--only", help="run the stages whose name contains this text")
+    parser.add_argument("--statements", type=int)
+    parser.add_argument("--rows", type=int)
+    parser.add_argument("--years", type=int)
+    parser.add_argument("--flat-header", action="store_true", help="one header row instead of two")
+    parser.add_argument("--repeat", type=int)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    config = dict(QUICK_CONFIG if args.quick else CONFIG)
+    for key in ("statements", "rows", "years", "repeat"):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+    if args.flat_header:
+        config["multiindex"] = False
+
+    print(f"Python {platform.python_version()} on {platform.platform()}, {os.cpu_count()} CPUs; {config}")
+    baseline = None if args.save_baseline else load_baseline(args.baseline, config)
+
+    results = {}
+    regressions = []
+    print(f"\n{'stage':<32}{'best s':>9}{'median s':>10}{'throughput':>24}{'peak MB':>9}{'vs baseline':>20}")
+    for name, func, units, unit in build_cases(config):
+        if args.only and args.only not in name:
+            continue
+        result = measure(func, units, config["repeat"])
+        results[name] = result
+        change = ""
+        if baseline and name in baseline:
+            time_change, memory_change, regressed = compare(result, baseline[name], args.tolerance)
+            change = f"{time_change:+.0%} time {memory_change:+.0%} mem"
+            if regressed:
+                regressions.append(name)
+                change += " !"
+        throughput = f"{result['throughput']:,.0f} {unit}/s"
+        print(f"{name:<32}{result['seconds']:>9.3f}{result['median_seconds']:>10.3f}{throughput:>24}"
+              f"{result['peak_mb']:>9.1f}{change:>20}")
+
+    if args.save_baseline:
+        if args.only:
+            # Only the stages that ran are replaced
+            results = dict(load_baseline(args.baseline, config) or {}, **results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "python": platform.python_version(), "results": results}, f, indent=1, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif regressions:
+        print(f"\nSlower or larger than the baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Synthetic Fingate-style financial statements for the benchmarks
+
+Each statement is an HTML page whose first table has the Fingate layout: a
+"Fiscal Year End" / "Audit Status" header (two header rows, or one
+flattened row), a Legal Regulation row, then numbered line items with
+comma-grouped amounts and negatives in parentheses. The same arguments and
+seed always give the same bytes.
+
+    python -m benchmarks.generate statements.zip --statements 500 --rows 80
+"""
+import argparse
+import io
+import random
+import zipfile
+
+# The income statement lines; statements with more rows get "Other item" lines after them
+LINE_ITEMS = [
+    "1. Gross sales",
+    "2. Less deductions",
+    "3. Net revenue",
+    "4. Cost of goods sold",
+    "5. Gross profit",
+    "6. Financial income",
+    "7. Financial expenses",
+    "8. Of which: Interest expenses",
+    "9. Share of profit in associates",
+    "10. Selling expenses",
+    "11. General and administrative expenses",
+    "12. Net operating profit",
+    "13. Other income",
+    "14. Other expenses",
+    "15. Other profit",
+    "16. Profit before tax",
+    "17. Corporate income tax",
+    "18. Net profit after tax",
+]
+FIRST_YEAR = 2015
+
+
+def _amount(value):
+    if value is None:
+        return ""
+    return f"({-value:,})" if value < 0 else f"{value:,}"
+
+
+def statement_rows(rows, years, negative_share=0.15, missing_share=0.02, rnd=None):
+    """[label, amount, ...] lists for ``rows`` line items over ``years`` periods"""
+    rnd = rnd or random.Random(0)
+    revenue = [rnd.randint(10**9, 10**13)]
+    for _ in range(years - 1):
+        revenue.append(int(revenue[-1] * rnd.uniform(0.7, 1.5)))
+
+    result = []
+    for i in range(rows):
+        label = LINE_ITEMS[i] if i < len(LINE_ITEMS) else f"{i + 1}. Other item {i + 1}"
+        values = []
+        for year in range(years):
+            if label == "3. Net revenue":
+                value = revenue[year]
+            else:
+                value = int(revenue[year] * rnd.uniform(0.001, 0.6))
+                # Profit lines turn into losses now and then, which exercises LTP/PTL
+                if rnd.random() < negative_share:
+                    value = -value
+            values.append(None if rnd.random() < missing_share else value)
+        result.append([label] + values)
+    return result
+
+
+def statement_html(rows=60, years=5, multiindex=True, negative_share=0.15, seed=0):
+    """One statement page as HTML text"""
+    rnd = random.Random(seed)
+    periods = [f"31-Dec-{FIRST_YEAR + year}" for year in range(years)]
+    audit = ["Audited" if rnd.random() < 0.8 else "Unaudited" for _ in periods]
+    if multiindex:
+        header = (
+            "<tr><th>Fiscal Year End</th>" + "".join(f"<th>{p}</th>" for p in periods) + "</tr>"
+            + "<tr><th>Audit Status</th>" + "".join(f"<th>{a}</th>" for a in audit) + "</tr>"
+        )
+    else:
+        header = (
+            "<tr><th>Fiscal Year End/Audit Status</th>"
+            + "".join(f"<th>{p} {a}</th>" for p, a in zip(periods, audit)) + "</tr>"
+        )
+
+    body = ["<tr><td>Legal Regulation</td>" + "<td>200/2014/TT-BTC</td>" * years + "</tr>"]
+    for label, *values in statement_rows(rows, years, negative_share, rnd=rnd):
+        body.append(f"<tr><td>{label}</td>" + "".join(f"<td>{_amount(v)}</td>" for v in values) + "</tr>")
+
+    return (
+        "<html><head><meta charset=\"utf-8\"><title>Income statement</title></head><body>"
+        f"<div class=\"company\">Company {seed:05d}</div>"
+        f"<table class=\"statement\"><thead>{header}</thead><tbody>{''.join(body)}</tbody></table>"
+        "<table class=\"footer\"><tr><td>Source: FiinPro</td></tr></table>"
+        "</body></html>"
+    )
+
+
+def statement_zip(statements=100, rows=60, years=5, multiindex=True, negative_share=0.15, seed=0):
+    """A ZIP archive of ``statements`` statement pages, as bytes"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for i in range(statements):
+            html = statement_html(rows, years, multiindex, negative_share, seed=seed + i)
+            zip_file.writestr(f"C{seed + i:05d}.html", html)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", help="ZIP file to write")
+    parser.add_argument("--statements", type=int, default=100)
+    parser.add_argument("--rows", type=int, default=60)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--flat-header", action="store_true", help="one header row instead of two")
+    parser.add_argument("--negative-share", type=float, default=0.15)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    data = statement_zip(args.statements, args.rows, args.years, not args.flat_header, args.negative_share, args.seed)
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print(f"Wrote {args.statements} statements to {args.output} ({len(data) / 1024:,.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from financial_metrics import compute_metrics, statement_frame
+from numeric_clean import clean_numeric_columns
+import metrics
+
+# Statements whose chart specs and figures are kept in memory
+CHART_CACHE_SIZE = int(os.environ.get("FS_CHART_CACHE_SIZE", "256"))
+
+_AXIS_TITLE_FONT = {"size": 14, "color": "#0C4130"}
+_GRID_COLOR = "rgba(12, 65, 48, 0.1)"
+_AXIS_LINE_COLOR = "rgba(12, 65, 48, 0.3)"
+_TEXT_FONT = {"size": 10, "color": "#0C4130"}
+
+# Styling shared by every chart. Figures use it as their template and specs
+# leave it out, so it is built and sent once instead of once per chart.
+CHART_LAYOUT = {
+    "title": {"x": 0.5, "font": {"size": 18, "color": "#0C4130", "family": "Arial Black"}},
+    "plot_bgcolor": "rgba(248, 249, 250, 0.8)",
+    "paper_bgcolor": "rgba(255,255,255,0.95)",
+    "height": 450,
+    "margin": {"t": 70, "b": 50, "l": 50, "r": 50},
+    "legend": {
+        "orientation": "h",
+        "yanchor": "bottom",
+        "y": -0.15,
+        "xanchor": "center",
+        "x": 0.5,
+        "font": {"size": 12},
+        "bgcolor": "rgba(255,255,255,0.8)",
+        "bordercolor": "#E9ECEF",
+        "borderwidth": 1,
+    },
+    "xaxis": {"title": {"font": _AXIS_TITLE_FONT}, "gridcolor": _GRID_COLOR, "gridwidth": 1},
+    "yaxis": {"title": {"font": _AXIS_TITLE_FONT}, "gridcolor": _GRID_COLOR, "gridwidth": 1},
+}
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def chart_template():
+    """The shared template: Plotly's default one with CHART_LAYOUT on top, built once"""
+    global _template
+    with _template_lock:
+        if _template is None:
+            # Plotly is only loaded when a template or figure is needed, specs do without it
+            import plotly.graph_objects as go
+            import plotly.io as pio
+
+            template = go.layout.Template(pio.templates["plotly"])
+            template.layout.update(CHART_LAYOUT)
+            _template = template
+        return _template
+
+
+def template_json():
+    """The shared template as a plain dict, for Plotly.js"""
+    return chart_template().to_plotly_json()
+
+
+def _years(periods):
+    return [col.replace('31-Dec-', '').replace('31-Mar-', '') for col in periods]
+
+
+def _values(frame, key):
+    """A row as a JSON-safe list; NaN becomes null"""
+    values = frame.loc[key].to_numpy(dtype=float)
+    return [None if np.isnan(v) else v for v in values.tolist()]
+
+
+def _amount_bar(years, values, name, colorscale, line_color):
+    return {
+        "type": "bar",
+        "x": years,
+        "y": values,
+        "name": name,
+        "marker": {
+            "color": values,
+            "colorscale": colorscale,
+            "showscale": False,
+            "line": {"color": line_color, "width": 1},
+        },
+        "text": [f"{v:,.0f}" if v != 0 else "" for v in values],
+        "textposition": "outside",
+        "textfont": _TEXT_FONT,
+    }
+
+
+def _growth_line(years, growth, name, color, dash=None):
+    line = {"color": color, "width": 3, "shape": "spline"}
+    if dash:
+        line["dash"] = dash
+    return {
+        "type": "scatter",
+        "x": years,
+        "y": growth,
+        "name": name,
+        "line": line,
+        "marker": {"size": 8, "color": color, "line": {"color": "white", "width": 2}},
+        "mode": "lines+markers",
+        "connectgaps": False,
+        "xaxis": "x",
+        "yaxis": "y2",
+    }
+
+
+def _margin_area(years, margins, name, fillcolor):
+    return {
+        "type": "scatter",
+        "x": years + years[::-1],
+        "y": [0] * len(years) + margins[::-1],
+        "fill": "toself",
+        "fillcolor": fillcolor,
+        "line": {"color": "rgba(255,255,255,0)"},
+        "showlegend": False,
+        "name": name,
+    }
+
+
+def _margin_line(years, margins, name, color, textposition):
+    return {
+        "type": "scatter",
+        "x": years,
+        "y": margins,
+        "name": name,
+        "line": {"color": color, "width": 4, "shape": "spline"},
+        "marker": {"size": 12, "color": color, "line": {"color": "white", "width": 3}},
+        "mode": "lines+markers+text",
+        "text": [f"{m:.1f}%" for m in margins],
+        "textposition": textposition,
+        "textfont": _TEXT_FONT,
+    }
+
+
+def _axis(title, **style):
+    return {"title": {"text": title}, **style}
+
+
+def _performance_spec(statement_metrics, years):
+    revenue = _values(statement_metrics.values, "net_revenue")
+    profit = _values(statement_metrics.values, "net_profit_after_tax")
+    return {
+        "name": "Revenue & Profit Analysis",
+        "data": [
+            _amount_bar(years, revenue, "📈 Net Revenue", [[0, '#E8F5E8'], [1, '#08C179']], '#06A85C'),
+            _amount_bar(years, profit, "💰 Net Profit", [[0, '#E6F2F2'], [1, '#0C4130']], '#0A3A2A'),
+            # Growth rates; null where there is no previous year to compare with
+            _growth_line(years, _values(statement_metrics.growth, "net_revenue"), "📊 Revenue Growth (%)", "#B78D51"),
+            _growth_line(years, _values(statement_metrics.growth, "net_profit_after_tax"), "📈 Profit Growth (%)", "#FF6B35", "dot"),
+        ],
+        "layout": {
+            "title": {"text": "💼 Financial Performance Overview"},
+            "barmode": "group",
+            # Growth rates on a secondary y-axis on the right
+            "xaxis": _axis("📅 Year", anchor="y", domain=[0.0, 0.94]),
+            "yaxis": _axis("💵 Amount (VND)", anchor="x", domain=[0.0, 1.0]),
+            "yaxis2": {
+                "anchor": "x",
+                "overlaying": "y",
+                "side": "right",
+                "title": {"text": "📊 Growth Rate (%)", "font": {"size": 14, "color": "#B78D51"}},
+                "gridcolor": "rgba(183, 141, 81, 0.1)",
+                "gridwidth": 1,
+            },
+        },
+    }
+
+
+def _margin_spec(statement_metrics, years):
+    margins = statement_metrics.margins.fillna(0)
+    gross = margins.loc["gross_margin"].tolist()
+    net = margins.loc["net_margin"].tolist()
+    return {
+        "name": "Profitability Analysis",
+        "data": [
+            _margin_area(years, gross, "Gross Margin Area", "rgba(8, 193, 121, 0.1)"),
+            _margin_area(years, net, "Net Margin Area", "rgba(12, 65, 48, 0.15)"),
+            _margin_line(years, gross, "📊 Gross Margin (%)", "#08C179", "top center"),
+            _margin_line(years, net, "💎 Net Margin (%)", "#0C4130", "bottom center"),
+        ],
+        "layout": {
+            "title": {"text": "📈 Profitability Margin Trends"},
+            "hovermode": "x unified",
+            "xaxis": _axis("📅 Year", showline=True, linecolor=_AXIS_LINE_COLOR),
+            "yaxis": _axis("📊 Margin Percentage (%)", showline=True, linecolor=_AXIS_LINE_COLOR),
+            # Zero reference line
+            "shapes": [{
+                "type": "line", "xref": "x domain", "yref": "y", "x0": 0, "x1": 1, "y0": 0, "y1": 0,
+                "line": {"color": "rgba(128, 128, 128, 0.5)", "dash": "dot"},
+            }],
+            "annotations": [{
+                "text": "Break-even", "showarrow": False, "xref": "x domain", "yref": "y",
+                "x": 1, "y": 0, "xanchor": "right", "yanchor": "bottom",
+            }],
+        },
+    }
+
+
+def chart_specs(df, items=None, statement_metrics=None):
+    """JSON-ready {"name", "data", "layout"} for each chart of a statement
+
+    Layouts only hold what differs from the shared template (see
+    ``template_json``). Returns an empty list when the statement has fewer
+    than two periods or lacks the line items a chart needs.
+    """
+    if df.empty or len(df) < 2:
+        return []
+    if statement_metrics is None:
+        statement_metrics = compute_metrics(df, items)
+    if len(statement_metrics.periods) < 2:
+        return []
+
+    years = _years(statement_metrics.periods)
+    specs = []
+    if "net_revenue" in statement_metrics and "net_profit_after_tax" in statement_metrics:
+        specs.append(_performance_spec(statement_metrics, years))
+    if "gross_margin" in statement_metrics and "net_margin" in statement_metrics:
+        specs.append(_margin_spec(statement_metrics, years))
+    return specs
+
+
+def figure_from_spec(spec):
+    """Build a Plotly figure from a chart spec with the shared template"""
+    import plotly.graph_objects as go
+
+    fig = go.Figure(data=spec["data"], layout=spec["layout"])
+    fig.layout.template = chart_template()
+    return fig
+
+
+def statement_digest(df):
+    """Hash of a statement's labels, headers and values"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class ChartCache:
+    """Chart specs, and the figures built from them, by statement content hash
+
+    The same statement in a newer archive, or in another company's
+    session, reuses its charts instead of rebuilding them.
+    """
+
+    def __init__(self, max_entries=CHART_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, df, items, statement_metrics):
+        key = statement_digest(df)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        entry = {"specs": chart_specs(df, items, statement_metrics), "figures": None}
+        with self._lock:
+            entry = self._entries.setdefault(key, entry)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def specs(self, df, items=None, statement_metrics=None):
+        return self._entry(df, items, statement_metrics)["specs"]
+
+    def figures(self, df, items=None, statement_metrics=None):
+        """[(name, figure)] for the statement; figures are built once and shared, do not modify them"""
+        entry = self._entry(df, items, statement_metrics)
+        if entry["figures"] is None:
+            entry["figures"] = [(spec["name"], figure_from_spec(spec)) for spec in entry["specs"]]
+        return entry["figures"]
+
+
+chart_cache = ChartCache()
+
+
+def table_chart_specs(table):
+    """Chart specs for a stored table: a DataFrame or a list of records with text amounts"""
+    if isinstance(table, list):
+        if not table:
+            return []
+        table, failed = clean_numeric_columns(pd.DataFrame.from_records(table, columns=list(table[0])))
+        # Those cells are left out of the charts
+        metrics.COERCE_FAILURES.inc(failed, stage="chart")
+    return chart_cache.specs(statement_frame(table))
@@ -0,0 +1,384 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from io import BytesIO
+
+import metrics
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Point at a local stand-in to test without Google Drive
+DRIVE_BASE_URL = os.environ.get("FS_DRIVE_BASE_URL", "https://drive.google.com").rstrip("/")
+DOWNLOAD_CACHE_DIR = os.environ.get("FS_DOWNLOAD_CACHE_DIR", os.path.join("cache", "drive"))
+# Seconds a downloaded archive is served without asking Drive again
+DOWNLOAD_TTL = float(os.environ.get("FS_DOWNLOAD_TTL", "300"))
+# Seconds after which a cached archive is downloaded again when Drive's
+# answer cannot tell whether it changed (no ETag, no size)
+DOWNLOAD_MAX_AGE = float(os.environ.get("FS_DOWNLOAD_MAX_AGE", "86400"))
+# Archives kept on disk; the least recently used ones are removed
+DOWNLOAD_CACHE_FILES = int(os.environ.get("FS_DOWNLOAD_CACHE_FILES", "20"))
+PROBE_TIMEOUT = 15
+# Seconds a download method that failed is tried after the others
+METHOD_RETRY_AFTER = float(os.environ.get("FS_DOWNLOAD_RETRY_AFTER", "600"))
+
+
+class MappedFile:
+    """Read-only file object over an mmap (mmap has no seekable() before Python 3.13)"""
+
+    def __init__(self, mapped):
+        self._mapped = mapped
+
+    def seekable(self):
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self._mapped, name)
+
+
+def _download_url(file_id, base_url):
+    return f"{base_url}/uc?id={file_id}&export=download"
+
+
+# Each method returns None on failure, or the response headers worth keeping
+# ({"etag": ...}) when the file was downloaded
+
+def _download_with_gdown(file_id, path, base_url):
+    # Method 1: Try gdown with direct download
+    import gdown
+    url = _download_url(file_id, base_url)
+    print(f"Attempting download from: {url}")
+    gdown.download(url, path, quiet=False)
+    return {} if os.path.exists(path) and os.path.getsize(path) > 0 else None
+
+
+def _download_with_gdown_fuzzy(file_id, path, base_url):
+    # Method 2: Try alternative gdown approach
+    import gdown
+    print(f"Trying alternative download for file ID: {file_id}")
+    gdown.download(f"{base_url}/file/d/{file_id}/view?usp=sharing", path, quiet=False, fuzzy=True)
+    return {} if os.path.exists(path) and os.path.getsize(path) > 0 else None
+
+
+def _open_download(file_id, base_url, headers=None, timeout=None):
+    """Streaming response for the file itself, past Drive's virus scan warning for large files"""
+    import requests
+    session = requests.Session()
+
+    # First request to get confirmation token
+    response = session.get(_download_url(file_id, base_url), headers=headers, stream=True, timeout=timeout)
+
+    # Check for virus scan warning
+    token = None
+    for key, value in response.cookies.items():
+        if key.startswith('download_warning'):
+            token = value
+            break
+
+    if token:
+        response.close()
+        params = {'id': file_id, 'confirm': token, 'export': 'download'}
+        response = session.get(f"{base_url}/uc", params=params, headers=headers, stream=True, timeout=timeout)
+    return response
+
+
+def _is_html(response):
+    # An error or warning page rather than the archive
+    return response.headers.get("Content-Type", "").startswith("text/html")
+
+
+def _download_with_requests(file_id, path, base_url):
+    # Method 3: Direct requests approach
+    with _open_download(file_id, base_url) as response:
+        if response.status_code != 200 or response.headers.get('content-length', '0') == '0':
+            return None
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+        etag = None if _is_html(response) else response.headers.get("ETag")
+    return {"etag": etag} if os.path.getsize(path) > 0 else None
+
+
+DOWNLOAD_METHODS = (
+    ("gdown", _download_with_gdown),
+    ("gdown_fuzzy", _download_with_gdown_fuzzy),
+    ("requests", _download_with_requests),
+)
+
+# Per method, seconds its last successful download took and when it last failed;
+# the fastest goes first, and methods that failed recently go last
+_method_timings = {}
+_method_failures = {}
+_method_lock = threading.Lock()
+
+
+def _method_order():
+    position = {name: i for i, (name, _) in enumerate(DOWNLOAD_METHODS)}
+    now = time.time()
+    with _method_lock:
+        timings = dict(_method_timings)
+        failures = dict(_method_failures)
+
+    def key(method):
+        name = method[0]
+        failed_recently = now - failures.get(name, float("-inf")) < METHOD_RETRY_AFTER
+        return failed_recently, timings.get(name, float("inf")), position[name]
+    return sorted(DOWNLOAD_METHODS, key=key)
+
+
+def download_zip_to_file(file_id, path=None, base_url=None):
+    """Download a Drive file trying each method in turn
+
+    Returns (path, method name, ETag of the download or None), or
+    (None, None, None). Without ``path`` a temporary file is created,
+    which the caller owns.
+    """
+    base_url = base_url or DRIVE_BASE_URL
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".zip")
+        os.close(fd)
+
+    for name, method in _method_order():
+        started = time.perf_counter()
+        try:
+            downloaded = method(file_id, path, base_url)
+            if downloaded is not None:
+                elapsed = time.perf_counter() - started
+                with _method_lock:
+                    _method_timings[name] = elapsed
+                    _method_failures.pop(name, None)
+                metrics.DRIVE_DOWNLOAD_SECONDS.observe(elapsed, method=name, outcome="ok")
+                metrics.add_bytes("drive_download", os.path.getsize(path))
+                return path, name, downloaded.get("etag")
+        except Exception as e:
+            print(f"Download method {name} failed: {e}")
+        metrics.DRIVE_DOWNLOAD_SECONDS.observe(time.perf_counter() - started, method=name, outcome="failed")
+        # Do not prefer a method that just failed, until METHOD_RETRY_AFTER has passed
+        with _method_lock:
+            _method_failures[name] = time.time()
+
+    os.unlink(path)
+    return None, None, None
+
+
+class DriveDownloadCache:
+    """Keeps downloaded Drive archives on disk, keyed by file id
+
+    Within the TTL the cached file is used as is. After it, Drive is asked
+    again with If-None-Match and the stored size; the archive is only
+    downloaded again if it changed, or if Drive's answer cannot tell and
+    the copy is older than ``max_age``. Concurrent requests for the same id
+    share one download.
+    """
+
+    def __init__(self, directory=DOWNLOAD_CACHE_DIR, ttl=DOWNLOAD_TTL, max_files=DOWNLOAD_CACHE_FILES,
+                 base_url=None, max_age=DOWNLOAD_MAX_AGE):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_files = max_files
+        self.base_url = base_url or DRIVE_BASE_URL
+        self._lock = threading.Lock()
+        self._inflight = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, file_id):
+        # Drive ids are URL-safe; anything else is not used as a file name
+        safe_id = file_id if re.fullmatch(r"[A-Za-z0-9_-]+", file_id) else re.sub(r"\W", "_", file_id)
+        base = os.path.join(self.directory, safe_id)
+        return base + ".zip", base + ".json"
+
+    def _load_meta(self, file_id):
+        archive_path, meta_path = self._paths(file_id)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(archive_path) or os.path.getsize(archive_path) != meta.get("size"):
+            return None
+        return meta
+
+    def _save_meta(self, file_id, meta):
+        _, meta_path = self._paths(file_id)
+        tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def _probe(self, file_id, meta):
+        """Ask Drive whether the cached archive is still current; None if it cannot tell
+
+        Only the headers are read. A size is only compared when the response
+        is the archive itself, not an HTML warning or error page.
+        """
+        headers = {"If-None-Match": meta["etag"]} if meta.get("etag") else {}
+        with metrics.stage("drive_probe"), _open_download(file_id, self.base_url, headers, PROBE_TIMEOUT) as response:
+            if response.status_code == 304:
+                return True, meta.get("etag")
+            if response.status_code != 200 or _is_html(response):
+                return None, None
+            etag = response.headers.get("ETag")
+            length = response.headers.get("Content-Length")
+            if etag and meta.get("etag"):
+                return etag == meta["etag"], etag
+            if length is not None:
+                return int(length) == meta["size"], etag
+        return None, None
+
+    def _refresh(self, file_id, force=False):
+        archive_path, _ = self._paths(file_id)
+        meta = self._load_meta(file_id)
+        now = time.time()
+
+        if meta is not None:
+            if not force and now - meta["checked_at"] < self.ttl:
+                return archive_path
+            try:
+                fresh, etag = self._probe(file_id, meta)
+            except Exception as e:
+                # Drive unreachable: a stale copy beats no data
+                print(f"Revalidating {file_id} failed, using cached copy: {e}")
+                return archive_path
+            if fresh is None:
+                if now - meta.get("fetched_at", 0) >= self.max_age:
+                    # Too old to keep trusting; the download below replaces it
+                    print(f"Could not tell whether {file_id} changed, downloading it again")
+                    fresh = False
+                else:
+                    # Downloading again every TTL would not tell either; ask again after the next one
+                    print(f"Could not tell whether {file_id} changed, using cached copy")
+            if fresh or fresh is None:
+                meta["checked_at"] = now
+                meta["etag"] = etag or meta.get("etag")
+                self._save_meta(file_id, meta)
+                os.utime(archive_path)
+                return archive_path
+
+        # Download next to the cached copy, then swap it in
+        fd, tmp_path = tempfile.mkstemp(prefix=".partial-", suffix=".zip", dir=self.directory)
+        os.close(fd)
+        path, method, etag = download_zip_to_file(file_id, tmp_path, self.base_url)
+        if path is None:
+            return archive_path if meta is not None else None
+
+        # Without an ETag (gdown), the next revalidation compares sizes and learns it
+        size = os.path.getsize(path)
+        os.replace(path, archive_path)
+        self._save_meta(file_id, {"size": size, "etag": etag, "method": method,
+                                  "fetched_at": now, "checked_at": now})
+        self._evict()
+        return archive_path
+
+    def _evict(self):
+        archives = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".zip") and not entry.name.startswith(".partial-"):
+                archives.append((entry.stat().st_mtime, entry.path))
+        archives.sort(reverse=True)
+        for _, path in archives[self.max_files:]:
+            for stale in (path, path[:-len(".zip")] + ".json"):
+                try:
+                    os.unlink(stale)
+                except FileNotFoundError:
+                    pass
+
+    def fetch(self, file_id, force=False):
+        """Return the path of an up to date cached archive, or None if it cannot be downloaded
+
+        The cache owns the file; callers must not delete it. ``force`` asks
+        Drive whether the file changed even within the TTL.
+        """
+        with self._lock:
+            flight = self._inflight.get(file_id)
+            leader = flight is None
+            if leader:
+                flight = {"done": threading.Event(), "path": None}
+                self._inflight[file_id] = flight
+
+        if not leader:
+            flight["done"].wait()
+            return flight["path"]
+
+        try:
+            flight["path"] = self._refresh(file_id, force)
+        finally:
+            with self._lock:
+                del self._inflight[file_id]
+            flight["done"].set()
+        return flight["path"]
+
+
+_drive_cache = None
+_drive_cache_lock = threading.Lock()
+
+
+def get_drive_cache():
+    global _drive_cache
+    with _drive_cache_lock:
+        if _drive_cache is None:
+            _drive_cache = DriveDownloadCache()
+        return _drive_cache
+
+
+# path -> ((inode, size, mtime), digest) of the archives hashed so far
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def archive_digest(path):
+    """Content hash of a downloaded archive, to tell whether results derived from it are stale
+
+    The hash is remembered until the file is replaced or touched, so
+    repeated requests for a cached archive do not read it again.
+    """
+    stat = os.stat(path)
+    version = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _digests_lock:
+        known = _digests.get(path)
+    if known is not None and known[0] == version:
+        return known[1]
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    with _digests_lock:
+        _digests[path] = (version, digest.hexdigest())
+    return digest.hexdigest()
+
+
+@contextmanager
+def open_archive(path):
+    """Yield a downloaded archive memory-mapped, ready for zipfile"""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield MappedFile(mapped)
+
+
+@contextmanager
+def open_drive_archive(file_id):
+    """Yield a Drive ZIP memory-mapped from the download cache, or None on failure"""
+    path = get_drive_cache().fetch(file_id)
+    if path is None:
+        yield None
+        return
+    with open_archive(path) as archive:
+        yield archive
+
+
+def download_zip_from_drive(file_id):
+    """Download a Drive file into memory; prefer open_drive_archive for large archives"""
+    path = get_drive_cache().fetch(file_id)
+    if path is None:
+        return None
+    content = BytesIO()
+    with open(path, "rb") as f:
+        shutil.copyfileobj(f, content)
+    content.seek(0)
+    return content
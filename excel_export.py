@@ -0,0 +1,123 @@
+import os
+import re
+import tempfile
+
+import metrics
+from numeric_clean import parse_number
+from table_payload import columnar_table, is_columnar
+
+EXCEL_FILENAME = 'all_tables.xlsx'
+EXCEL_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+EXPORT_CHUNK_SIZE = 256 * 1024
+WIDTH_PADDING = 2
+
+_INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+
+def _sheet_name(name, used):
+    """Excel-safe sheet name, at most 31 characters and unique in the workbook"""
+    base = _INVALID_SHEET_CHARS.sub("_", name)[:31] or "Sheet"
+    candidate = base
+    n = 2
+    while candidate.lower() in used:
+        suffix = f" ({n})"
+        candidate = base[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def _parsed(value):
+    if isinstance(value, str):
+        number = parse_number(value)
+        if number is not None:
+            return number
+    return value
+
+
+def _column_width(header, values):
+    present = [v for v in values if v is not None]
+    if not present:
+        return len(header) + WIDTH_PADDING
+    # Every cell is measured: a float like 0.1 + 0.2 is longer than the extremes of its column
+    longest = max(len(str(v)) for v in present)
+    return max(longest, len(header)) + WIDTH_PADDING
+
+
+def write_workbook(tables, path, parse_numbers=False):
+    """Write every successfully extracted table to its own sheet of an .xlsx file
+
+    ``tables`` maps names to DataFrames, lists of records or columnar
+    tables; error entries are skipped. Rows are streamed to disk
+    (constant_memory), so memory use does not grow with the number of
+    sheets. With ``parse_numbers`` formatted amounts in text cells are
+    written as numbers.
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    # One set of formats for the whole workbook instead of one per column
+    header_format = workbook.add_format({'bold': True})
+    left_format = workbook.add_format({'align': 'left'})
+    right_format = workbook.add_format({'align': 'right'})
+    used_names = set()
+
+    for name, table in tables.items():
+        if not is_columnar(table):
+            table = columnar_table(table)
+        if not is_columnar(table) or not table['columns']:
+            continue
+
+        columns = table['columns']
+        data = table['data']
+        if parse_numbers:
+            data = [[_parsed(v) for v in values] for values in data]
+        worksheet = workbook.add_worksheet(_sheet_name(name, used_names))
+        # constant_memory writes row by row, so widths must be set first
+        for i, (header, values) in enumerate(zip(columns, data)):
+            worksheet.set_column(i, i, _column_width(header, values), left_format if i == 0 else right_format)
+
+        worksheet.write_row(0, 0, columns, header_format)
+        for row, values in enumerate(zip(*data), 1):
+            worksheet.write_row(row, 0, values)
+
+    workbook.close()
+
+
+def export_workbook(tables, parse_numbers=False):
+    """Build the workbook in a temporary file and return its path; the caller removes it"""
+    fd, path = tempfile.mkstemp(prefix="export-", suffix=".xlsx")
+    os.close(fd)
+    try:
+        with metrics.stage("excel_build"):
+            write_workbook(tables, path, parse_numbers)
+    except Exception:
+        os.unlink(path)
+        raise
+    metrics.add_bytes("excel_build", os.path.getsize(path))
+    return path
+
+
+def remove_file(path):
+    """Delete an exported workbook; it may already be gone"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def iter_file_chunks(path, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield a file in chunks and delete it once it has been sent (or the client went away)
+
+    A generator that is never started never reaches its ``finally``, so
+    responses also register ``remove_file`` to run when they are closed.
+    """
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        remove_file(path)
@@ -0,0 +1,271 @@
+import numpy as np
+import pandas as pd
+
+from line_items import index_statement, match_line_item
+
+# Line items that get growth rows and charts, in display order
+GROWTH_ITEMS = ("net_revenue", "gross_profit", "net_profit_after_tax")
+# Items whose growth is classified as loss-to-profit / profit-to-loss / loss
+PROFIT_ITEMS = ("gross_profit", "net_profit_after_tax")
+# Margin name -> numerator line item; the denominator is always net revenue
+MARGINS = {
+    "gross_margin": "gross_profit",
+    "net_margin": "net_profit_after_tax",
+}
+
+# Growth status per period
+GROWTH = "growth"
+LOSS_TO_PROFIT = "ltp"
+PROFIT_TO_LOSS = "ptl"
+LOSS = "loss"
+NO_DATA = "none"
+
+# Period columns start with the fiscal year end, e.g. "31-Dec-2021 Audited"
+PERIOD_PATTERN = r"(\d{1,2}-[A-Za-z]{3}-\d{4})"
+PANEL_COLUMNS = ["company", "item", "period", "value"]
+
+
+def statement_frame(table):
+    """A statement as displayed and analysed: no Legal Regulation row, period headers cut to the date"""
+    df = table.copy()
+    if not df.empty:
+        legal_reg_mask = df.iloc[:, 0].astype(str).str.contains('Legal Regulation', case=False, na=False)
+        df = df[~legal_reg_mask]
+    # "Fiscal Year End" stays as it is; "31-Dec-2021 Audited" becomes "31-Dec-2021"
+    columns = pd.Index([str(col).strip() for col in df.columns], dtype=object)
+    dates = columns.str.extract("^" + PERIOD_PATTERN, expand=False)
+    df.columns = [col if col == "Fiscal Year End" or date != date else date for col, date in zip(columns, dates)]
+    return df
+
+
+def numeric_columns(df):
+    """Period columns: every numeric column after the label column"""
+    return [col for col in df.columns[1:] if pd.api.types.is_numeric_dtype(df[col])]
+
+
+class StatementMetrics:
+    """Growth, growth status and margins of one statement's key line items
+
+    Every frame has one row per line item (or margin) found in the
+    statement and one column per period:
+
+    - ``values``: float amounts, missing cells as 0 (as displayed)
+    - ``growth``: year-on-year growth in %, NaN for the first period or
+      when the previous amount is 0
+    - ``status``: GROWTH, LOSS_TO_PROFIT, PROFIT_TO_LOSS, LOSS or NO_DATA
+    - ``margins``: margin in % of net revenue, NaN when either amount is
+      missing or revenue is 0
+    - ``cagr``: compound annual growth in % from the first to the last
+      period, NaN unless both amounts are positive
+    """
+
+    def __init__(self, periods, values, growth, status, margins, cagr):
+        self.periods = periods
+        self.values = values
+        self.growth = growth
+        self.status = status
+        self.margins = margins
+        self.cagr = cagr
+
+    def __contains__(self, key):
+        return key in self.values.index or key in self.margins.index
+
+
+def _change(previous, current):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(previous != 0, (current - previous) / np.abs(previous) * 100, np.nan)
+
+
+def _transition(is_profit_item, previous, current):
+    was_profit = previous > 0
+    is_profit = current > 0
+    profit_status = np.select(
+        [~was_profit & is_profit, was_profit & ~is_profit, ~was_profit & ~is_profit],
+        [LOSS_TO_PROFIT, PROFIT_TO_LOSS, LOSS],
+        GROWTH,
+    )
+    plain_status = np.where(previous != 0, GROWTH, NO_DATA)
+    return np.where(is_profit_item, profit_status, plain_status).astype(object)
+
+
+def _growth(values):
+    growth = _change(values[:, :-1], values[:, 1:])
+    first = np.full((values.shape[0], 1), np.nan)
+    return np.hstack([first, growth])
+
+
+def _status(keys, values):
+    is_profit_item = np.isin(keys, PROFIT_ITEMS)[:, None]
+    status = _transition(is_profit_item, values[:, :-1], values[:, 1:])
+    first = np.full((values.shape[0], 1), NO_DATA)
+    return np.hstack([first, status]).astype(object)
+
+
+def _cagr(values):
+    first = values[:, 0]
+    last = values[:, -1]
+    years = values.shape[1] - 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cagr = (np.power(last / first, 1 / years) - 1) * 100 if years else np.full(len(first), np.nan)
+    return np.where((first > 0) & (last > 0), cagr, np.nan)
+
+
+def compute_metrics(df, items=None, periods=None):
+    """Compute growth, status and margins for all key line items and periods at once"""
+    if items is None:
+        items = index_statement(df)
+    if periods is None:
+        periods = numeric_columns(df)
+
+    keys = [key for key in GROWTH_ITEMS if items.get(key) is not None]
+    raw = df.iloc[[items.get(key) for key in keys]][periods].to_numpy(dtype=float, na_value=np.nan)
+    raw = raw.reshape(len(keys), len(periods))
+    values = np.nan_to_num(raw, nan=0.0)
+
+    if periods:
+        growth = _growth(values)
+        status = _status(np.array(keys, dtype=object), values)
+        cagr = _cagr(values)
+    else:
+        growth = status = np.empty((len(keys), 0))
+        cagr = np.full(len(keys), np.nan)
+
+    margin_names = []
+    margin_rows = []
+    if "net_revenue" in keys:
+        revenue = raw[keys.index("net_revenue")]
+        for name, key in MARGINS.items():
+            if key in keys:
+                profit = raw[keys.index(key)]
+                valid = ~np.isnan(revenue) & ~np.isnan(profit) & (revenue != 0)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    margin_rows.append(np.where(valid, profit / revenue * 100, np.nan))
+                margin_names.append(name)
+    margins = np.array(margin_rows).reshape(len(margin_names), len(periods))
+
+    return StatementMetrics(
+        periods,
+        pd.DataFrame(values, index=keys, columns=periods),
+        pd.DataFrame(growth, index=keys, columns=periods),
+        pd.DataFrame(status, index=keys, columns=periods),
+        pd.DataFrame(margins, index=margin_names, columns=periods),
+        pd.Series(cagr, index=keys, dtype=float),
+    )
+
+
+def build_panel(tables):
+    """Stack every statement into one long frame: company, item, period, value
+
+    ``tables`` maps file names to statement DataFrames (error entries are
+    skipped). Only the canonical line items are kept, one row per company,
+    item and period; the first matching row of a statement wins, as in
+    ``compute_metrics``. Periods are the fiscal year-end dates.
+    """
+    frames = {
+        name.rsplit(".", 1)[0]: df.set_axis(["label", *map(str, df.columns[1:])], axis=1)
+        for name, df in tables.items()
+        if isinstance(df, pd.DataFrame) and len(df.columns) > 1
+    }
+    if not frames:
+        return pd.DataFrame(columns=PANEL_COLUMNS)
+
+    stacked = pd.concat(frames, names=["company", "row"]).reset_index()
+    stacked["row"] = stacked.groupby("company", sort=False).cumcount()
+
+    # Labels and column names repeat across companies: classify each distinct one once
+    labels = stacked["label"].drop_duplicates()
+    stacked["item"] = stacked["label"].map(pd.Series([match_line_item(l) for l in labels], index=labels))
+    stacked = stacked[stacked["item"].notna()]
+
+    long = stacked.melt(id_vars=["company", "row", "item"], value_vars=stacked.columns[3:-1], var_name="column")
+    columns = long["column"].drop_duplicates()
+    periods = pd.to_datetime(columns.str.extract(PERIOD_PATTERN)[0], format="%d-%b-%Y", errors="coerce")
+    long["period"] = long["column"].map(pd.Series(periods.to_numpy(), index=columns))
+    long["value"] = pd.to_numeric(long["value"], errors="coerce")
+    long = long[long["period"].notna() & long["value"].notna()]
+
+    # First row of each item in its statement, first column of each period
+    first_row = long.groupby(["company", "item"], sort=False)["row"].transform("min")
+    long = long[long["row"] == first_row]
+    long = long.drop_duplicates(["company", "item", "period"])
+    return long[PANEL_COLUMNS].sort_values(["company", "item", "period"], ignore_index=True)
+
+
+def compute_panel_metrics(panel):
+    """Growth, status and margins for every company, item and period in one pass
+
+    Returns the panel with ``growth`` and ``status`` columns and the
+    margins appended as extra items; for margins ``value`` is the margin in
+    % of net revenue and ``growth`` its change in percentage points. Each
+    period is compared with the company's previous reported period, and
+    unlike ``compute_metrics`` missing amounts stay missing.
+    """
+    columns = PANEL_COLUMNS + ["growth", "status"]
+    if panel.empty:
+        return pd.DataFrame(columns=columns)
+
+    panel = panel.sort_values(["company", "item", "period"], ignore_index=True)
+    current = panel["value"].to_numpy(dtype=float)
+    previous = panel.groupby(["company", "item"], sort=False)["value"].shift().to_numpy(dtype=float)
+    status = _transition(panel["item"].isin(PROFIT_ITEMS).to_numpy(), previous, current)
+    panel["growth"] = _change(previous, current)
+    panel["status"] = np.where(np.isnan(previous), NO_DATA, status)
+
+    parts = [panel]
+    amounts = panel.set_index(["company", "period"])
+    revenue = amounts.loc[amounts["item"] == "net_revenue", "value"]
+    for name, key in MARGINS.items():
+        profit = amounts.loc[amounts["item"] == key, "value"]
+        margin = (profit / revenue[revenue != 0]).dropna() * 100
+        if margin.empty:
+            continue
+        margin = margin.rename("value").reset_index().sort_values(["company", "period"], ignore_index=True)
+        margin["item"] = name
+        margin["growth"] = margin.groupby("company", sort=False)["value"].diff()
+        margin["status"] = np.where(margin["growth"].notna(), GROWTH, NO_DATA)
+        parts.append(margin)
+
+    result = pd.concat(parts, ignore_index=True)
+    return result[columns].sort_values(["company", "item", "period"], ignore_index=True)
+
+
+def screen_companies(metrics):
+    """One row per company with its latest period's amounts, growth and margins
+
+    Columns are ``<item>`` and ``<item>_growth`` (in %) for the line items,
+    ``<item>_status`` for profit items, ``<margin>`` and ``<margin>_change``
+    (in percentage points) for the margins, and ``<item>_cagr`` over every
+    period the company reports.
+    """
+    if metrics.empty:
+        return pd.DataFrame(index=pd.Index([], name="company"))
+
+    latest = metrics[metrics["period"] == metrics.groupby("company")["period"].transform("max")]
+    table = latest.pivot(index="company", columns="item", values=["value", "growth", "status"])
+
+    screen = pd.DataFrame({"period": latest.groupby("company")["period"].first()})
+    for item in (*GROWTH_ITEMS, *MARGINS):
+        if ("value", item) not in table.columns:
+            continue
+        screen[item] = table[("value", item)].astype(float)
+        change = "growth" if item in GROWTH_ITEMS else "change"
+        screen[f"{item}_{change}"] = table[("growth", item)].astype(float)
+        if item in PROFIT_ITEMS:
+            screen[f"{item}_status"] = table[("status", item)]
+
+    # CAGR from each company's first to last reported amount
+    amounts = metrics[metrics["item"].isin(GROWTH_ITEMS)].sort_values("period")
+    ends = amounts.groupby(["company", "item"]).agg(
+        first=("value", "first"), last=("value", "last"),
+        start=("period", "first"), end=("period", "last"),
+    )
+    years = (ends["end"].dt.year - ends["start"].dt.year).to_numpy(dtype=float)
+    first = ends["first"].to_numpy(dtype=float)
+    last = ends["last"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cagr = (np.power(last / first, 1 / years) - 1) * 100
+    cagr = pd.Series(np.where((first > 0) & (last > 0) & (years > 0), cagr, np.nan), index=ends.index)
+    for item in GROWTH_ITEMS:
+        if item in screen:
+            screen[f"{item}_cagr"] = cagr.xs(item, level="item").reindex(screen.index)
+    return screen
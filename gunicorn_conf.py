@@ -0,0 +1,58 @@
+"""Production settings for gunicorn (``python run.py --production``)
+
+    gunicorn -c gunicorn_conf.py simple_app:app
+
+Prefork workers, one per core by default, each with a few threads for
+requests that wait on Google Drive. Every worker warms up its parser and
+chart modules before taking requests. ``kill -HUP`` on the master reloads
+the code with new workers while the old ones finish their requests.
+
+Each worker is its own process: /metrics reports the worker that answers,
+and background jobs and the in-memory tier of the result store belong to
+the worker that created them. Results and profiles are on disk, so every
+worker can serve them.
+"""
+import multiprocessing
+import os
+import sys
+
+bind = os.environ.get("FS_BIND", f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+workers = int(os.environ.get("FS_WORKERS", "0")) or multiprocessing.cpu_count()
+# Threads per worker; a thread waiting on a Drive download does not hold up the others
+worker_class = "gthread"
+threads = int(os.environ.get("FS_WORKER_THREADS", "4"))
+
+# Seconds a request may run before its worker is restarted; large archives
+# from Drive take a while
+timeout = int(os.environ.get("FS_REQUEST_TIMEOUT", "300"))
+# Seconds workers get to finish their requests on restart or shutdown
+graceful_timeout = int(os.environ.get("FS_GRACEFUL_TIMEOUT", "60"))
+# Seconds an idle keep-alive connection stays open
+keepalive = int(os.environ.get("FS_KEEPALIVE", "5"))
+# Workers are replaced after this many requests (0: never), staggered by the jitter
+max_requests = int(os.environ.get("FS_MAX_REQUESTS", "1000"))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
+
+# The workers already parse in parallel, so each one gets a share of the
+# cores for its extraction pool rather than a pool per core (cores x cores
+# processes). It is at least 2: the pool is what stops a member that hangs
+# the parser after FS_MEMBER_TIMEOUT, and a pool of 1 would never be used
+os.environ.setdefault("FS_ZIP_WORKERS", str(max(2, multiprocessing.cpu_count() // workers)))
+
+
+def post_worker_init(worker):
+    """Warm the app up in each worker before it accepts connections"""
+    module = sys.modules.get(getattr(worker.wsgi, "import_name", ""))
+    warm_up = getattr(module, "warm_up", None)
+    if warm_up is None:
+        return
+    try:
+        warm_up()
+    except Exception as e:
+        # A cold worker still serves requests
+        worker.log.warning("Warm-up failed: %s", e)
+    else:
+        worker.log.info("Worker %s warmed up", worker.pid)
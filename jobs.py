@@ -0,0 +1,250 @@
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+
+# Archives extracted at the same time; each one may still use the process pool
+JOB_WORKERS = int(os.environ.get("FS_JOB_WORKERS", "2"))
+# Jobs waiting for a worker; further submissions are refused until one frees up
+JOB_QUEUE_SIZE = int(os.environ.get("FS_JOB_QUEUE_SIZE", "8"))
+# Seconds a finished job's results stay available
+JOB_TTL = float(os.environ.get("FS_JOB_TTL", "3600"))
+# Longest a poll may wait for new results
+MAX_POLL_WAIT = 30
+# Seconds between saves of a running job's progress to the shared store, and
+# between reads of it by workers that do not run the job
+JOB_SAVE_INTERVAL = 1.0
+JOB_POLL_INTERVAL = 0.25
+
+
+class QueueFull(Exception):
+    """Raised when every worker is busy and the queue is full"""
+
+
+class Job:
+    """Progress and partial results of one archive extraction
+
+    With a ``store`` (a ResultStore shared by the server's worker
+    processes) the job saves its progress there, so a poll answered by
+    another worker still finds it (see StoredJob).
+    """
+
+    def __init__(self, store=None):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.total = None
+        self.error = None
+        self.result_id = None
+        # Content hash of the archive, when the job knows it (Drive downloads)
+        self.digest = None
+        self.results = []
+        self.finished_at = None
+        self._cond = threading.Condition()
+        self._store = store
+        self._saved_at = 0
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def _save(self, force=True):
+        """Write the job's state to the shared store; while it runs, at most every JOB_SAVE_INTERVAL"""
+        if self._store is None or (not force and time.monotonic() - self._saved_at < JOB_SAVE_INTERVAL):
+            return
+        with self._cond:
+            state = {
+                "status": self.status,
+                "total": self.total,
+                "error": self.error,
+                "result_id": self.result_id,
+                "digest": self.digest,
+                "results": list(self.results),
+                "finished_at": self.finished_at,
+            }
+        self._saved_at = time.monotonic()
+        try:
+            self._store.put(state, self.id)
+        except Exception as e:
+            # Polls answered by this worker still see the job
+            print(f"Could not save job {self.id}: {e}")
+
+    def start(self, total):
+        with self._cond:
+            self.status = "running"
+            self.total = total
+            self._cond.notify_all()
+        self._save()
+
+    def publish(self, name, result):
+        with self._cond:
+            self.results.append((name, result))
+            self._cond.notify_all()
+        self._save(force=False)
+
+    def finish(self, error=None):
+        with self._cond:
+            self.status = "failed" if error else "done"
+            self.error = error
+            self.finished_at = time.time()
+            self._cond.notify_all()
+        self._save()
+
+    def refresh(self):
+        """Nothing to do: this process runs the job, so its state is always current"""
+
+    def wait(self, since, timeout):
+        """Block until there are results past ``since`` or the job ends"""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.results) > since or self.finished, timeout)
+
+    def snapshot(self, since=0):
+        """Status plus the tables published after the first ``since`` ones"""
+        with self._cond:
+            state = {
+                "job_id": self.id,
+                "status": self.status,
+                "total": self.total,
+                "done": len(self.results),
+                "tables": dict(self.results[since:]),
+                "next": len(self.results),
+            }
+            if self.error:
+                state["error"] = self.error
+            if self.result_id:
+                state["result_id"] = self.result_id
+            return state
+
+    def events(self, since=0, wait=MAX_POLL_WAIT):
+        """Yield {"file", "table"} as tables are published, then the final status"""
+        while True:
+            self.wait(since, wait)
+            with self._cond:
+                new = self.results[since:]
+                finished = self.finished
+            for name, result in new:
+                yield {"file": name, "table": result}
+            since += len(new)
+            if finished and not new:
+                state = self.snapshot(since)
+                del state["tables"]
+                yield state
+                return
+
+
+class StoredJob(Job):
+    """Read-only view of a job run by another worker process, read back from the shared store"""
+
+    def __init__(self, store, job_id, state):
+        super().__init__()
+        self.id = job_id
+        self._source = store
+        self._load(state)
+
+    def _load(self, state):
+        with self._cond:
+            self.__dict__.update(state)
+        self._loaded_at = time.monotonic()
+
+    def refresh(self):
+        """Re-read the job's state, at most every JOB_POLL_INTERVAL"""
+        if time.monotonic() - self._loaded_at < JOB_POLL_INTERVAL:
+            return
+        state = self._source.get(self.id)
+        if state is not None:
+            self._load(state)
+
+    def wait(self, since, timeout):
+        """Poll the store until there are results past ``since`` or the job ends"""
+        deadline = time.monotonic() + (timeout or 0)
+        self.refresh()
+        while len(self.results) <= since and not self.finished and time.monotonic() < deadline:
+            time.sleep(JOB_POLL_INTERVAL)
+            self.refresh()
+
+
+class JobQueue:
+    """Bounded queue of extraction jobs served by a few background threads
+
+    ``submit`` never blocks: when the queue is full it raises QueueFull so
+    the route can tell the client to retry instead of piling up archives.
+    Jobs run in the process that queued them; with a ``store`` shared by
+    all worker processes, ``get`` also finds jobs run by the others.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE, ttl=JOB_TTL, store=None):
+        self.workers = workers
+        self.ttl = ttl
+        self.store = store
+        self._queue = queue.Queue(max_queued)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            job, target, args = self._queue.get()
+            try:
+                target(job, *args)
+                if not job.finished:
+                    job.finish()
+            except Exception as e:
+                print(f"Job {job.id} failed: {e}")
+                job.finish(str(e))
+            finally:
+                self._queue.task_done()
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+                del self._jobs[job_id]
+
+    def submit(self, target, *args):
+        """Queue ``target(job, *args)`` and return the job; raise QueueFull if saturated"""
+        self._start_workers()
+        self._expire()
+        job = Job(self.store)
+        # Registered before it is queued, so a worker or a status poll always finds it
+        with self._lock:
+            self._jobs[job.id] = job
+        job._save()
+        try:
+            self._queue.put_nowait((job, target, args))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise QueueFull("Too many extraction jobs in progress")
+        return job
+
+    def get(self, job_id):
+        """The job with this id, from this process or else from the shared store; None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            state = self.store.get(job_id)
+            if state is not None:
+                job = StoredJob(self.store, job_id, state)
+        return job
+
+
+def spool_upload(stream, directory=None):
+    """Copy an upload to a temporary file the job can read after the request ends"""
+    fd, path = tempfile.mkstemp(prefix="job-", suffix=".zip", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        while True:
+            chunk = stream.read(1024 * 1024)
+            if not chunk:
+                break
+            f.write(chunk)
+    return path
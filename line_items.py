@@ -0,0 +1,118 @@
+import json
+import os
+import unicodedata
+
+# Canonical line item -> label patterns. A label matches a pattern when it
+# contains every fragment of it. Labels and fragments are compared lower-case
+# and without Vietnamese diacritics, so "Doanh thu thuần" and "doanh thu thuan"
+# both match.
+LINE_ITEM_SYNONYMS = {
+    "net_revenue": [
+        ("net revenue",),
+        ("revenue", "net"),
+        ("doanh thu thuần",),
+    ],
+    "gross_profit": [
+        ("gross profit",),
+        ("lợi nhuận gộp",),
+        ("lãi gộp",),
+    ],
+    "net_profit_after_tax": [
+        ("net profit", "after tax"),
+        ("lợi nhuận sau thuế",),
+        ("lãi sau thuế",),
+    ],
+    "audit_status": [
+        ("audit status",),
+        ("trạng thái kiểm toán",),
+        ("tình trạng kiểm toán",),
+    ],
+    "legal_regulation": [
+        ("legal regulation",),
+    ],
+}
+
+# JSON file of extra patterns, e.g. {"net_revenue": [["total revenue"]]};
+# they are added to the built-in ones
+SYNONYMS_FILE = os.environ.get("FS_LINE_ITEM_SYNONYMS")
+
+
+def normalize_label(text):
+    """Lower-case a label and strip diacritics (đ becomes d)"""
+    if not isinstance(text, str):
+        text = "" if text is None or text != text else str(text)
+    text = text.lower().replace("đ", "d")
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def load_synonyms(path=SYNONYMS_FILE):
+    """Built-in synonym table merged with the patterns from ``path``"""
+    synonyms = {key: list(patterns) for key, patterns in LINE_ITEM_SYNONYMS.items()}
+    if path:
+        with open(path, encoding="utf-8") as f:
+            for key, patterns in json.load(f).items():
+                synonyms.setdefault(key, []).extend(tuple(p) for p in patterns)
+    return synonyms
+
+
+_compiled = None
+
+
+def _compiled_synonyms():
+    global _compiled
+    if _compiled is None:
+        _compiled = compile_synonyms(load_synonyms())
+    return _compiled
+
+
+def compile_synonyms(synonyms):
+    return {
+        key: [tuple(normalize_label(fragment) for fragment in pattern) for pattern in patterns]
+        for key, patterns in synonyms.items()
+    }
+
+
+def match_line_item(label, compiled=None):
+    """Canonical key of the first line item whose patterns match ``label``, or None"""
+    label = normalize_label(label)
+    for key, patterns in (compiled or _compiled_synonyms()).items():
+        if any(all(fragment in label for fragment in pattern) for pattern in patterns):
+            return key
+    return None
+
+
+class LineItemIndex:
+    """Row positions of the canonical line items of one statement
+
+    Built from the label column in a single pass; positions are 0-based
+    (use with ``iloc``).
+    """
+
+    def __init__(self, labels, synonyms=None):
+        compiled = compile_synonyms(synonyms) if synonyms is not None else _compiled_synonyms()
+        self._positions = {}
+        for position, label in enumerate(labels):
+            label = normalize_label(label)
+            for key, patterns in compiled.items():
+                if any(all(fragment in label for fragment in pattern) for pattern in patterns):
+                    self._positions.setdefault(key, []).append(position)
+
+    def get(self, key):
+        """Position of the first row for ``key``, or None"""
+        positions = self._positions.get(key)
+        return positions[0] if positions else None
+
+    def positions(self, key):
+        """Positions of every row matching ``key``"""
+        return list(self._positions.get(key, ()))
+
+    def __contains__(self, key):
+        return key in self._positions
+
+
+def index_statement(df, synonyms=None):
+    """Index the line items of a statement by its first column"""
+    if df.empty or len(df.columns) == 0:
+        return LineItemIndex([], synonyms)
+    return LineItemIndex(df.iloc[:, 0].tolist(), synonyms)
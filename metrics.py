@@ -0,0 +1,187 @@
+"""Pipeline metrics, exposed in the Prometheus text format on /metrics
+
+Counters and histograms live in process memory behind one lock each; an
+observation is a bisect and a few additions, so they stay on in production.
+Work done in the extraction pool is timed in the worker with ``collect``
+and recorded in the serving process with ``record``.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds, from a small member's parse to a slow Drive download
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_registry = {}
+_local = threading.local()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _buffered(self, value, labels):
+        sink = getattr(_local, "sink", None)
+        if sink is None:
+            return False
+        sink.append((self.name, labels, value))
+        return True
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = {key: (list(v) if isinstance(v, list) else v) for key, v in self._values.items()}
+        for key in sorted(values):
+            lines.extend(self._samples(key, values[key]))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if self._buffered(amount, labels):
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _record(self, value, labels):
+        self.inc(value, **labels)
+
+    def _samples(self, key, value):
+        yield f"{self.name}{_labels(self.labelnames, key)} {_format(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if self._buffered(value, labels):
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Count per bucket (the last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _record(self, value, labels):
+        self.observe(value, **labels)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self, key, state):
+        counts, total, count = state
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = 'le="+Inf"' if bound == float("inf") else f'le="{_format(bound)}"'
+            yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+        yield f"{self.name}_sum{_labels(self.labelnames, key)} {_format(total)}"
+        yield f"{self.name}_count{_labels(self.labelnames, key)} {count}"
+
+
+STAGE_SECONDS = Histogram(
+    "fs_stage_seconds",
+    "Time spent in each pipeline stage (zip_open, member_decode, html_parse, numeric_clean, "
+    "json_serialize, compress, excel_build, drive_probe)",
+    ("stage",),
+)
+STAGE_BYTES = Counter("fs_stage_bytes_total", "Bytes produced by each pipeline stage", ("stage",))
+DRIVE_DOWNLOAD_SECONDS = Histogram(
+    "fs_drive_download_seconds", "Google Drive download attempts by method and outcome", ("method", "outcome"),
+)
+TABLES = Counter("fs_tables_total", "Tables extracted from ZIP members, by result (ok, error, cached)", ("result",))
+TABLE_ROWS = Counter("fs_table_rows_total", "Rows of the tables extracted from ZIP members")
+COERCE_FAILURES = Counter(
+    "fs_coerce_failures_total", "Non-blank table cells that could not be read as numbers, by stage (extract, chart)", ("stage",),
+)
+
+
+def stage(name):
+    """Context manager timing one pipeline stage"""
+    return STAGE_SECONDS.time(stage=name)
+
+
+def add_bytes(stage_name, count):
+    STAGE_BYTES.inc(count, stage=stage_name)
+
+
+def count_table(result, cached=False):
+    """Count one extracted table and its rows; error messages count as errors"""
+    if isinstance(result, (str, dict)):
+        TABLES.inc(result="error")
+        return
+    TABLES.inc(result="cached" if cached else "ok")
+    TABLE_ROWS.inc(len(result))
+
+
+@contextmanager
+def collect():
+    """Buffer this thread's observations in a list instead of recording them
+
+    Used in pool workers, whose registry is never read; the list is sent
+    back with the result and passed to ``record``.
+    """
+    previous = getattr(_local, "sink", None)
+    sink = _local.sink = []
+    try:
+        yield sink
+    finally:
+        _local.sink = previous
+
+
+def record(observations):
+    """Record observations buffered by ``collect``"""
+    for name, labels, value in observations:
+        _registry[name]._record(value, labels)
+
+
+def render():
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,92 @@
+import re
+from functools import lru_cache
+
+from line_items import match_line_item
+
+# Fingate statements print whole VND amounts, so both '.' and ',' are
+# thousands separators and "(1.234)" means -1234
+THOUSANDS_SEPARATORS = ".,"
+DECIMAL_SEPARATOR = None
+
+# Statement rows whose cells are text, not amounts (e.g. "Audited", "200/2014/TT-BTC")
+TEXT_ROW_ITEMS = ("audit_status", "legal_regulation")
+
+# What pd.to_numeric accepts once the separators are gone
+_NUMBER_RE = re.compile(r"^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$")
+
+
+@lru_cache(maxsize=None)
+def translation_table(thousands=THOUSANDS_SEPARATORS, decimal=DECIMAL_SEPARATOR):
+    """Build the str.translate table mapping a formatted amount to plain numeric text"""
+    mapping = {"(": "-", ")": None}
+    for sep in thousands:
+        mapping[sep] = None
+    if decimal:
+        mapping[decimal] = "."
+    return str.maketrans(mapping)
+
+
+def normalize_number_text(text, thousands=THOUSANDS_SEPARATORS, decimal=DECIMAL_SEPARATOR):
+    """Return the plain numeric text for a formatted amount, or the text unchanged if it is not one"""
+    if not isinstance(text, str):
+        return text
+    cleaned = text.translate(translation_table(thousands, decimal))
+    return cleaned.strip() if _NUMBER_RE.match(cleaned) else text
+
+
+def parse_number(text, thousands=THOUSANDS_SEPARATORS, decimal=DECIMAL_SEPARATOR):
+    """Convert a formatted amount to int/float, or None if it does not parse"""
+    if isinstance(text, (int, float)):
+        return text
+    if not isinstance(text, str):
+        return None
+    cleaned = text.translate(translation_table(thousands, decimal))
+    if not _NUMBER_RE.match(cleaned):
+        return None
+    try:
+        return int(cleaned)
+    except ValueError:
+        return float(cleaned)
+
+
+def is_text_row(label):
+    """True for statement rows that hold text in every period, such as the audit status"""
+    return isinstance(label, str) and match_line_item(label) in TEXT_ROW_ITEMS
+
+
+def is_unparsed(value):
+    """True for a non-blank text cell that is not an amount"""
+    return isinstance(value, str) and bool(value.strip()) and parse_number(value) is None
+
+
+def clean_numeric_columns(df, thousands=THOUSANDS_SEPARATORS, decimal=DECIMAL_SEPARATOR):
+    """Convert every column after the first to numbers in one pass per column
+
+    Returns the cleaned DataFrame and the number of non-blank cells that
+    could not be coerced (they become NaN), not counting text rows such as
+    the audit status. The count is also kept in ``df.attrs['coerce_failures']``.
+    """
+    # Imported here so the pandas-free scalar helpers stay cheap to import
+    import pandas as pd
+
+    table = translation_table(thousands, decimal)
+    failed = 0
+    amount_rows = None
+
+    if len(df) > 0 and len(df.columns) > 0:
+        amount_rows = ~df.iloc[:, 0].map(is_text_row).to_numpy(dtype=bool)
+        # Keep the original quirk of cleaning the first label cell too
+        df.iloc[0, 0] = str(df.iloc[0, 0]).translate(table)
+
+    for col in df.columns[1:]:
+        cells = pd.Series(
+            [value.translate(table) if isinstance(value, str) else value for value in df[col].tolist()],
+            index=df.index,
+            dtype=object,
+        )
+        numbers = pd.to_numeric(cells, errors="coerce")
+        failed += int((numbers.isna() & cells.notna() & cells.ne("") & amount_rows).sum())
+        df[col] = numbers
+
+    df.attrs['coerce_failures'] = failed
+    return df, failed
@@ -0,0 +1,286 @@
+"""Profiles of single requests, taken on demand by an admin
+
+Set FS_PROFILE_TOKEN and send it in the X-Profile-Token header (or as
+``?profile_token=``) with a request to a profiled route. While that request
+runs, a sampler thread records the call stacks of the threads serving it
+every FS_PROFILE_INTERVAL seconds, and tracemalloc records where memory is
+allocated. The memory profile holds what was allocated while the request
+ran and is still alive at its end; the metadata adds traced memory before,
+after and at the peak. tracemalloc sees the whole process, so both include
+other threads' allocations. Tracing allocations makes Python code several
+times slower, so the CPU profile is best read for proportions; set
+FS_PROFILE_MEMORY_FRAMES=0 to sample stacks only, at no measurable cost.
+Both are stored in FS_PROFILE_DIR as folded stacks, one
+``frame;frame;frame weight`` line per stack, which flamegraph.pl,
+speedscope and inferno read directly; the response names the profile in
+X-Profile-Id. Without FS_PROFILE_TOKEN no route is wrapped at all.
+
+Members parsed on the process pool run in other processes, which the
+sampler cannot see: in the CPU profile that time is the request's thread
+waiting in ``zip_processing._wait``. The stage timings the workers send back
+(``metrics.collect``) are added to the metadata as ``pool_stage_seconds``.
+"""
+import contextvars
+import hmac
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+PROFILE_TOKEN = os.environ.get("FS_PROFILE_TOKEN", "")
+ENABLED = bool(PROFILE_TOKEN)
+TOKEN_HEADER = "X-Profile-Token"
+TOKEN_PARAM = "profile_token"
+ID_HEADER = "X-Profile-Id"
+
+PROFILE_DIR = os.environ.get("FS_PROFILE_DIR", os.path.join("cache", "profiles"))
+# Seconds between stack samples
+SAMPLE_INTERVAL = float(os.environ.get("FS_PROFILE_INTERVAL", "0.005"))
+# Profiles kept on disk; the oldest are removed
+PROFILE_FILES = int(os.environ.get("FS_PROFILE_FILES", "20"))
+# Frames kept per allocation traceback; 0 turns tracemalloc off
+MEMORY_FRAMES = int(os.environ.get("FS_PROFILE_MEMORY_FRAMES", "16"))
+
+# File suffix of each kind of profile, as in /profiles/<id>/<kind>
+KINDS = {"cpu": ".cpu.folded", "memory": ".memory.folded", "meta": ".json"}
+_ID = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{6}$")
+
+_current = contextvars.ContextVar("request_profile", default=None)
+# tracemalloc is process-wide, so one request is profiled at a time
+_active = threading.Lock()
+
+
+def token_matches(token):
+    """True when ``token`` is the admin profiling token"""
+    return ENABLED and bool(token) and hmac.compare_digest(token, PROFILE_TOKEN)
+
+
+def authorized(headers, query):
+    """True when a request's headers or query parameters carry the admin profiling token"""
+    return token_matches(headers.get(TOKEN_HEADER) or query.get(TOKEN_PARAM))
+
+
+def current():
+    """The profile of the request running in this context, or None"""
+    return _current.get()
+
+
+def add_pool_observations(observations):
+    """Attach a pool worker's buffered stage timings to the profile of the running request, if any"""
+    profile = _current.get()
+    if profile is not None:
+        profile.add_pool_observations(observations)
+
+
+def _frame_name(code):
+    # Folded stacks split frames on ";" (the weight follows the last space)
+    path = "/".join(code.co_filename.replace("\\", "/").split("/")[-2:])
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _folded(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _own_traces(snapshot):
+    # Leave out tracemalloc itself and the sampler
+    return snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__, all_frames=True),
+    ])
+
+
+def _memory_stacks(snapshot, baseline=None):
+    """Folded stacks of the memory allocated since ``baseline`` and still alive in ``snapshot``, weighted by bytes"""
+    snapshot = _own_traces(snapshot)
+    if baseline is None:
+        stats = [(stat.traceback, stat.size) for stat in snapshot.statistics("traceback")]
+    else:
+        stats = [(stat.traceback, stat.size_diff) for stat in snapshot.compare_to(_own_traces(baseline), "traceback")]
+    stacks = Counter()
+    for traceback, size in stats:
+        if size <= 0:
+            continue
+        # Oldest frame first; tracemalloc frames only have a file and a line
+        frames = ["/".join(f.filename.replace("\\", "/").split("/")[-2:]) + f":{f.lineno}" for f in traceback]
+        stacks[";".join(frames)] += size
+    return stacks
+
+
+def _write_folded(path, stacks):
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, weight in stacks.most_common():
+            f.write(f"{stack} {weight}\n")
+
+
+class RequestProfile:
+    """Context manager profiling one request; ``id`` is None if another profile was running
+
+    ``track=False`` leaves out the entering thread (an event loop), for
+    requests whose work runs in the functions passed through ``traced``.
+    """
+
+    def __init__(self, method, path, track=True, interval=SAMPLE_INTERVAL):
+        self.method = method
+        self.path = path
+        self.track = track
+        self.interval = interval
+        self.id = None
+        self._threads = set()
+        self._stacks = Counter()
+        self._pool_seconds = Counter()
+        self._pool_members = 0
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        if not _active.acquire(blocking=False):
+            print(f"Not profiling {self.method} {self.path}: another request is being profiled")
+            return self
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+        self._token = _current.set(self)
+        if self.track:
+            self._threads.add(threading.get_ident())
+        self._own_tracemalloc = MEMORY_FRAMES > 0 and not tracemalloc.is_tracing()
+        if self._own_tracemalloc:
+            tracemalloc.start(MEMORY_FRAMES)
+        self._baseline = None
+        self._memory_before = None
+        if tracemalloc.is_tracing():
+            # Tracing was already on: only what is allocated from here on belongs to the profile
+            if not self._own_tracemalloc:
+                self._baseline = tracemalloc.take_snapshot()
+            self._memory_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample, name=f"profile-{self.id}", daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.id is None:
+            return False
+        try:
+            seconds = time.perf_counter() - self._started
+            self._stop.set()
+            self._sampler.join()
+            snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+            memory = tracemalloc.get_traced_memory()
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+            _current.reset(self._token)
+            self._save(seconds, memory, snapshot, exc)
+        finally:
+            _active.release()
+        return False
+
+    def traced(self, func):
+        """``func`` with its calling thread sampled while it runs"""
+        def run(*args, **kwargs):
+            ident = threading.get_ident()
+            self._threads.add(ident)
+            # Executor threads do not inherit the caller's context
+            token = _current.set(self)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _current.reset(token)
+                self._threads.discard(ident)
+        return run
+
+    def add_pool_observations(self, observations):
+        """Add the stage timings a pool worker buffered with ``metrics.collect`` for one member"""
+        self._pool_members += 1
+        for name, labels, value in observations:
+            if name == "fs_stage_seconds":
+                self._pool_seconds[labels.get("stage", "")] += value
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in tuple(self._threads):
+                frame = frames.get(ident)
+                if frame is not None:
+                    self._stacks[_folded(frame)] += 1
+
+    def _save(self, seconds, memory, snapshot, exc):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, self.id)
+        _write_folded(base + KINDS["cpu"], self._stacks)
+        if snapshot is not None:
+            _write_folded(base + KINDS["memory"], _memory_stacks(snapshot, self._baseline))
+        traced = snapshot is not None and self._memory_before is not None
+        after, peak = memory
+        meta = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": time.time() - seconds,
+            "seconds": seconds,
+            "samples": sum(self._stacks.values()),
+            "interval": self.interval,
+            # Seconds spent per stage in pool workers, outside the sampled threads; the CPU
+            # profile shows the same time as waiting in zip_processing._wait
+            "pool_members": self._pool_members,
+            "pool_stage_seconds": dict(self._pool_seconds),
+            # Traced memory of the whole process when the request started and ended, and its
+            # peak in between; other threads' allocations are counted too
+            "memory_before_bytes": self._memory_before if traced else None,
+            "memory_after_bytes": after if traced else None,
+            "peak_memory_bytes": peak if traced else None,
+            "peak_increase_bytes": peak - self._memory_before if traced else None,
+            "memory_scope": "process: includes allocations of other threads" if traced else None,
+            "error": repr(exc) if exc is not None else None,
+        }
+        with open(base + KINDS["meta"], "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=1)
+        print(f"Profiled {self.method} {self.path} in {seconds:.2f}s: {meta['samples']} samples -> {base}.*")
+        if self._pool_members:
+            stages = ", ".join(f"{name} {value:.2f}s" for name, value in self._pool_seconds.most_common())
+            print(f"{self._pool_members} members parsed in the pool ({stages}); the CPU profile shows this as waiting in _wait")
+        if traced:
+            print(f"Peak traced memory {peak - self._memory_before:+,} bytes over the request (whole process, all threads)")
+        _evict()
+
+
+def _evict():
+    metas = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith(KINDS["meta"]))
+    for name in metas[:-PROFILE_FILES] if PROFILE_FILES > 0 else metas:
+        profile_id = name[:-len(KINDS["meta"])]
+        for suffix in KINDS.values():
+            try:
+                os.unlink(os.path.join(PROFILE_DIR, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """Metadata of the stored profiles, newest first"""
+    try:
+        names = sorted((f for f in os.listdir(PROFILE_DIR) if f.endswith(KINDS["meta"])), reverse=True)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names:
+        try:
+            with open(os.path.join(PROFILE_DIR, name), encoding="utf-8") as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def profile_path(profile_id, kind):
+    """Path of a stored profile file ("cpu", "memory" or "meta"); None if there is none"""
+    if kind not in KINDS or not _ID.match(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + KINDS[kind])
+    return path if os.path.isfile(path) else None
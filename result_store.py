@@ -0,0 +1,135 @@
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+RESULT_DIR = os.environ.get("FS_RESULT_DIR", os.path.join("cache", "results"))
+# Seconds an extraction result can still be exported after it was produced
+RESULT_TTL = float(os.environ.get("FS_RESULT_TTL", "3600"))
+# Results kept in memory per process; older ones are read back from disk
+RESULT_HOT_ENTRIES = int(os.environ.get("FS_RESULT_HOT_ENTRIES", "8"))
+# Disk budget in MB; least recently used results are deleted past it (0 for no limit)
+RESULT_MAX_MB = int(os.environ.get("FS_RESULT_MAX_MB", "1024"))
+
+_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+
+class ResultStore:
+    """Extraction results kept by id so exports do not need the tables sent back
+
+    Results are pickled to disk, so any worker process can serve them, and
+    the most recent ones are also kept in memory. Files older than the TTL
+    are deleted, and the least recently used ones once the directory is
+    over ``max_mb``.
+    """
+
+    def __init__(self, namespace, directory=RESULT_DIR, ttl=RESULT_TTL, hot_entries=RESULT_HOT_ENTRIES,
+                 max_mb=RESULT_MAX_MB):
+        self.namespace = namespace
+        self.directory = directory
+        self.ttl = ttl
+        self.hot_entries = hot_entries
+        self.max_bytes = max_mb * 1024 * 1024
+        self._hot = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, result_id):
+        return os.path.join(self.directory, f"{self.namespace}-{result_id}.pkl")
+
+    def put(self, tables, result_id=None):
+        """Store {name: table} and return its result id
+
+        Pass ``result_id`` (32 hex digits, e.g. a content hash) to store
+        results derived from the same input under the same id.
+        """
+        result_id = result_id or uuid.uuid4().hex
+        path = self._path(result_id)
+        # A unique temporary file per call: threads may store the same id at once
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{self.namespace}-", suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(tables, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            self._hot[result_id] = (time.time(), tables)
+            while len(self._hot) > self.hot_entries:
+                self._hot.popitem(last=False)
+        self._expire(keep=path)
+        return result_id
+
+    def get(self, result_id):
+        """Return the stored tables, or None if the id is unknown or expired"""
+        if not _ID_RE.fullmatch(result_id or ""):
+            return None
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            entry = self._hot.get(result_id)
+        if entry is not None and entry[0] >= cutoff:
+            return entry[1]
+
+        path = self._path(result_id)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                return None
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def touch(self, result_id):
+        """Keep a stored result for another TTL; False if it is unknown or expired"""
+        if not _ID_RE.fullmatch(result_id or ""):
+            return False
+        now = time.time()
+        try:
+            if os.path.getmtime(self._path(result_id)) < now - self.ttl:
+                return False
+            os.utime(self._path(result_id))
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            entry = self._hot.get(result_id)
+            if entry is not None:
+                self._hot[result_id] = (now, entry[1])
+        return True
+
+    def _expire(self, keep=None):
+        """Delete expired results, then the least recently used ones until the directory fits the budget"""
+        cutoff = time.time() - self.ttl
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.startswith(self.namespace + "-"):
+                continue
+            try:
+                stat = entry.stat()
+                if stat.st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    continue
+            except FileNotFoundError:
+                continue
+            total += stat.st_size
+            # Results being written, and the one just stored, are never evicted
+            if not entry.name.endswith(".tmp") and entry.path != keep:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        if not self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -2,6 +2,10 @@
 echo Installing required packages...
 pip install -r requirements.txt
 
+echo.
+echo Building static assets...
+python static_assets.py
+
 echo.
 echo Starting FS Fingate Web Application...
 python run.py
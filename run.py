@@ -1,6 +1,11 @@
+import importlib.util
+import os
+import subprocess
 import sys
 import socket
-from app import app
+
+# Packages listed by --profile-startup
+PROFILE_TOP = 20
 
 def find_free_port():
     """Find a free port to run the application"""
@@ -14,8 +19,66 @@ def find_free_port():
             continue
     return 5000
 
+def profile_startup(module):
+    """Import ``module`` in a fresh interpreter and print what each package costs to import"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        print(f"❌ Could not import {module}")
+        return 1
+    
+    # Lines look like "import time:  <self us> | <cumulative us> | <indented module>";
+    # self times add up to the whole import, so they are summed per top-level package
+    costs = {}
+    counts = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        costs[package] = costs.get(package, 0) + int(self_us)
+        counts[package] = counts.get(package, 0) + 1
+    
+    total = sum(costs.values())
+    print(f"\n⏱️  Importing {module} takes {total / 1000:.1f} ms ({sum(counts.values())} modules)\n")
+    print(f"{'package':<30}{'ms':>10}{'share':>8}{'modules':>9}")
+    for package, cost in sorted(costs.items(), key=lambda item: item[1], reverse=True)[:PROFILE_TOP]:
+        print(f"{package:<30}{cost / 1000:>10.1f}{cost / total:>8.0%}{counts[package]:>9}")
+    return 0
+
+# App served by --production; the page's automatic load needs /auto_load and /jobs,
+# which only simple_app has. --app=app:app serves app.py instead
+PRODUCTION_APP = 'simple_app:app'
+
+def run_production(port, app_uri=PRODUCTION_APP):
+    """Replace this process with a gunicorn master serving ``app_uri`` (settings in gunicorn_conf.py)"""
+    if os.name == 'nt':
+        print("❌ gunicorn does not run on Windows; use WSL, or python run.py --asgi")
+        return 1
+    if importlib.util.find_spec('gunicorn') is None:
+        print("❌ gunicorn is not installed: pip install gunicorn")
+        return 1
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    os.environ.setdefault('PORT', str(port))
+    # exec, so signals (HUP to reload, TERM to stop) reach the gunicorn master
+    os.execv(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_conf.py', app_uri])
+
 if __name__ == '__main__':
+    profile_flag = next((arg for arg in sys.argv if arg.startswith('--profile-startup')), None)
+    if profile_flag:
+        # --profile-startup=<module> profiles another entry point, e.g. simple_app
+        module = profile_flag.partition('=')[2]
+        sys.exit(profile_startup(module or ('asgi_app' if '--asgi' in sys.argv else 'app')))
+    
     port = find_free_port()
+    if '--production' in sys.argv:
+        print(f"\n🚀 Starting FS Fingate in production mode on port {port}...", flush=True)
+        app_flag = next((arg for arg in sys.argv if arg.startswith('--app=')), None)
+        sys.exit(run_production(port, app_flag.partition('=')[2] if app_flag else PRODUCTION_APP))
+    
     print(f"\n🚀 Starting FS Fingate Web Application...")
     print(f"📍 Server will be available at:")
     print(f"   - http://localhost:{port}")
@@ -28,7 +91,13 @@ if __name__ == '__main__':
     print(f"\n🛑 Press Ctrl+C to stop the server\n")
     
     try:
-        app.run(host='0.0.0.0', port=port, debug=True, threaded=True)
+        if '--asgi' in sys.argv:
+            # Asyncio mode: downloads and extraction never hold up the event loop
+            import uvicorn
+            uvicorn.run('asgi_app:app', host='0.0.0.0', port=port)
+        else:
+            from app import app
+            app.run(host='0.0.0.0', port=port, debug=True, threaded=True)
     except Exception as e:
         print(f"\n❌ Error starting server: {e}")
         print(f"💡 Try running: python -m flask run --host=0.0.0.0 --port={port}")
@@ -1,85 +1,52 @@
-from flask import Flask, render_template, request, jsonify, send_file
-from werkzeug.utils import secure_filename
-from io import StringIO, BytesIO
-from bs4 import BeautifulSoup
-import zipfile
-import gdown
-import tempfile
+from flask import Flask, Response, abort, make_response, render_template, request, jsonify, send_file
+from functools import wraps
+import json
 import os
-import csv
-import xlsxwriter
+import re
+import zipfile
+import metrics
+import request_profile
+import zip_processing
+from table_cache import TableCache
+from drive_download import archive_digest, get_drive_cache, open_archive, open_drive_archive
+from numeric_clean import is_text_row, is_unparsed, normalize_number_text
+from table_payload import Records, encode_json, format_tables
+import static_assets
+from result_store import ResultStore
+from excel_export import EXCEL_FILENAME, EXCEL_MIMETYPE, export_workbook, iter_file_chunks, remove_file
+from jobs import JOB_TTL, JobQueue, QueueFull, MAX_POLL_WAIT, spool_upload
+
+# BeautifulSoup, pandas and plotly are imported by the functions that use
+# them, so the server starts without loading them
 
 app = Flask(__name__)
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['UPLOAD_FOLDER'] = 'uploads'
+# Uploads are spooled to disk by Werkzeug and read in place, so this no
+# longer bounds memory per request
+app.config['MAX_CONTENT_LENGTH'] = 200 * 1024 * 1024  # 200MB max file size
+# index.html links the content-hashed assets built by static_assets.py
+app.jinja_env.globals.update(asset_url=static_assets.asset_url, image_set=static_assets.image_set)
 
-if not os.path.exists(app.config['UPLOAD_FOLDER']):
-    os.makedirs(app.config['UPLOAD_FOLDER'])
+table_cache = TableCache('records')
+result_store = ResultStore('records')
+# Job progress is shared through disk, so any worker process can answer a poll
+job_queue = JobQueue(store=ResultStore('jobs-records', ttl=JOB_TTL, hot_entries=0))
+# Seconds a client is asked to wait when the job queue is full
+JOB_RETRY_AFTER = 5
 
-def download_zip_from_drive(file_id):
-    """Download ZIP file from Google Drive with multiple fallback methods"""
-    
-    # Method 1: Try gdown with direct download
-    try:
-        url = f"https://drive.google.com/uc?id={file_id}&export=download"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as tmp_file:
-            print(f"Attempting download from: {url}")
-            gdown.download(url, tmp_file.name, quiet=False)
-            
-            if os.path.getsize(tmp_file.name) > 0:
-                with open(tmp_file.name, "rb") as f:
-                    content = f.read()
-                os.unlink(tmp_file.name)  # Clean up
-                return BytesIO(content)
-    except Exception as e:
-        print(f"Method 1 failed: {e}")
-    
-    # Method 2: Try alternative gdown approach
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as tmp_file:
-            print(f"Trying alternative download for file ID: {file_id}")
-            gdown.download(f"https://drive.google.com/file/d/{file_id}/view?usp=sharing", 
-                          tmp_file.name, quiet=False, fuzzy=True)
-            
-            if os.path.getsize(tmp_file.name) > 0:
-                with open(tmp_file.name, "rb") as f:
-                    content = f.read()
-                os.unlink(tmp_file.name)  # Clean up
-                return BytesIO(content)
-    except Exception as e:
-        print(f"Method 2 failed: {e}")
-    
-    # Method 3: Direct requests approach
-    try:
-        import requests
-        session = requests.Session()
-        
-        # First request to get confirmation token
-        response = session.get(f"https://drive.google.com/uc?id={file_id}&export=download", 
-                              stream=True)
-        
-        # Check for virus scan warning
-        token = None
-        for key, value in response.cookies.items():
-            if key.startswith('download_warning'):
-                token = value
-                break
-        
-        if token:
-            params = {'id': file_id, 'confirm': token, 'export': 'download'}
-            response = session.get("https://drive.google.com/uc", params=params, stream=True)
-        
-        if response.status_code == 200 and response.headers.get('content-length', '0') != '0':
-            return BytesIO(response.content)
-            
-    except Exception as e:
-        print(f"Method 3 failed: {e}")
-    
-    return None
+# Default file ID from the original fs_extract.py
+DEFAULT_FILE_ID = "1A0yeEBAvLkX64PlatHboPAHhHVIcJICw"
+DRIVE_DOWNLOAD_ERROR = 'Failed to download from Google Drive. Please check:\n1. File ID is correct\n2. File is publicly accessible\n3. File sharing is enabled'
+RESULT_EXPIRED_ERROR = 'These tables are no longer on the server, please load them again'
+INVALID_JSON_ERROR = 'The request body must be a JSON object'
+# Seconds browsers may reuse the chart template
+CHART_TEMPLATE_MAX_AGE = 86400
 
 def extract_tables_from_html(html_content):
-    soup = BeautifulSoup(html_content, "html.parser")
-    tables = soup.find_all("table")
+    from bs4 import BeautifulSoup
+
+    with metrics.stage("html_parse"):
+        soup = BeautifulSoup(html_content, "html.parser")
+        tables = soup.find_all("table")
     if tables:
         try:
             # Extract table data manually without pandas
@@ -88,20 +55,23 @@ def extract_tables_from_html(html_content):
             
             table_data = []
             headers = []
+            label_columns = ()
+            failed = 0
             
             for i, row in enumerate(rows):
                 cells = row.find_all(["th", "td"])
                 row_data = []
                 for cell in cells:
                     text = cell.get_text(strip=True)
-                    # Clean the data like in original
-                    text = text.replace('.', '').replace(')', '').replace('(', '-').replace(',', '')
-                    row_data.append(text)
+                    # Same amount normalization as the pandas paths; labels are left alone
+                    row_data.append(normalize_number_text(text))
                 
                 if i == 0:  # First row as headers
                     headers = row_data
+                    label_columns = label_column_indexes(headers)
                 else:
                     table_data.append(dict(zip(headers, row_data)))
+                    failed += coerce_failures(row_data[:len(headers)], label_columns)
             
             # Reorder columns to put Fiscal Year End first
             if table_data and headers:
@@ -124,32 +94,199 @@ def extract_tables_from_html(html_content):
                             reordered_row[header] = row.get(header, '')
                         reordered_data.append(reordered_row)
                     
-                    return reordered_data
+                    table_data = reordered_data
             
-            return table_data
+            metrics.COERCE_FAILURES.inc(failed, stage="extract")
+            # The count stays on the table, as app.py keeps it in df.attrs
+            return Records(table_data, {'coerce_failures': failed})
         except Exception as e:
             return f"Error reading table: {e}"
     return "No tables found in HTML file."
 
+def label_column_indexes(headers):
+    """The first column and the first fiscal year one hold labels; every other column holds amounts"""
+    fiscal = [j for j, h in enumerate(headers) if 'fiscal' in h.lower() and 'year' in h.lower()]
+    return {0} | set(fiscal[:1])
+
+def coerce_failures(row_data, label_columns):
+    """Amount cells of one row that are not numbers; text rows such as the audit status have none"""
+    if any(is_text_row(row_data[j]) for j in label_columns if j < len(row_data)):
+        return 0
+    return sum(1 for j, value in enumerate(row_data) if j not in label_columns and is_unparsed(value))
+
+def serialize_table(table_data):
+    if isinstance(table_data, list):
+        return table_data
+    return {'error': str(table_data)}
+
+def serialize_tables(tables):
+    return {name: serialize_table(table_data) for name, table_data in tables.items()}
+
+def tables_payload(tables_data, result_id):
+    """Response payload for stored tables, with the cells of each table that did not read as numbers"""
+    failures = {
+        name: getattr(table, 'attrs', {}).get('coerce_failures', 0)
+        for name, table in tables_data.items() if isinstance(table, list)
+    }
+    return {'tables': tables_data, 'result_id': result_id, 'coerce_failures': failures}
+
+def tables_result(tables_data):
+    """Response payload for extracted tables, kept server-side so /export_excel only needs the id"""
+    return tables_payload(tables_data, result_store.put(tables_data))
+
+def json_body():
+    """The request's JSON object, or None if the body is missing, not JSON or not an object"""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+def tables_response(payload):
+    """jsonify for table payloads: columnar with ?format=columnar, rendered with ?format=html,
+    compressed if the client accepts it"""
+    payload = format_tables(payload, request.args.get('format'))
+    body, headers = encode_json(payload, request.headers.get('Accept-Encoding'))
+    return Response(body, mimetype='application/json', headers=headers)
+
+def clean_drive_file_id(file_id):
+    """Extract the file ID from a Drive URL; None if the URL has no ID"""
+    if 'drive.google.com' in file_id:
+        match = re.search(r'/d/([a-zA-Z0-9-_]+)', file_id)
+        return match.group(1) if match else None
+    return file_id
+
+def warm_up():
+    """Parse a one-line statement and build the chart template, then start the extraction pool
+
+    Called by each production worker at boot (see gunicorn_conf.py).
+    """
+    from table_extract import WARM_UP_HTML
+    from table_render import rendered_table
+    from chart_factory import table_chart_specs, template_json
+
+    table = extract_tables_from_html(WARM_UP_HTML)
+    rendered_table(table)
+    table_chart_specs(table)
+    template_json()
+    static_assets.manifest()
+    zip_processing.start_pool()
+
+def auto_load_etag(digest, table_format, coding=None):
+    """Strong ETag of an /auto_load response: the archive's content hash, table format and content coding"""
+    return '"' + '-'.join([digest, table_format or 'records'] + ([coding] if coding else [])) + '"'
+
+def auto_load_known_etag(if_none_match, digest, table_format):
+    """The ETag in If-None-Match that still matches the archive, in any content coding; None if none does"""
+    for coding in (None, 'gzip', 'br'):
+        etag = auto_load_etag(digest, table_format, coding)
+        if static_assets.not_modified(if_none_match, etag):
+            return etag
+    return None
+
 def process_zip_file(zip_file):
-    html_tables = {}
+    # Unchanged statements come from the cache; large archives are spread
+    # over a process pool, results stay in archive order
+    return zip_processing.process_zip_file(zip_file, extract_tables_from_html, cache=table_cache)
+
+def process_archive_path(path):
+    with open_archive(path) as zip_file:
+        return process_zip_file(zip_file)
+
+def publish_zip_tables(job, zip_file, result_id=None):
+    """Extract an archive for a background job, publishing each table as soon as it is ready"""
     try:
-        with zipfile.ZipFile(zip_file, "r") as zip_ref:
-            html_files = [f for f in zip_ref.namelist() if f.lower().endswith(".html")]
-            for html_file in html_files:
-                with zip_ref.open(html_file) as file:
-                    html_content = file.read().decode("utf-8")
-                    result = extract_tables_from_html(html_content)
-                    html_tables[html_file] = result
+        zip_ref = zip_processing.open_zip(zip_file)
     except zipfile.BadZipFile:
-        return None
-    return html_tables
+        job.finish('Invalid ZIP file')
+        return
+    with zip_ref:
+        job.start(len(zip_processing.html_members(zip_ref)))
+        for name, table_data in zip_processing.iter_zip_tables(zip_ref, extract_tables_from_html, cache=table_cache):
+            job.publish(name, serialize_table(table_data))
+    job.result_id = result_store.put(dict(job.results), result_id)
+
+def upload_job(job, path):
+    try:
+        with open(path, 'rb') as zip_file:
+            publish_zip_tables(job, zip_file)
+    finally:
+        os.unlink(path)
+
+def drive_job(job, file_id):
+    path = get_drive_cache().fetch(file_id)
+    if path is None:
+        job.finish(DRIVE_DOWNLOAD_ERROR)
+        return
+    # Stored under the archive's hash like /auto_load, so the page can keep the job's
+    # tables with the ETag /auto_load would give them
+    job.digest = archive_digest(path)
+    with open_archive(path) as zip_file:
+        publish_zip_tables(job, zip_file, job.digest)
+
+def job_state(job, since, table_format):
+    """Job snapshot; a finished Drive job also carries the ETag of its tables from /auto_load"""
+    state = job.snapshot(since)
+    if job.digest and state['status'] == 'done':
+        state['etag'] = auto_load_etag(job.digest, table_format)
+    return state
+
+def profiled(view):
+    """Profile requests carrying the admin profiling token; without FS_PROFILE_TOKEN the view is left as is"""
+    if not request_profile.ENABLED:
+        return view
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not request_profile.authorized(request.headers, request.args):
+            return view(*args, **kwargs)
+        with request_profile.RequestProfile(request.method, request.path) as profile:
+            response = make_response(view(*args, **kwargs))
+        if profile.id:
+            response.headers[request_profile.ID_HEADER] = profile.id
+        return response
+    return wrapper
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/static/dist/<path:filename>')
+def static_asset(filename):
+    """A content-hashed static file, pre-compressed if the client accepts it; browsers keep it for a year"""
+    asset = static_assets.dist_file(filename, request.headers.get('Accept-Encoding'))
+    if asset is None:
+        abort(404)
+    path, mimetype, headers = asset
+    if static_assets.not_modified(request.headers.get('If-None-Match'), headers['ETag']):
+        return Response(status=304, headers=headers)
+    response = send_file(path, mimetype=mimetype, conditional=False, etag=False)
+    response.headers.update(headers)
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Pipeline stage timings, byte and table counts in the Prometheus text format"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/profiles')
+def list_profiles():
+    """Stored request profiles, newest first; admin only"""
+    if not request_profile.authorized(request.headers, request.args):
+        abort(403)
+    return jsonify(request_profile.list_profiles())
+
+@app.route('/profiles/<profile_id>/<kind>')
+def download_profile(profile_id, kind):
+    """A profile's folded stacks ("cpu" or "memory") or its "meta" JSON; admin only"""
+    if not request_profile.authorized(request.headers, request.args):
+        abort(403)
+    path = request_profile.profile_path(profile_id, kind)
+    if path is None:
+        abort(404)
+    if kind == 'meta':
+        return send_file(path, mimetype='application/json')
+    return send_file(path, mimetype='text/plain', as_attachment=True, download_name=os.path.basename(path))
+
 @app.route('/upload', methods=['POST'])
+@profiled
 def upload_file():
     if 'file' not in request.files:
         return jsonify({'error': 'No file uploaded'})
@@ -159,99 +296,140 @@ def upload_file():
         return jsonify({'error': 'No file selected'})
     
     if file and file.filename.lower().endswith('.zip'):
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        
-        with open(file_path, 'rb') as f:
-            zip_file = BytesIO(f.read())
-        
-        tables = process_zip_file(zip_file)
-        os.remove(file_path)
+        # Read the archive straight from Werkzeug's spooled upload
+        tables = process_zip_file(file.stream)
         
         if tables is None:
             return jsonify({'error': 'Invalid ZIP file'})
         
-        tables_data = {}
-        for name, table_data in tables.items():
-            if isinstance(table_data, list):
-                tables_data[name] = table_data
-            else:
-                tables_data[name] = {'error': str(table_data)}
-        
-        return jsonify({'tables': tables_data})
+        return tables_response(tables_result(serialize_tables(tables)))
     
     return jsonify({'error': 'Please upload a ZIP file'})
 
 @app.route('/download_drive', methods=['POST'])
+@profiled
 def download_from_drive():
-    data = request.get_json()
+    data = json_body()
+    if data is None:
+        return jsonify({'error': INVALID_JSON_ERROR}), 400
     file_id = data.get('file_id', '').strip()
     
     if not file_id:
         return jsonify({'error': 'No file ID provided'})
     
     # Clean file ID (extract from URL if needed)
-    if 'drive.google.com' in file_id:
-        import re
-        match = re.search(r'/d/([a-zA-Z0-9-_]+)', file_id)
-        if match:
-            file_id = match.group(1)
-        else:
-            return jsonify({'error': 'Invalid Google Drive URL format'})
+    file_id = clean_drive_file_id(file_id)
+    if file_id is None:
+        return jsonify({'error': 'Invalid Google Drive URL format'})
     
     print(f"Attempting to download file ID: {file_id}")
     
-    zip_file = download_zip_from_drive(file_id)
-    if zip_file is None:
-        return jsonify({'error': 'Failed to download from Google Drive. Please check:\n1. File ID is correct\n2. File is publicly accessible\n3. File sharing is enabled'})
+    with open_drive_archive(file_id) as zip_file:
+        if zip_file is None:
+            return jsonify({'error': DRIVE_DOWNLOAD_ERROR})
+        tables = process_zip_file(zip_file)
     
-    tables = process_zip_file(zip_file)
     if tables is None:
         return jsonify({'error': 'Downloaded file is not a valid ZIP file'})
     
     if not tables:
         return jsonify({'error': 'No HTML files found in the ZIP archive'})
     
-    tables_data = {}
-    for name, table_data in tables.items():
-        if isinstance(table_data, list):
-            tables_data[name] = table_data
-        else:
-            tables_data[name] = {'error': str(table_data)}
-    
-    return jsonify({'tables': tables_data})
+    return tables_response(tables_result(serialize_tables(tables)))
 
-@app.route('/auto_load', methods=['POST'])
+@app.route('/auto_load', methods=['GET', 'POST'])
+@profiled
 def auto_load():
-    """Automatically load the default Google Drive file"""
-    
-    # Default file ID from the original fs_extract.py
-    default_file_id = "1A0yeEBAvLkX64PlatHboPAHhHVIcJICw"
+    """Automatically load the default Google Drive file
+
+    GET responses carry a strong ETag derived from the archive's content;
+    a GET with a matching If-None-Match gets a 304 while the archive is
+    unchanged.
+    """
     
-    print(f"Auto-loading default file ID: {default_file_id}")
+    print(f"Auto-loading default file ID: {DEFAULT_FILE_ID}")
     
-    zip_file = download_zip_from_drive(default_file_id)
-    if zip_file is None:
+    path = get_drive_cache().fetch(DEFAULT_FILE_ID)
+    if path is None:
         # Return test data if download fails
-        return jsonify({'tables': get_test_data()})
+        return tables_response(tables_result(get_test_data()))
     
-    tables = process_zip_file(zip_file)
-    if tables is None:
-        return jsonify({'tables': get_test_data()})
+    # The same archive is stored under the same result id, so the body (and
+    # the ETag) only change with the archive
+    digest = archive_digest(path)
+    table_format = request.args.get('format')
+    known_etag = None
+    if request.method == 'GET':
+        known_etag = auto_load_known_etag(request.headers.get('If-None-Match'), digest, table_format)
+    if known_etag and result_store.touch(digest):
+        return Response(status=304, headers={'ETag': known_etag, 'Cache-Control': 'no-cache'})
     
+    tables = process_archive_path(path)
     if not tables:
-        return jsonify({'tables': get_test_data()})
-    
-    tables_data = {}
-    for name, table_data in tables.items():
-        if isinstance(table_data, list):
-            tables_data[name] = table_data
-        else:
-            tables_data[name] = {'error': str(table_data)}
+        return tables_response(tables_result(get_test_data()))
     
+    tables_data = serialize_tables(tables)
+    result_store.put(tables_data, digest)
+    if known_etag:
+        # The browser has these tables already; only the server's copy had expired
+        return Response(status=304, headers={'ETag': known_etag, 'Cache-Control': 'no-cache'})
     print(f"Successfully loaded {len(tables_data)} tables from default file")
-    return jsonify({'tables': tables_data})
+    response = tables_response(tables_payload(tables_data, digest))
+    if request.method == 'GET':
+        response.headers['ETag'] = auto_load_etag(digest, table_format, response.headers.get('Content-Encoding'))
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a ZIP upload or Drive file for background extraction and return its job id at once"""
+    path = None
+    if 'file' in request.files:
+        file = request.files['file']
+        if not file.filename.lower().endswith('.zip'):
+            return jsonify({'error': 'Please upload a ZIP file'}), 400
+        path = spool_upload(file.stream)
+        target, arg = upload_job, path
+    else:
+        data = json_body() or {}
+        # Without a file ID this is the background version of /auto_load
+        file_id = clean_drive_file_id(data.get('file_id', '').strip() or DEFAULT_FILE_ID)
+        if file_id is None:
+            return jsonify({'error': 'Invalid Google Drive URL format'}), 400
+        target, arg = drive_job, file_id
+    
+    try:
+        job = job_queue.submit(target, arg)
+    except QueueFull as e:
+        if path:
+            os.unlink(path)
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(JOB_RETRY_AFTER)}
+    
+    return jsonify({'job_id': job.id, 'status': job.status}), 202, {'Location': f'/jobs/{job.id}'}
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Job progress plus the tables extracted since ``since``; ``wait`` long-polls for new ones"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    since = request.args.get('since', 0, type=int)
+    wait = min(request.args.get('wait', 0, type=float), MAX_POLL_WAIT)
+    if wait > 0:
+        job.wait(since, wait)
+    return tables_response(job_state(job, since, request.args.get('format')))
+
+@app.route('/jobs/<job_id>/stream')
+def job_stream(job_id):
+    """Stream each table as one JSON line as soon as it is extracted, then the final status"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    since = request.args.get('since', 0, type=int)
+    lines = (json.dumps(event, sort_keys=True) + '\n' for event in job.events(since))
+    return Response(lines, mimetype='application/x-ndjson')
 
 def get_test_data():
     """Return test data for format number checking"""
@@ -284,45 +462,74 @@ def get_test_data():
         ]
     }
 
+def excel_response(tables_data):
+    """Stream the workbook from a temporary file instead of holding it in memory"""
+    path = export_workbook(tables_data, parse_numbers=True)
+    response = Response(
+        iter_file_chunks(path),
+        mimetype=EXCEL_MIMETYPE,
+        headers={
+            'Content-Disposition': f'attachment; filename={EXCEL_FILENAME}',
+            'Content-Length': str(os.path.getsize(path)),
+        },
+    )
+    # The server closes every response, even one whose body was never read
+    response.call_on_close(lambda: remove_file(path))
+    return response
+
 @app.route('/export_excel', methods=['POST'])
+@profiled
 def export_excel():
-    data = request.get_json()
-    tables_data = data.get('tables', {})
-    
-    output = BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-    
-    for name, table_data in tables_data.items():
-        if 'error' not in table_data and isinstance(table_data, list) and len(table_data) > 0:
-            sheet_name = name[:31].replace('/', '_').replace('\\', '_')
-            worksheet = workbook.add_worksheet(sheet_name)
-            
-            # Write headers
-            headers = list(table_data[0].keys())
-            for col, header in enumerate(headers):
-                worksheet.write(0, col, header)
-            
-            # Write data
-            for row, record in enumerate(table_data, 1):
-                for col, header in enumerate(headers):
-                    value = record.get(header, '')
-                    # Try to convert to number if possible
-                    try:
-                        if value and value != '':
-                            value = float(value.replace(',', ''))
-                    except:
-                        pass
-                    worksheet.write(row, col, value)
-    
-    workbook.close()
-    output.seek(0)
-    
-    return send_file(
-        output,
-        as_attachment=True,
-        download_name='all_tables.xlsx',
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+    data = json_body()
+    if data is None:
+        return jsonify({'error': INVALID_JSON_ERROR}), 400
+    if not data.get('result_id'):
+        # Older clients post the tables back
+        return excel_response(data.get('tables', {}))
+    return export_result(data['result_id'])
+
+@app.route('/export_excel/<result_id>')
+@profiled
+def export_result(result_id):
+    tables_data = result_store.get(result_id)
+    if tables_data is None:
+        return jsonify({'error': RESULT_EXPIRED_ERROR}), 404
+    return excel_response(tables_data)
+
+@app.route('/render/<result_id>')
+def render_table(result_id):
+    """Stream one stored table as the HTML the page would build, a chunk of rows at a time"""
+    from table_render import iter_browser_table
+
+    tables_data = result_store.get(result_id)
+    if tables_data is None:
+        return jsonify({'error': RESULT_EXPIRED_ERROR}), 404
+    table = tables_data.get(request.args.get('table', ''))
+    if not isinstance(table, list):
+        return jsonify({'error': 'Table not found'}), 404
+    return Response(iter_browser_table(table), mimetype='text/html')
+
+@app.route('/charts/template')
+def chart_template():
+    """Styling shared by every chart spec; the same for all statements, so browsers cache it"""
+    from chart_factory import template_json
+
+    response = jsonify(template_json())
+    response.headers['Cache-Control'] = f'public, max-age={CHART_TEMPLATE_MAX_AGE}'
+    return response
+
+@app.route('/charts/<result_id>')
+def table_charts(result_id):
+    """Chart specs of one stored table for Plotly.js, to be drawn with /charts/template"""
+    from chart_factory import table_chart_specs
+
+    tables_data = result_store.get(result_id)
+    if tables_data is None:
+        return jsonify({'error': RESULT_EXPIRED_ERROR}), 404
+    table = tables_data.get(request.args.get('table', ''))
+    if not isinstance(table, list):
+        return jsonify({'error': 'Table not found'}), 404
+    return tables_response({'charts': table_chart_specs(table)})
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
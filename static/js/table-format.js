@@ -0,0 +1,146 @@
+// Table formatting for index.html, run in a Web Worker so long statements do
+// not block the page. The rules match table_render.iter_browser_table, which
+// renders the same markup on the server (?render=server).
+'use strict';
+
+// One formatter for every number; decimals are cut to two, not rounded
+const numberFormat = new Intl.NumberFormat('en-US', { maximumFractionDigits: 2, roundingMode: 'trunc' });
+const DECIMAL = /^\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*$/;
+const HEADER_DATE = /(\d{1,2}-\w{3}-\d{4})/;
+const HEADER_SLASH_DATE = /(\d{1,2}\/\d{1,2}\/\d{4})/;
+const ESCAPES = { '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;' };
+
+function escapeHTML(text) {
+    return String(text).replace(/[&<>"']/g, c => ESCAPES[c]);
+}
+
+function isFiscalYear(header) {
+    const lower = header.toLowerCase();
+    return lower.includes('fiscal') && lower.includes('year');
+}
+
+function isAuditStatus(header) {
+    return isFiscalYear(header) && header.toLowerCase().includes('end');
+}
+
+function cleanHeaderName(header) {
+    // Headers like "31-Dec-2020 200/2014/TT-BTC/LT UnauditedUnaudited" show the date and one audit word
+    if (header.includes('UnauditedUnaudited')) {
+        const dateMatch = header.match(HEADER_DATE);
+        if (dateMatch) {
+            return `${dateMatch[1]}<br/>Unaudited`;
+        }
+    }
+    if (header.includes('AuditedAudited') || header.toLowerCase().includes('auditedaudited')) {
+        const dateMatch = header.match(HEADER_DATE);
+        if (dateMatch) {
+            return `${dateMatch[1]}<br/>Audited`;
+        }
+    }
+    if (header.includes('Chưa kiểm toánChưa kiểm toán')) {
+        const dateMatch = header.match(HEADER_SLASH_DATE);
+        if (dateMatch) {
+            return `${dateMatch[1]}<br/>Chưa kiểm toán`;
+        }
+    }
+    return escapeHTML(header.replace(/\s+/g, ' ').trim());
+}
+
+function cleanCellValue(value) {
+    if (value.includes('UnauditedUnaudited')) {
+        return value.replace(/UnauditedUnaudited/gi, 'Unaudited');
+    }
+    if (value.toLowerCase().includes('auditedaudited')) {
+        return value.replace(/AuditedAudited/gi, 'Audited');
+    }
+    if (value.includes('Chưa kiểm toánChưa kiểm toán')) {
+        return value.replace(/Chưa kiểm toánChưa kiểm toán/g, 'Chưa kiểm toán');
+    }
+    if (!value.toLowerCase().includes('audit')) {
+        return value;
+    }
+    // Other audit words: drop repeated words, keeping the first of each
+    const seen = new Set();
+    return value.split(/\s+/).filter(word => {
+        const lower = word.toLowerCase();
+        if (seen.has(lower)) {
+            return false;
+        }
+        seen.add(lower);
+        return true;
+    }).join(' ');
+}
+
+function formatNumberWithCommas(value) {
+    return numberFormat.format(typeof value === 'number' ? value : parseFloat(value));
+}
+
+function formatCell(value, fiscalYear) {
+    // Missing values, 0 and false show as blank cells
+    value = value || '';
+    if (value === '') {
+        return '';
+    }
+    if (!fiscalYear && (typeof value === 'number' || (typeof value === 'string' && DECIMAL.test(value)))) {
+        return formatNumberWithCommas(value);
+    }
+    return escapeHTML(typeof value === 'string' ? cleanCellValue(value) : value);
+}
+
+function tableColumns(table) {
+    // Columnar tables (?format=columnar) carry the headers once and one value array per column
+    if (table && Array.isArray(table.columns)) {
+        return [table.columns, table.data];
+    }
+    if (Array.isArray(table) && table.length) {
+        const headers = Object.keys(table[0]);
+        return [headers, headers.map(header => table.map(row => row[header]))];
+    }
+    return [[], []];
+}
+
+// {rowCount, columns: [{header, headerClass, cellClass, cells}]} with the
+// "Fiscal Year End" column first and every cell as ready-made HTML
+function prepareTable(table) {
+    const [headers, data] = tableColumns(table);
+    const rowCount = data.length ? data[0].length : 0;
+    if (rowCount === 0) {
+        return { rowCount: 0, columns: [] };
+    }
+
+    const order = headers.map((header, i) => i);
+    const auditIndex = headers.findIndex(isAuditStatus);
+    if (auditIndex > 0) {
+        order.splice(auditIndex, 1);
+        order.unshift(auditIndex);
+    }
+
+    const columns = order.map(i => {
+        const header = headers[i];
+        const audit = isAuditStatus(header);
+        const fiscalYear = isFiscalYear(header);
+        const values = data[i];
+        const cells = new Array(rowCount);
+        for (let row = 0; row < rowCount; row++) {
+            cells[row] = formatCell(values[row], fiscalYear);
+        }
+        return {
+            header: audit ? 'Fiscal Year' : cleanHeaderName(header),
+            headerClass: audit ? 'audit-status-col' : '',
+            cellClass: audit ? 'audit-status-col' : 'number-col',
+            cells,
+        };
+    });
+    return { rowCount, columns };
+}
+
+if (typeof WorkerGlobalScope !== 'undefined' && self instanceof WorkerGlobalScope) {
+    self.onmessage = event => {
+        const { id, table } = event.data;
+        try {
+            self.postMessage({ id, prepared: prepareTable(table) });
+        } catch (error) {
+            self.postMessage({ id, error: error.message });
+        }
+    };
+}
@@ -0,0 +1,272 @@
+"""Static asset pipeline (build with ``python static_assets.py``)
+
+The build fetches local copies of the page's CSS/JS into static/vendor,
+renders AVIF/WebP variants of the background at a few widths, and writes
+every file under static/ to static/dist with its content hash in the name,
+plus .gz/.br copies of text files. Pages link the hashed names through
+``asset_url``, so browsers can cache them for good; before the first build
+the plain /static files (or the CDN) are used.
+"""
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import threading
+from urllib.parse import urljoin
+
+from table_payload import accepted_encodings
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+DIST_URL = "/static/dist/"
+# Hashed names change with their content, so browsers may keep them for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Local copies of the CDN files the page uses, so it works offline. Files the
+# CSS refers to (the Font Awesome fonts) are fetched next to it.
+VENDOR_DIR = os.path.join(STATIC_DIR, "vendor")
+VENDOR_FILES = {
+    "bootstrap/bootstrap.min.css": "https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css",
+    "bootstrap/bootstrap.bundle.min.js": "https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js",
+    "fontawesome/css/all.min.css": "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css",
+}
+# plotly.js as shipped with the plotly package, the version chart templates are built for
+PLOTLY_JS = "plotly/plotly.min.js"
+FETCH_TIMEOUT = 30
+
+# Images served as AVIF/WebP variants, e.g. background/DC-1024.avif; the
+# original is never scaled up
+RESPONSIVE_IMAGES = ("background/DC.png",)
+IMAGE_WIDTHS = (640, 1024, 1536)
+# Preferred first in image-set()
+IMAGE_FORMATS = {
+    "avif": {"quality": 60},
+    "webp": {"quality": 80, "method": 6},
+}
+
+COMPRESSIBLE = {".css", ".js", ".json", ".svg", ".html", ".txt", ".map", ".ttf", ".eot"}
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+_CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def _css_references(css):
+    """Relative paths a stylesheet loads with url(), without query or fragment"""
+    refs = []
+    for _, ref in _CSS_URL.findall(css):
+        if not re.match(r"^(data:|[a-z]+://|/|#)", ref):
+            refs.append(re.split(r"[?#]", ref)[0])
+    return refs
+
+
+def fetch_vendor_files(overwrite=False):
+    """Download VENDOR_FILES into static/vendor and copy plotly.js there; returns the files that are missing"""
+    import requests
+
+    missing = []
+    for name, url in VENDOR_FILES.items():
+        files = [(name, url)]
+        while files:
+            name, url = files.pop()
+            path = os.path.join(VENDOR_DIR, *name.split("/"))
+            if overwrite or not os.path.exists(path):
+                try:
+                    response = requests.get(url, timeout=FETCH_TIMEOUT)
+                    response.raise_for_status()
+                except requests.RequestException as e:
+                    print(f"Could not fetch {url}: {e}")
+                    missing.append(name)
+                    continue
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(response.content)
+            if name.endswith(".css"):
+                with open(path, encoding="utf-8") as f:
+                    for ref in _css_references(f.read()):
+                        files.append((posixpath.normpath(posixpath.join(posixpath.dirname(name), ref)), urljoin(url, ref)))
+
+    try:
+        import plotly
+    except ImportError:
+        missing.append(PLOTLY_JS)
+    else:
+        path = os.path.join(VENDOR_DIR, *PLOTLY_JS.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js"), path)
+    return missing
+
+
+def image_variants(name, data):
+    """{variant name: bytes} for the AVIF/WebP variants of an image"""
+    from PIL import Image
+
+    stem = posixpath.splitext(name)[0]
+    variants = {}
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        for width in IMAGE_WIDTHS:
+            if width > image.width:
+                continue
+            height = round(image.height * width / image.width)
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for fmt, options in IMAGE_FORMATS.items():
+                out = io.BytesIO()
+                resized.save(out, format=fmt.upper(), **options)
+                variants[f"{stem}-{width}.{fmt}"] = out.getvalue()
+    return variants
+
+
+def _hashed_name(name, data):
+    stem, ext = posixpath.splitext(name)
+    return f"{stem}.{hashlib.blake2b(data, digest_size=6).hexdigest()}{ext}"
+
+
+def _rewrite_css(name, css, manifest):
+    """Point a stylesheet's url()s at the hashed copies"""
+    def replace(match):
+        quote, ref = match.groups()
+        path = re.split(r"[?#]", ref)[0]
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(name), path))
+        if target not in manifest:
+            return match.group(0)
+        fragment = ref.partition("#")[2]
+        hashed = posixpath.relpath(manifest[target], posixpath.dirname(name))
+        return f"url({quote}{hashed}{'#' + fragment if fragment else ''}{quote})"
+
+    return _CSS_URL.sub(replace, css)
+
+
+def _compressed(data):
+    """{"gz"/"br": bytes} of the copies that are smaller than ``data``"""
+    copies = {"gz": gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        copies["br"] = brotli.compress(data, quality=BROTLI_QUALITY)
+    return {ext: body for ext, body in copies.items() if len(body) < len(data)}
+
+
+def build(fetch=True):
+    """Rebuild static/dist and its manifest; returns the manifest"""
+    if fetch:
+        missing = fetch_vendor_files()
+        if missing:
+            print(f"Not bundled, the page uses the CDN for: {', '.join(missing)}")
+
+    assets = {}
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != DIST_DIR]
+        for filename in files:
+            path = os.path.join(root, filename)
+            with open(path, "rb") as f:
+                assets[os.path.relpath(path, STATIC_DIR).replace(os.sep, "/")] = f.read()
+    for name in RESPONSIVE_IMAGES:
+        if name in assets:
+            assets.update(image_variants(name, assets[name]))
+
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    manifest = {}
+    # Stylesheets last, so the files they refer to already have their hashed names
+    for name in sorted(assets, key=lambda name: (name.endswith(".css"), name)):
+        data = assets[name]
+        if name.endswith(".css"):
+            data = _rewrite_css(name, data.decode("utf-8"), manifest).encode("utf-8")
+        manifest[name] = _hashed_name(name, data)
+        path = os.path.join(DIST_DIR, *manifest[name].split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        if posixpath.splitext(name)[1] in COMPRESSIBLE:
+            for ext, body in _compressed(data).items():
+                with open(f"{path}.{ext}", "wb") as f:
+                    f.write(body)
+        print(f"{name} -> {manifest[name]} ({len(data) / 1024:,.0f} KB)")
+
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+_manifest = {}
+_manifest_mtime = None
+_manifest_lock = threading.Lock()
+
+
+def manifest():
+    """Logical name -> hashed name from the last build, reloaded when it is rebuilt; empty before a build"""
+    global _manifest, _manifest_mtime
+    try:
+        mtime = os.path.getmtime(MANIFEST_PATH)
+    except OSError:
+        return {}
+    with _manifest_lock:
+        if mtime != _manifest_mtime:
+            with open(MANIFEST_PATH, encoding="utf-8") as f:
+                _manifest = json.load(f)
+            _manifest_mtime = mtime
+        return _manifest
+
+
+def asset_url(name, fallback=None):
+    """URL of a static file: its hashed copy once built, else the file itself, else ``fallback`` (a CDN URL)"""
+    hashed = manifest().get(name)
+    if hashed:
+        return DIST_URL + hashed
+    if fallback and not os.path.isfile(os.path.join(STATIC_DIR, *name.split("/"))):
+        return fallback
+    return f"/static/{name}"
+
+
+def image_set(name, width=None):
+    """CSS image-set() of an image's AVIF/WebP variants at ``width`` (default the largest), the image itself last
+
+    Falls back to a plain url() when the variants have not been built.
+    """
+    assets = manifest()
+    stem = posixpath.splitext(name)[0]
+    original = f'url("{asset_url(name)}") type("{mimetypes.guess_type(name)[0]}")'
+    for w in [width] if width else sorted(IMAGE_WIDTHS, reverse=True):
+        variants = [f"{stem}-{w}.{fmt}" for fmt in IMAGE_FORMATS]
+        if all(variant in assets for variant in variants):
+            options = [f'url("{DIST_URL}{assets[v]}") type("image/{fmt}")' for v, fmt in zip(variants, IMAGE_FORMATS)]
+            return f"image-set({', '.join(options + [original])})"
+    return f'url("{asset_url(name)}")'
+
+
+def dist_file(filename, accept_encoding=None):
+    """(path, media type, headers) for a hashed file, pre-compressed if the client accepts it; None if unknown"""
+    assets = manifest()
+    if filename not in set(assets.values()):
+        return None
+    path = os.path.join(DIST_DIR, *filename.split("/"))
+    headers = {
+        "Cache-Control": f"public, max-age={IMMUTABLE_MAX_AGE}, immutable",
+        "Vary": "Accept-Encoding",
+    }
+    accepted = accepted_encodings(accept_encoding)
+    for coding, ext in (("br", "br"), ("gzip", "gz")):
+        if coding in accepted and os.path.isfile(f"{path}.{ext}"):
+            path = f"{path}.{ext}"
+            headers["Content-Encoding"] = coding
+            break
+    headers["ETag"] = f'"{os.path.basename(path)}"'
+    return path, mimetypes.guess_type(filename)[0] or "application/octet-stream", headers
+
+
+def not_modified(if_none_match, etag):
+    """True when an If-None-Match header already names ``etag``"""
+    tags = [tag.strip() for tag in (if_none_match or "").split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+if __name__ == "__main__":
+    build()
@@ -0,0 +1,193 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from table_payload import Records
+
+# Bump when extraction or cleaning changes what gets stored
+CACHE_VERSION = 3
+
+CACHE_DIR = os.environ.get("FS_CACHE_DIR", os.path.join("cache", "tables"))
+# Disk budget in MB; 0 keeps only the in-process tier
+CACHE_MAX_MB = int(os.environ.get("FS_CACHE_MAX_MB", "512"))
+# Number of decoded tables kept in memory per process
+HOT_ENTRIES = int(os.environ.get("FS_CACHE_HOT_ENTRIES", "256"))
+
+
+@functools.lru_cache(maxsize=64)
+def extractor_id(extract):
+    """Short hash naming an extract function, its bound keywords and its ``cache_variant`` (e.g. the engine)
+
+    Results of different extractors, or of one extractor with different
+    engines, never share a cache key.
+    """
+    keywords = {}
+    while isinstance(extract, functools.partial):
+        keywords = {**extract.keywords, **keywords}
+        extract = extract.func
+    parts = [f"{extract.__module__}.{extract.__qualname__}", str(getattr(extract, "cache_variant", ""))]
+    parts.extend(f"{name}={value}" for name, value in sorted(keywords.items()))
+    return hashlib.blake2b("|".join(parts).encode("utf-8"), digest_size=4).hexdigest()
+
+
+def content_key(data, namespace="", extract=None):
+    """Content hash of a ZIP member, scoped to the namespace and extractor that produced the result"""
+    digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+    if extract is None:
+        return f"{namespace}-v{CACHE_VERSION}-{digest}"
+    return f"{namespace}-v{CACHE_VERSION}-{extractor_id(extract)}-{digest}"
+
+
+def _copy(value):
+    if isinstance(value, list):
+        return Records((dict(record) for record in value), getattr(value, "attrs", None))
+    # Copy-on-write makes a shallow copy safe to hand out
+    return value.copy(deep=False)
+
+
+class TableCache:
+    """Two-tier LRU cache of extracted tables keyed by member content hash
+
+    DataFrames are stored on disk as Parquet, lists of records (simple_app)
+    as column-oriented JSON. Error messages are never cached.
+    """
+
+    def __init__(self, namespace, directory=CACHE_DIR, max_mb=CACHE_MAX_MB, hot_entries=HOT_ENTRIES):
+        self.namespace = namespace
+        self.directory = directory
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hot_entries = hot_entries
+        self._hot = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+        if self.max_bytes:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, data, extract=None):
+        return content_key(data, self.namespace, extract)
+
+    def get(self, key):
+        with self._lock:
+            value = self._hot.get(key)
+            if value is not None:
+                self._hot.move_to_end(key)
+                return _copy(value)
+
+        value = self._read_disk(key) if self.max_bytes else None
+        if value is not None:
+            self._remember(key, value)
+            return _copy(value)
+        return None
+
+    def put(self, key, value):
+        if isinstance(value, list):
+            if not value or any(list(record) != list(value[0]) for record in value):
+                return
+        elif not hasattr(value, "to_parquet"):
+            return
+        self._remember(key, _copy(value))
+        if self.max_bytes:
+            self._write_disk(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._hot.clear()
+        if os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if entry.name.startswith(self.namespace + "-"):
+                    os.unlink(entry.path)
+        self._disk_bytes = None
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._hot[key] = value
+            self._hot.move_to_end(key)
+            while len(self._hot) > self.hot_entries:
+                self._hot.popitem(last=False)
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def _read_disk(self, key):
+        import pandas as pd
+
+        for suffix in (".parquet", ".json"):
+            path = self._path(key, suffix)
+            try:
+                if suffix == ".parquet":
+                    value = pd.read_parquet(path)
+                else:
+                    with open(path, encoding="utf-8") as f:
+                        stored = json.load(f)
+                    columns = stored["columns"]
+                    value = Records((dict(zip(columns, row)) for row in zip(*stored["values"])), stored.get("attrs"))
+            except (FileNotFoundError, OSError):
+                continue
+            except Exception as e:
+                print(f"Discarding unreadable cache entry {path}: {e}")
+                os.unlink(path)
+                continue
+            # Touch so eviction sees it as recently used
+            os.utime(path)
+            return value
+        return None
+
+    def _write_disk(self, key, value):
+        suffix = ".json" if isinstance(value, list) else ".parquet"
+        path = self._path(key, suffix)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if isinstance(value, list):
+                columns = list(value[0])
+                stored = {
+                    "columns": columns,
+                    "values": [[record[c] for record in value] for c in columns],
+                    "attrs": getattr(value, "attrs", {}),
+                }
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(stored, f, ensure_ascii=False, separators=(",", ":"))
+            else:
+                value.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            # e.g. duplicate or non-string column names; the hot tier still has it
+            print(f"Not caching {key} on disk: {e}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += os.path.getsize(path)
+        if self._disk_bytes is None or self._disk_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Delete least recently used files until the directory fits the budget"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".tmp"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+        with self._lock:
+            self._disk_bytes = total
@@ -0,0 +1,295 @@
+import os
+import re
+from io import StringIO
+
+import pandas as pd
+from lxml import etree
+
+import metrics
+from numeric_clean import clean_numeric_columns
+
+# Available engines: "lxml" parses the document once and stops at the end of
+# the first <table>; "bs4" is the original BeautifulSoup + pd.read_html path
+ENGINES = ("lxml", "bs4")
+DEFAULT_ENGINE = os.environ.get("FS_TABLE_ENGINE", "lxml")
+
+# Size of the slices fed to the pull parser between checks for </table>
+FEED_CHUNK_SIZE = 64 * 1024
+
+# A one-line statement the production workers parse at boot (see app.warm_up)
+WARM_UP_HTML = (
+    "<table><thead><tr><th>Fiscal Year End</th><th>31-Dec-2023</th><th>31-Dec-2024</th></tr></thead>"
+    "<tbody><tr><td>3. Net revenue</td><td>1,000</td><td>(1,200)</td></tr></tbody></table>"
+)
+
+# Cell texts pd.read_html reads as missing (pandas' default na_values)
+NA_TEXTS = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+])
+
+# Same whitespace folding pd.read_html applies to every cell
+_RE_WHITESPACE = re.compile(r"[\r\n]+|\s{2,}")
+
+
+def _clean_text(text):
+    return _RE_WHITESPACE.sub(" ", text).strip()
+
+
+def _iter_chunks(html_content):
+    if isinstance(html_content, (str, bytes)):
+        for start in range(0, len(html_content), FEED_CHUNK_SIZE):
+            yield html_content[start:start + FEED_CHUNK_SIZE]
+    elif hasattr(html_content, "read"):
+        while True:
+            chunk = html_content.read(FEED_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        yield from html_content
+
+
+def find_first_table(html_content, encoding="utf-8"):
+    """Parse HTML incrementally and return the first <table> element, or None"""
+    parser = etree.HTMLPullParser(events=("start", "end"), encoding=encoding)
+    table = None
+
+    def scan_events():
+        nonlocal table
+        for event, element in parser.read_events():
+            if element.tag != "table":
+                continue
+            if event == "start" and table is None:
+                table = element
+            elif event == "end" and element is table:
+                return True
+        return False
+
+    for chunk in _iter_chunks(html_content):
+        parser.feed(chunk)
+        if scan_events():
+            return table
+
+    # Document ended without closing the table (or had none)
+    parser.close()
+    scan_events()
+    return table
+
+
+def _thead_rows(table):
+    rows = []
+    for thead in table.xpath(".//thead"):
+        rows.extend(thead.xpath("./tr"))
+        # Malformed <thead><th>..</th></thead> without a <tr>
+        if thead.xpath("./td|./th"):
+            rows.append(thead)
+    return rows
+
+
+def _expand_spans(rows, remainder=None, overflow=True):
+    """Expand colspan/rowspan into text rows, the way pd.read_html does"""
+    all_texts = []
+    remainder = remainder if remainder is not None else []
+
+    for tr in rows:
+        texts = []
+        next_remainder = []
+        index = 0
+        for td in tr.xpath("./td|./th"):
+            while remainder and remainder[0][0] <= index:
+                prev_i, prev_text, prev_rowspan = remainder.pop(0)
+                texts.append(prev_text)
+                if prev_rowspan > 1:
+                    next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+                index += 1
+
+            text = _clean_text(td.xpath("string()"))
+            rowspan = int(td.get("rowspan") or 1)
+            colspan = int(td.get("colspan") or 1)
+            for _ in range(colspan):
+                texts.append(text)
+                if rowspan > 1:
+                    next_remainder.append((index, text, rowspan - 1))
+                index += 1
+
+        for prev_i, prev_text, prev_rowspan in remainder:
+            texts.append(prev_text)
+            if prev_rowspan > 1:
+                next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+
+        all_texts.append(texts)
+        remainder = next_remainder
+
+    if not overflow:
+        while remainder:
+            next_remainder = []
+            texts = []
+            for prev_i, prev_text, prev_rowspan in remainder:
+                texts.append(prev_text)
+                if prev_rowspan > 1:
+                    next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+            all_texts.append(texts)
+            remainder = next_remainder
+
+    return all_texts, remainder
+
+
+def _drop(element):
+    """Remove an element and its children but keep its tail text, like lxml.html's drop_tree"""
+    parent = element.getparent()
+    if parent is None:
+        return
+    if element.tail:
+        previous = element.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or "") + element.tail
+        else:
+            parent.text = (parent.text or "") + element.tail
+    parent.remove(element)
+
+
+def table_rows(table):
+    """Split a <table> element into header and body text rows"""
+    # Match pd.read_html(displayed_only=True)
+    for element in table.xpath(".//style"):
+        _drop(element)
+    for element in table.xpath(".//*[@style]"):
+        if "display:none" in element.get("style", "").replace(" ", ""):
+            _drop(element)
+    for br in table.iter("br"):
+        br.tail = "\n" + (br.tail or "")
+
+    header_rows = _thead_rows(table)
+    body_rows = table.xpath(".//tbody//tr") + table.xpath("./tr")
+    footer_rows = table.xpath(".//tfoot//tr")
+
+    if not header_rows:
+        # No <thead>: leading rows made only of <th> cells form the header
+        while body_rows and all(cell.tag == "th" for cell in body_rows[0].xpath("./td|./th")):
+            header_rows.append(body_rows.pop(0))
+
+    header, remainder = _expand_spans(header_rows)
+    body, remainder = _expand_spans(body_rows, remainder, overflow=len(footer_rows) > 0)
+    footer, _ = _expand_spans(footer_rows, remainder, overflow=False)
+    return header, body + footer
+
+
+def _column_names(header, width):
+    # Ignore all-empty header rows when there is more than one
+    if len(header) > 1:
+        header = [row for row in header if any(row)]
+    if not header:
+        return list(range(width))
+
+    header = [row + [""] * (width - len(row)) for row in header]
+    if len(header) == 1:
+        names = []
+        seen = {}
+        for i, text in enumerate(header[0]):
+            name = text or f"Unnamed: {i}"
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            names.append(name)
+        return names
+
+    return [
+        tuple(text or f"Unnamed: {i}_level_{level}" for level, text in enumerate(col))
+        for i, col in enumerate(zip(*header))
+    ]
+
+
+def flatten_columns(columns):
+    """Flatten MultiIndex headers, dropping Legal Regulation/Audit Status sub-headers"""
+    new_columns = []
+    for col in columns:
+        if not isinstance(col, tuple):
+            new_columns.append(col)
+        elif len(col) > 1:
+            # If second level contains Legal Regulation or Audit Status, only use first level
+            second_level = str(col[1]).strip().lower()
+            if 'legal regulation' in second_level or 'audit status' in second_level or second_level == 'nan':
+                new_columns.append(str(col[0]).strip())
+            else:
+                new_columns.append(' '.join(map(str, col)).strip())
+        else:
+            new_columns.append(str(col[0]).strip())
+    return new_columns
+
+
+def _lxml_first_table(html_content):
+    table = find_first_table(html_content)
+    if table is None:
+        return None
+
+    header, body = table_rows(table)
+    width = max((len(row) for row in header + body), default=0)
+    if width == 0 or not body:
+        raise ValueError("No tables found")
+
+    # Build the column arrays directly instead of going through TextParser
+    columns = [[] for _ in range(width)]
+    for row in body:
+        for i in range(width):
+            columns[i].append(row[i] if i < len(row) else "")
+    # Empty and "N/A"-like cells become NaN, as pd.read_html does
+    columns = [[None if text in NA_TEXTS else text for text in column] for column in columns]
+
+    names = flatten_columns(_column_names(header, width))
+    df = pd.DataFrame(dict(enumerate(columns)))
+    df.columns = names
+    return df
+
+
+def _bs4_first_table(html_content):
+    from bs4 import BeautifulSoup
+
+    if hasattr(html_content, "read"):
+        html_content = html_content.read()
+    if isinstance(html_content, bytes):
+        html_content = html_content.decode("utf-8")
+    soup = BeautifulSoup(html_content, "html.parser")
+    tables = soup.find_all("table")
+    if not tables:
+        return None
+    df = pd.read_html(StringIO(str(tables[0])))[0]
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = flatten_columns(df.columns)
+    return df
+
+
+def read_first_table(html_content, engine=None):
+    """Return the first table of an HTML document as a raw DataFrame, or None if there is none
+
+    ``html_content`` may be a str, UTF-8 bytes or a binary file object; the
+    lxml engine reads a file object in chunks and stops after the table.
+    """
+    engine = engine or DEFAULT_ENGINE
+    if engine == "lxml":
+        return _lxml_first_table(html_content)
+    if engine == "bs4":
+        return _bs4_first_table(html_content)
+    raise ValueError(f"Unknown table engine: {engine!r} (expected one of {', '.join(ENGINES)})")
+
+
+def extract_tables_from_html(html_content, engine=None):
+    """Extract the first table and clean its numbers; return a DataFrame or an error message"""
+    try:
+        with metrics.stage("html_parse"):
+            df = read_first_table(html_content, engine=engine)
+        if df is None:
+            return "No tables found in HTML file."
+        with metrics.stage("numeric_clean"):
+            df, failed = clean_numeric_columns(df)
+        # The count stays on the table in df.attrs['coerce_failures'] and is reported with it
+        metrics.COERCE_FAILURES.inc(failed, stage="extract")
+        return df
+    except Exception as e:
+        return f"Error reading table: {e}"
+
+
+# Cached tables are keyed by the engine that parsed them (see table_cache.extractor_id)
+extract_tables_from_html.cache_variant = DEFAULT_ENGINE
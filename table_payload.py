@@ -0,0 +1,136 @@
+import gzip
+import json
+import math
+import os
+
+import metrics
+
+# Query values that opt a request into the columnar table format, or into
+# tables rendered to HTML on the server
+COLUMNAR = "columnar"
+HTML = "html"
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.environ.get("FS_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class Records(list):
+    """A table as a list of records (simple_app), with ``attrs`` like DataFrame.attrs
+
+    ``attrs`` holds facts found at extraction time, such as
+    ``coerce_failures``; it survives pickling and the table cache.
+    """
+
+    def __init__(self, records=(), attrs=None):
+        super().__init__(records)
+        self.attrs = dict(attrs or {})
+
+
+def column_type(values):
+    """Return 'number' if every present value is an int or float, else 'string'"""
+    kinds = {type(v) for v in values if v is not None} - {bool}
+    if kinds and kinds <= {int, float}:
+        return "number"
+    return "string"
+
+
+def _json_value(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def columnar_table(table):
+    """Lay a table out as {"columns", "types", "data"}: headers once, then one value array per column
+
+    ``table`` is a DataFrame (app.py) or a list of records (simple_app);
+    anything else, such as an error dict, is returned unchanged.
+    """
+    if hasattr(table, "columns") and hasattr(table, "to_numpy"):
+        columns = [str(c) for c in table.columns]
+        data = []
+        for i in range(len(columns)):
+            column = table.iloc[:, i]
+            # Missing values become null so the payload stays valid JSON
+            data.append(column.astype(object).where(column.notna(), None).tolist())
+    elif isinstance(table, list):
+        columns = list(table[0]) if table else []
+        data = [[_json_value(record.get(c)) for record in table] for c in columns]
+    else:
+        return table
+    return {"columns": columns, "types": [column_type(values) for values in data], "data": data}
+
+
+def is_columnar(table):
+    return isinstance(table, dict) and "columns" in table and "data" in table
+
+
+def records_from_table(table):
+    """Turn a columnar table sent back by the browser into records; other tables pass through"""
+    if not is_columnar(table):
+        return table
+    columns = table["columns"]
+    return [dict(zip(columns, row)) for row in zip(*table["data"])]
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def accepted_encodings(accept_encoding):
+    """Content codings an Accept-Encoding header allows, lower-case; those with q=0 are left out"""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding or params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding)
+    return accepted
+
+
+def encode_json(payload, accept_encoding=""):
+    """Serialize a response body, compressed with brotli or gzip when the client accepts it
+
+    Returns the body bytes and the headers to send with it.
+    """
+    with metrics.stage("json_serialize"):
+        body = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    metrics.add_bytes("json_serialize", len(body))
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, headers
+
+    accepted = accepted_encodings(accept_encoding)
+    brotli = _brotli() if "br" in accepted else None
+    if brotli is None and "gzip" not in accepted:
+        return body, headers
+    with metrics.stage("compress"):
+        if brotli is not None:
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+            headers["Content-Encoding"] = "br"
+        else:
+            # No timestamp, so the same payload always gives the same bytes (and ETag)
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+            headers["Content-Encoding"] = "gzip"
+    metrics.add_bytes("compress", len(body))
+    return body, headers
+
+
+def format_tables(payload, table_format=None):
+    """Return the response payload with its "tables" in the requested format"""
+    if "tables" not in payload:
+        return payload
+    if table_format == COLUMNAR:
+        format_table = columnar_table
+    elif table_format == HTML:
+        # table_render builds on this module, so it is imported on first use
+        from table_render import rendered_table as format_table
+    else:
+        return payload
+    return dict(payload, tables={name: format_table(table) for name, table in payload["tables"].items()})
@@ -0,0 +1,377 @@
+import html
+import os
+import re
+from decimal import Decimal
+from functools import reduce
+from operator import add
+
+import numpy as np
+import pandas as pd
+
+from financial_metrics import LOSS, LOSS_TO_PROFIT, PROFIT_TO_LOSS, compute_metrics
+from table_payload import is_columnar
+
+# Rows per chunk when streaming a table's markup
+RENDER_CHUNK_ROWS = int(os.environ.get("FS_RENDER_CHUNK_ROWS", "500"))
+
+STATEMENT_TABLE_OPEN = '<div><table class="custom-table">'
+STATEMENT_TABLE_CLOSE = '</tbody></table></div>'
+BROWSER_TABLE_OPEN = '<table class="table table-striped table-hover">'
+BROWSER_TABLE_CLOSE = '</tbody></table>'
+NO_DATA_HTML = '<div class="alert alert-info">No data available</div>'
+
+_DECIMAL = re.compile(r"\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*")
+_HEADER_DATE = re.compile(r"(\d{1,2}-\w{3}-\d{4})")
+_HEADER_SLASH_DATE = re.compile(r"(\d{1,2}/\d{1,2}/\d{4})")
+
+
+def _text(column):
+    """Cells as escaped text, missing ones empty"""
+    return column.astype(object).where(column.notna(), "").astype(str).map(html.escape)
+
+
+def format_amounts(values):
+    """Format a column of numbers as 1,234.5: two decimals, trailing zeros dropped"""
+    text = np.array(list(map("{:,.2f}".format, np.asarray(values, dtype=float).tolist())), dtype=str)
+    return pd.Series(np.char.rstrip(np.char.rstrip(text, "0"), "."), dtype=object)
+
+
+def _statement_cells(column):
+    """Text of one statement column: numbers as amounts, anything else as is"""
+    if pd.api.types.is_numeric_dtype(column):
+        numbers = column.notna().to_numpy()
+        cells = pd.Series("", index=column.index, dtype=object)
+    else:
+        numbers = column.map(lambda v: isinstance(v, (int, float)) and v == v).to_numpy(dtype=bool)
+        cells = _text(column)
+    if numbers.any():
+        cells[numbers] = format_amounts(column[numbers].astype(float)).to_numpy()
+    return cells
+
+
+def _rows(cells, row_open):
+    """Join the cell columns into one <tr> string per row"""
+    return (row_open + reduce(add, cells) + "</tr>").tolist()
+
+
+def iter_table(table_open, header, rows, table_close, chunk_rows=RENDER_CHUNK_ROWS):
+    """Yield a table's markup: the header, then ``chunk_rows`` rows at a time"""
+    yield table_open + header
+    for start in range(0, len(rows), chunk_rows):
+        yield "".join(rows[start:start + chunk_rows])
+    yield table_close
+
+
+def iter_statement_table(df, row_classes=None, extra_rows="", chunk_rows=RENDER_CHUNK_ROWS):
+    """Stream the Streamlit statement table (custom-table) in chunks
+
+    The first column is the label, the others are amounts. ``row_classes``
+    gives a CSS class per row (e.g. audit-status-row) and ``extra_rows``
+    is markup appended to the body, such as the growth rows.
+    """
+    header = "<thead><tr>" + "".join(f"<th>{html.escape(str(col))}</th>" for col in df.columns) + "</tr></thead><tbody>"
+    if row_classes is None:
+        row_classes = [""] * len(df)
+    cells = [
+        ('<td class="first-col">' if i == 0 else '<td class="number-col">')
+        + (_text(df.iloc[:, i]) if i == 0 else _statement_cells(df.iloc[:, i]))
+        + "</td>"
+        for i in range(len(df.columns))
+    ]
+    rows = _rows(cells, '<tr class="' + pd.Series(row_classes, index=df.index, dtype=object) + '">') if cells else []
+    yield from iter_table(STATEMENT_TABLE_OPEN, header, rows + [extra_rows], STATEMENT_TABLE_CLOSE, chunk_rows)
+
+
+def statement_table_html(df, row_classes=None, extra_rows=""):
+    """The statement table as one string"""
+    return "".join(iter_statement_table(df, row_classes, extra_rows))
+
+
+def create_growth_analysis_rows(df, items=None, metrics=None):
+    """Create growth analysis rows for revenue, profit, and margins"""
+    if df.empty or len(df) < 2:
+        return ""
+
+    if metrics is None:
+        metrics = compute_metrics(df, items)
+    if len(metrics.periods) < 2:
+        return ""
+
+    growth_html = ""
+
+    # 1. Net Revenue Growth
+    if "net_revenue" in metrics:
+        growth_html += create_growth_row_html(metrics, "net_revenue", "Net Revenue Growth (%)", "revenue")
+
+    # 2. Gross Profit Growth
+    if "gross_profit" in metrics:
+        growth_html += create_growth_row_html(metrics, "gross_profit", "Gross Profit Growth (%)", "gross_profit")
+
+    # 3. Net Profit Growth
+    if "net_profit_after_tax" in metrics:
+        growth_html += create_growth_row_html(metrics, "net_profit_after_tax", "Net Profit Growth (%)", "net_profit")
+
+    # 4. Gross Margin
+    if "gross_margin" in metrics:
+        growth_html += create_margin_row_html(metrics, "gross_margin", "Gross Margin (%)")
+
+    # 5. Net Margin
+    if "net_margin" in metrics:
+        growth_html += create_margin_row_html(metrics, "net_margin", "Net Margin (%)")
+
+    return growth_html
+
+
+def create_growth_row_html(metrics, item, label, metric_type):
+    """Create a growth row for a specific metric"""
+    html = '<tr style="background: linear-gradient(135deg, #f8f9fa 0%, #e9ecef 100%); border-top: 2px solid #0C4130;">'
+
+    # First column - label
+    icon = "📈" if metric_type == "revenue" else "💰"
+    html += f'<td class="first-col" style="font-weight: 700; color: #0C4130;">{icon} {label}</td>'
+
+    growth = metrics.growth.loc[item].tolist()
+    status = metrics.status.loc[item].tolist()
+    for i in range(len(metrics.periods)):
+        if i == 0:
+            # First year - no growth data
+            html += '<td class="number-col"></td>'
+        else:
+            html += f'<td class="number-col" style="font-weight: 600;">{growth_display(status[i], growth[i])}</td>'
+
+    html += '</tr>'
+    return html
+
+
+def create_margin_row_html(metrics, margin, label):
+    """Create a margin analysis row"""
+    html = '<tr style="background: linear-gradient(135deg, #f8f9fa 0%, #e9ecef 100%); border-top: 2px solid #0C4130;">'
+
+    # First column - label
+    html += f'<td class="first-col" style="font-weight: 700; color: #0C4130;">📊 {label}</td>'
+
+    for value in metrics.margins.loc[margin].tolist():
+        if pd.isnull(value):
+            html += '<td class="number-col">-</td>'
+        elif value < 0:
+            html += f'<td class="number-col" style="font-weight: 600; color: #dc3545;">-{abs(value):.1f}%</td>'
+        else:
+            color = "#28a745" if value > 0 else "#6c757d"
+            html += f'<td class="number-col" style="font-weight: 600; color: {color};">{value:.1f}%</td>'
+
+    html += '</tr>'
+    return html
+
+
+def growth_display(status, growth):
+    """Format one growth cell, with LTP/PTL/Loss for profit items"""
+    if status == LOSS_TO_PROFIT:
+        return '<span style="color: #28a745;">↗ LTP</span>'
+    if status == PROFIT_TO_LOSS:
+        return '<span style="color: #dc3545;">↘ PTL</span>'
+    if status == LOSS:
+        return '<span style="color: #ffc107;">━ Loss</span>'
+    if pd.isnull(growth):
+        return '<span style="color: #6c757d;">-</span>'
+
+    color = "#28a745" if growth >= 0 else "#dc3545"
+    arrow = "↗" if growth >= 0 else "↘"
+    return f'<span style="color: {color};">{arrow} {growth:.1f}%</span>'
+
+
+# Same rules as prepareTable in static/js/table-format.js, so a table rendered
+# here looks the same as one rendered in the browser
+
+def _is_fiscal_year(header):
+    header = header.lower()
+    return "fiscal" in header and "year" in header
+
+
+def _is_audit_status(header):
+    return _is_fiscal_year(header) and "end" in header.lower()
+
+
+def _js_number_string(value):
+    """String(value) in JavaScript: repr, but whole numbers without ".0" and
+    written out in full between 1e-6 and 1e21 (repr switches to an exponent
+    below 1e-4 and from 1e16)"""
+    if value == 0:
+        return "0"
+    if not np.isfinite(value):
+        return "NaN" if value != value else ("Infinity" if value > 0 else "-Infinity")
+    text = repr(value)
+    if "e" not in text:
+        return text[:-2] if text.endswith(".0") else text
+    if 1e-6 <= abs(value) < 1e21:
+        # The same shortest digits, without the exponent
+        return format(Decimal(text), "f")
+    mantissa, _, exponent = text.partition("e")
+    return f"{mantissa[:-2] if mantissa.endswith('.0') else mantissa}e{int(exponent):+d}"
+
+
+def _js_number(values):
+    """Numbers as JavaScript prints them: 100 not 100.0, exponents only from 1e21"""
+    values = np.asarray(values, dtype=float)
+    # repr agrees with JavaScript except for whole numbers (100.0) and where it
+    # switches to an exponent, below 1e-4 and from 1e16
+    magnitude = np.abs(values)
+    special = (magnitude < 1e-4) | (magnitude >= 1e16) | ~np.isfinite(values)
+    text = [
+        _js_number_string(v) if s else r[:-2] if r.endswith(".0") else r
+        for v, s, r in zip(values.tolist(), special.tolist(), map(repr, values.tolist()))
+    ]
+    return np.array(text, dtype=str)
+
+
+def clean_header_name(header):
+    """Drop duplicated audit words from a period header and collapse whitespace"""
+    if "UnauditedUnaudited" in header:
+        match = _HEADER_DATE.search(header)
+        if match:
+            return f"{match.group(1)}<br/>Unaudited"
+    if "AuditedAudited" in header or "auditedaudited" in header.lower():
+        match = _HEADER_DATE.search(header)
+        if match:
+            return f"{match.group(1)}<br/>Audited"
+    if "Chưa kiểm toánChưa kiểm toán" in header:
+        match = _HEADER_SLASH_DATE.search(header)
+        if match:
+            return f"{match.group(1)}<br/>Chưa kiểm toán"
+    return html.escape(re.sub(r"\s+", " ", header).strip())
+
+
+def _dedupe_words(value):
+    seen = set()
+    words = []
+    for word in re.split(r"\s+", value):
+        if word.lower() not in seen:
+            seen.add(word.lower())
+            words.append(word)
+    return " ".join(words)
+
+
+def clean_cell_values(values):
+    """Vectorized cleanCellValue: duplicated audit words in text cells are collapsed"""
+    values = pd.Series(values, dtype=object).astype(str)
+    unaudited = values.str.contains("UnauditedUnaudited", regex=False)
+    audited = ~unaudited & values.str.lower().str.contains("auditedaudited", regex=False)
+    vietnamese = ~unaudited & ~audited & values.str.contains("Chưa kiểm toánChưa kiểm toán", regex=False)
+    other = ~unaudited & ~audited & ~vietnamese & values.str.lower().str.contains("audit", regex=False)
+
+    cleaned = values.copy()
+    cleaned[unaudited] = values[unaudited].str.replace("UnauditedUnaudited", "Unaudited", case=False, regex=True)
+    cleaned[audited] = values[audited].str.replace("AuditedAudited", "Audited", case=False, regex=True)
+    cleaned[vietnamese] = values[vietnamese].str.replace("Chưa kiểm toánChưa kiểm toán", "Chưa kiểm toán", regex=False)
+    cleaned[other] = values[other].map(_dedupe_words)
+    return cleaned
+
+
+def format_browser_numbers(values):
+    """Vectorized formatNumberWithCommas: thousands separators, decimals cut (not rounded) to two"""
+    values = np.asarray(values, dtype=float)
+    text = _js_number(np.abs(values))
+    # Intl never uses an exponent: the same digits are written out in full
+    exponent = np.char.find(text, "e") >= 0
+    if exponent.any():
+        text = text.astype(object)
+        text[exponent] = [format(Decimal(t), "f") for t in text[exponent].tolist()]
+        text = text.astype(str)
+    parts = np.char.partition(text, ".")
+    integer = np.array([f"{int(i):,}" if i.isdigit() else i for i in parts[:, 0].tolist()], dtype=str)
+    fraction = np.char.rstrip(parts[:, 2].astype("U2"), "0")
+    number = np.where(fraction == "", integer, np.char.add(np.char.add(integer, "."), fraction))
+    return pd.Series(np.where(values < 0, np.char.add("-", number), number), dtype=object)
+
+
+_BLANK, _NUMBER, _TEXT, _OTHER = range(4)
+
+
+def _cell_kind(value):
+    # `value || ''` in the browser: missing, NaN, 0, false and "" are blank
+    if isinstance(value, str):
+        return _TEXT if value else _BLANK
+    if isinstance(value, bool):
+        return _OTHER if value else _BLANK
+    if value is None or value != value or value == 0:
+        return _BLANK
+    return _NUMBER if isinstance(value, (int, float)) else _OTHER
+
+
+def _browser_cells(values, header):
+    """Cell text for one column of the browser table"""
+    values = np.array(values, dtype=object)
+    kinds = np.fromiter(map(_cell_kind, values.tolist()), dtype=np.int8, count=len(values))
+    numbers = kinds == _NUMBER
+    text = kinds == _TEXT
+    numeric = numbers.copy()
+    if _is_fiscal_year(header):
+        numeric[:] = False
+    elif text.any():
+        numeric[text] = [bool(_DECIMAL.fullmatch(v)) for v in values[text].tolist()]
+
+    cells = np.full(len(values), "", dtype=object)
+    if numeric.any():
+        cells[numeric] = format_browser_numbers([float(v) for v in values[numeric].tolist()]).to_numpy()
+    plain = numbers & ~numeric
+    if plain.any():
+        cells[plain] = _js_number(values[plain].astype(float)).astype(object)
+    other = kinds == _OTHER
+    if other.any():
+        cells[other] = [html.escape("true" if v is True else str(v)) for v in values[other].tolist()]
+    cleaned = text & ~numeric
+    if cleaned.any():
+        cells[cleaned] = clean_cell_values(values[cleaned]).map(html.escape).to_numpy()
+    return pd.Series(cells, dtype=object)
+
+
+def _browser_columns(table):
+    """Headers and one value list per column of a DataFrame, records or columnar table"""
+    if is_columnar(table):
+        return list(table["columns"]), list(table["data"])
+    if isinstance(table, pd.DataFrame):
+        columns = [str(c) for c in table.columns]
+        return columns, [table.iloc[:, i].astype(object).tolist() for i in range(len(columns))]
+    if isinstance(table, list) and table:
+        columns = list(table[0])
+        return columns, [[record.get(c) for record in table] for c in columns]
+    return [], []
+
+
+def iter_browser_table(table, chunk_rows=RENDER_CHUNK_ROWS):
+    """Stream the table markup index.html builds with static/js/table-format.js"""
+    headers, data = _browser_columns(table)
+    if not data or not data[0]:
+        yield NO_DATA_HTML
+        return
+
+    # The "Fiscal Year End" column comes first
+    audit_index = next((i for i, h in enumerate(headers) if _is_audit_status(h)), None)
+    order = list(range(len(headers)))
+    if audit_index is not None:
+        order = [audit_index] + [i for i in order if i != audit_index]
+
+    header_cells = []
+    cells = []
+    for i in order:
+        header = headers[i]
+        if _is_audit_status(header):
+            header_cells.append('<th class="audit-status-col">Fiscal Year</th>')
+            cells.append('<td class="audit-status-col">' + _browser_cells(data[i], header) + "</td>")
+        else:
+            header_cells.append(f'<th class="">{clean_header_name(header)}</th>')
+            cells.append('<td class="number-col">' + _browser_cells(data[i], header) + "</td>")
+
+    header = "<thead><tr>" + "".join(header_cells) + "</tr></thead><tbody>"
+    yield from iter_table(BROWSER_TABLE_OPEN, header, _rows(cells, "<tr>"), BROWSER_TABLE_CLOSE, chunk_rows)
+
+
+def browser_table_html(table):
+    """The index.html table markup as one string"""
+    return "".join(iter_browser_table(table))
+
+
+def rendered_table(table):
+    """{"html": markup} for a table; error entries are returned unchanged"""
+    if isinstance(table, (pd.DataFrame, list)) or is_columnar(table):
+        return {"html": browser_table_html(table)}
+    return table
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-from simple_app import download_zip_from_drive
+from drive_download import download_zip_from_drive
 import os
 
 def test_google_drive_download():
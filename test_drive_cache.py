@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Tests for the Drive download cache against a local stand-in for Google Drive
+
+    python -m unittest test_drive_cache
+
+No network is needed: the cache is pointed at an http.server on
+localhost, as FS_DRIVE_BASE_URL does for the app.
+"""
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import drive_download
+
+FILE_ID = "abc123"
+
+
+class FakeDrive(BaseHTTPRequestHandler):
+    """Serves one archive like Drive's uc?export=download endpoint"""
+
+    # Replaced per test by FakeDriveTest.setUp
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        state = self.state
+        with state["lock"]:
+            state["requests"].append((self.path, self.headers.get("If-None-Match")))
+        if state["error_pages"]:
+            # e.g. a quota page: neither says whether the file changed
+            state["error_pages"] -= 1
+            page = b"<html>Too many users have viewed or downloaded this file recently</html>"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+            return
+        if state["large"] and "confirm=" not in self.path:
+            # Large files first get a virus scan warning page and a cookie to confirm with
+            page = b"<html>Google Drive can't scan this file for viruses</html>"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Set-Cookie", "download_warning_1=token; Path=/")
+            self.send_header("Content-Length", str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+            return
+        if state["etag"] and self.headers.get("If-None-Match") == state["etag"]:
+            self.send_response(304)
+            self.end_headers()
+            return
+        time.sleep(state["delay"])
+        body = state["body"]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        if state["etag"]:
+            self.send_header("ETag", state["etag"])
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeDriveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.state = {
+            "lock": threading.Lock(), "requests": [], "body": b"PK" + b"a" * 5000,
+            "etag": '"v1"', "error_pages": 0, "large": False, "delay": 0,
+        }
+        handler = type("Handler", (FakeDrive,), {"state": self.state})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.tmp = tempfile.TemporaryDirectory()
+
+        # Only the requests method talks to the stand-in; gdown would go to the network
+        methods = (("requests", drive_download._download_with_requests),)
+        patch = mock.patch.object(drive_download, "DOWNLOAD_METHODS", methods)
+        patch.start()
+        self.addCleanup(patch.stop)
+        drive_download._method_timings.clear()
+        drive_download._method_failures.clear()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def cache(self, **kwargs):
+        kwargs.setdefault("ttl", 0)
+        return drive_download.DriveDownloadCache(directory=self.tmp.name, base_url=self.base_url, **kwargs)
+
+    def downloads(self):
+        """Requests that got the archive itself rather than 304 or the warning page"""
+        return [path for path, etag in self.state["requests"] if etag is None and ("confirm=" in path or not self.state["large"])]
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_etag_revalidation(self):
+        cache = self.cache()
+        path = cache.fetch(FILE_ID)
+        self.assertEqual(self.read(path), self.state["body"])
+
+        # Unchanged: one conditional request answered 304, nothing downloaded
+        cache.fetch(FILE_ID)
+        self.assertEqual(self.state["requests"][-1][1], '"v1"')
+        self.assertEqual(len(self.downloads()), 1)
+
+        self.state.update(body=b"PK" + b"b" * 5000, etag='"v2"')
+        self.assertEqual(self.read(cache.fetch(FILE_ID)), self.state["body"])
+        self.assertEqual(cache._load_meta(FILE_ID)["etag"], '"v2"')
+
+    def test_within_ttl_drive_is_not_asked(self):
+        cache = self.cache(ttl=300)
+        cache.fetch(FILE_ID)
+        cache.fetch(FILE_ID)
+        self.assertEqual(len(self.state["requests"]), 1)
+
+    def test_large_file_is_revalidated_without_downloading(self):
+        self.state["large"] = True
+        cache = self.cache()
+        cache.fetch(FILE_ID)
+        cache.fetch(FILE_ID)
+        self.assertEqual(len([path for path, _ in self.state["requests"] if "confirm=" in path]), 2)
+        self.assertEqual(self.state["requests"][-1][1], '"v1"')
+        self.assertEqual(self.read(cache.fetch(FILE_ID)), self.state["body"])
+
+    def test_size_change_without_etag(self):
+        self.state["etag"] = None
+        cache = self.cache()
+        cache.fetch(FILE_ID)
+        fetched_at = cache._load_meta(FILE_ID)["fetched_at"]
+        cache.fetch(FILE_ID)
+        # Same size: the probe reads the headers only, so the file is not replaced
+        self.assertEqual(cache._load_meta(FILE_ID)["fetched_at"], fetched_at)
+
+        self.state["body"] = b"PK" + b"c" * 7000
+        self.assertEqual(self.read(cache.fetch(FILE_ID)), self.state["body"])
+
+    def test_unknown_answer_kept_until_max_age(self):
+        cache = self.cache()
+        cache.fetch(FILE_ID)
+        self.state.update(body=b"PK" + b"d" * 5000, etag='"v2"', error_pages=1)
+        # The probe gets an error page: the copy is kept while it is young
+        self.assertNotEqual(self.read(cache.fetch(FILE_ID)), self.state["body"])
+
+        # Past max_age it is downloaded again
+        self.state["error_pages"] = 1
+        old = self.cache(max_age=0)
+        self.assertEqual(self.read(old.fetch(FILE_ID)), self.state["body"])
+
+    def test_concurrent_fetches_share_one_download(self):
+        self.state["delay"] = 0.5
+        cache = self.cache()
+        paths = []
+        threads = [threading.Thread(target=lambda: paths.append(cache.fetch(FILE_ID))) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(len(set(paths)), 1)
+        self.assertEqual(len(self.state["requests"]), 1)
+
+    def test_failed_method_falls_back_and_goes_last(self):
+        broken = mock.Mock(side_effect=OSError("no route"))
+        methods = (("broken", broken), ("requests", drive_download._download_with_requests))
+        with mock.patch.object(drive_download, "DOWNLOAD_METHODS", methods):
+            cache = self.cache()
+            cache.fetch(FILE_ID)
+            self.assertEqual(cache._load_meta(FILE_ID)["method"], "requests")
+            self.assertEqual(broken.call_count, 1)
+            self.assertEqual([name for name, _ in drive_download._method_order()], ["requests", "broken"])
+
+            # The next download goes straight to the method that worked
+            self.state.update(body=b"PK" + b"e" * 5000, etag='"v3"')
+            cache.fetch(FILE_ID)
+            self.assertEqual(broken.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
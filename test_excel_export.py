@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Tests for the server-side Excel export
+
+    python -m unittest test_excel_export
+"""
+import os
+import unittest
+
+from excel_export import _column_width, _sheet_name, export_workbook, iter_file_chunks, remove_file
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+class SheetNameTest(unittest.TestCase):
+
+    def test_invalid_characters(self):
+        self.assertEqual(_sheet_name("a/b\\c[d]:e*f?g", set()), "a_b_c_d__e_f_g")
+
+    def test_at_most_31_characters(self):
+        name = _sheet_name("x" * 40 + ".html", set())
+        self.assertEqual(name, "x" * 31)
+
+    def test_unique_ignoring_case(self):
+        used = set()
+        names = [_sheet_name(name, used) for name in ("Report.html", "report.html", "REPORT.HTML")]
+        self.assertEqual(names, ["Report.html", "report.html (2)", "REPORT.HTML (3)"])
+
+    def test_suffix_fits_in_31_characters(self):
+        used = set()
+        first = _sheet_name("y" * 40, used)
+        second = _sheet_name("y" * 40, used)
+        self.assertEqual(first, "y" * 31)
+        self.assertEqual(second, "y" * 27 + " (2)")
+
+    def test_empty_name(self):
+        self.assertEqual(_sheet_name("", set()), "Sheet")
+
+
+class WorkbookTest(unittest.TestCase):
+
+    def test_column_width(self):
+        self.assertEqual(_column_width("2020", [1, 0.30000000000000004, None, -5]), 19 + 2)
+        self.assertEqual(_column_width("Fiscal Year End", [None]), 15 + 2)
+
+    def test_file_is_removed_after_streaming(self):
+        path = export_workbook({"a.html": [{"L": "x", "2020": "1,234"}]}, parse_numbers=True)
+        self.assertGreater(len(b"".join(iter_file_chunks(path, chunk_size=100))), 0)
+        self.assertFalse(os.path.exists(path))
+        # The response's close callback may run after the generator already removed it
+        remove_file(path)
+
+    @unittest.skipUnless(openpyxl, "openpyxl is not installed")
+    def test_sheets_and_numbers(self):
+        tables = {
+            "a.html": [{"L": "Revenue", "2020": "(1,234)"}],
+            "b.html": {"error": "No tables found in HTML file."},
+            "c.html": {"columns": ["L", "2020"], "types": ["string", "number"], "data": [["Profit"], [5]]},
+        }
+        path = export_workbook(tables, parse_numbers=True)
+        try:
+            workbook = openpyxl.load_workbook(path)
+            self.assertEqual(workbook.sheetnames, ["a.html", "c.html"])
+            self.assertEqual(workbook["a.html"]["B2"].value, -1234)
+            self.assertEqual(workbook["c.html"]["A2"].value, "Profit")
+        finally:
+            remove_file(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
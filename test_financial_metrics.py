@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Tests that the vectorized metrics agree with the per-cell loops they replaced
+
+    python -m unittest test_financial_metrics
+"""
+import math
+import random
+import unittest
+
+import pandas as pd
+
+from financial_metrics import (GROWTH, LOSS, LOSS_TO_PROFIT, NO_DATA, PROFIT_TO_LOSS, compute_metrics,
+                               numeric_columns)
+
+LABELS = {
+    "net_revenue": "3. Net revenue",
+    "gross_profit": "5. Gross profit",
+    "net_profit_after_tax": "18. Net profit after tax",
+}
+
+
+def random_statement(rng, periods):
+    """A statement with the key line items among other rows; amounts include NaN, 0 and losses"""
+    def amount():
+        roll = rng.random()
+        if roll < 0.1:
+            return math.nan
+        if roll < 0.2:
+            return 0.0
+        return float(rng.randint(-1000, 5000))
+
+    columns = [f"31-Dec-{2015 + i}" for i in range(periods)]
+    labels = ["Legal Regulation", "1. Gross sales", *LABELS.values(), "20. Other"]
+    rng.shuffle(labels)
+    rows = [[label] + [amount() for _ in columns] for label in labels]
+    return pd.DataFrame(rows, columns=["Fiscal Year End", *columns])
+
+
+# The previous implementation, one cell at a time (FS_Extract.create_growth_row_html and friends)
+
+def old_values(df, row, columns):
+    return [df.iloc[row][col] if pd.notnull(df.iloc[row][col]) else 0 for col in columns]
+
+
+def old_growth(current, previous):
+    if previous == 0:
+        return None
+    return ((current - previous) / abs(previous)) * 100
+
+
+def old_profit_status(current, previous):
+    if not previous > 0 and current > 0:
+        return LOSS_TO_PROFIT
+    if previous > 0 and not current > 0:
+        return PROFIT_TO_LOSS
+    if not previous > 0 and not current > 0:
+        return LOSS
+    return GROWTH
+
+
+def old_margin(df, revenue_row, profit_row, col):
+    revenue = df.iloc[revenue_row][col]
+    profit = df.iloc[profit_row][col]
+    if pd.notnull(revenue) and pd.notnull(profit) and revenue != 0:
+        return profit / revenue * 100
+    return None
+
+
+class ComputeMetricsTest(unittest.TestCase):
+
+    def assertClose(self, new, old):
+        if old is None:
+            self.assertTrue(math.isnan(new), new)
+        else:
+            self.assertAlmostEqual(new, old, places=9)
+
+    def test_agrees_with_the_old_loops(self):
+        rng = random.Random(0)
+        for _ in range(100):
+            df = random_statement(rng, rng.randint(1, 6))
+            columns = numeric_columns(df)
+            rows = {key: df.index[df.iloc[:, 0] == label][0] for key, label in LABELS.items()}
+            result = compute_metrics(df)
+
+            for key, row in rows.items():
+                values = old_values(df, row, columns)
+                self.assertEqual(list(result.values.loc[key]), values)
+                for i in range(1, len(columns)):
+                    current, previous = values[i], values[i - 1]
+                    self.assertClose(result.growth.loc[key].iloc[i], old_growth(current, previous))
+                    status = result.status.loc[key].iloc[i]
+                    if key == "net_revenue":
+                        self.assertEqual(status, NO_DATA if previous == 0 else GROWTH)
+                    else:
+                        self.assertEqual(status, old_profit_status(current, previous))
+                if columns:
+                    self.assertTrue(math.isnan(result.growth.loc[key].iloc[0]))
+
+            for name, key in (("gross_margin", "gross_profit"), ("net_margin", "net_profit_after_tax")):
+                for i, col in enumerate(columns):
+                    self.assertClose(result.margins.loc[name].iloc[i], old_margin(df, rows["net_revenue"], rows[key], col))
+
+    def test_missing_items(self):
+        df = pd.DataFrame([["3. Net revenue", 100.0, 120.0]], columns=["Fiscal Year End", "2020", "2021"])
+        result = compute_metrics(df)
+        self.assertIn("net_revenue", result)
+        self.assertNotIn("gross_profit", result)
+        self.assertNotIn("gross_margin", result)
+        self.assertAlmostEqual(result.growth.loc["net_revenue", "2021"], 20.0)
+        self.assertAlmostEqual(result.cagr["net_revenue"], 20.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
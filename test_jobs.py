@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Tests for background jobs seen from a worker process that does not run them
+
+    python -m unittest test_jobs
+"""
+import tempfile
+import time
+import unittest
+
+from jobs import JobQueue, StoredJob
+from result_store import ResultStore
+
+
+def extract(job, count):
+    job.digest = "abc"
+    job.start(count)
+    for i in range(count):
+        time.sleep(0.2)
+        job.publish(f"member{i}.html", [{"n": i}])
+    job.result_id = "0" * 32
+
+
+class SharedJobTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # Two queues sharing one directory stand in for two worker processes
+        self.local = JobQueue(store=self.store())
+        self.other = JobQueue(store=self.store())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def store(self):
+        return ResultStore("jobs-records", directory=self.tmp.name, hot_entries=0)
+
+    def test_other_worker_follows_the_job(self):
+        job = self.local.submit(extract, 6)
+        seen = self.other.get(job.id)
+        self.assertIsInstance(seen, StoredJob)
+
+        since, names = 0, []
+        while True:
+            seen.wait(since, 10)
+            state = seen.snapshot(since)
+            names.extend(state["tables"])
+            since = state["next"]
+            if state["status"] == "done":
+                break
+        self.assertEqual(names, [f"member{i}.html" for i in range(6)])
+        self.assertEqual(state["result_id"], "0" * 32)
+        self.assertEqual(seen.digest, "abc")
+
+    def test_stream_from_other_worker(self):
+        job = self.local.submit(extract, 3)
+        events = list(self.other.get(job.id).events())
+        self.assertEqual([event["file"] for event in events[:-1]], ["member0.html", "member1.html", "member2.html"])
+        self.assertEqual(events[-1]["status"], "done")
+
+    def test_unknown_job(self):
+        self.assertIsNone(self.other.get("f" * 32))
+        self.assertIsNone(self.other.get("not-a-job-id"))
+
+
+if __name__ == "__main__":
+    unittest.main()
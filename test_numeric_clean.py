@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Tests for amount parsing and the count of cells that could not be read as numbers
+
+    python -m unittest test_numeric_clean
+"""
+import pickle
+import tempfile
+import unittest
+
+import simple_app
+import table_extract
+from benchmarks.generate import statement_html
+from numeric_clean import normalize_number_text, parse_number
+from table_cache import TableCache
+
+BAD_CELLS = ("abc", "--x--", "12 34")
+
+
+def bad_statement(html, count):
+    """Replace the first ``count`` amounts of the first data rows with text that is not a number"""
+    rows = html.split("<td>")
+    replaced = 0
+    for i, row in enumerate(rows):
+        if replaced == count:
+            break
+        # Amount cells start with a digit or "("; labels ("1. Gross sales") are followed by "</td><td>"
+        value = row.split("</td>", 1)[0]
+        if value and (value[0] == "(" or value[0].isdigit()) and "," in value:
+            rows[i] = BAD_CELLS[replaced % len(BAD_CELLS)] + row[len(value):]
+            replaced += 1
+    return "<td>".join(rows)
+
+
+class ParseNumberTest(unittest.TestCase):
+
+    def test_statement_amounts(self):
+        cases = {
+            "1,234": 1234, "(1,234)": -1234, "1.234.567": 1234567, "-5": -5, " 12 ": 12,
+            "+3": 3, "1e3": 1000.0, 7: 7, 2.5: 2.5,
+        }
+        for text, number in cases.items():
+            self.assertEqual(parse_number(text), number, text)
+            self.assertIs(type(parse_number(text)), type(number), text)
+
+    def test_not_amounts(self):
+        for text in ("", "abc", "-", "()", "12 34", "200/2014/TT-BTC", None):
+            self.assertIsNone(parse_number(text), text)
+
+    def test_decimal_separator(self):
+        self.assertEqual(parse_number("1.234,5", thousands=".", decimal=","), 1234.5)
+        self.assertEqual(parse_number("(1,234.5)", thousands=",", decimal="."), -1234.5)
+
+    def test_normalize_keeps_labels(self):
+        self.assertEqual(normalize_number_text("(1,234)"), "-1234")
+        self.assertEqual(normalize_number_text("3. Net revenue"), "3. Net revenue")
+        self.assertIsNone(normalize_number_text(None))
+
+
+class CoerceFailuresTest(unittest.TestCase):
+
+    def setUp(self):
+        self.html = statement_html(rows=20, years=5)
+
+    def failures(self, html):
+        counts = {
+            engine: table_extract.extract_tables_from_html(html, engine=engine).attrs["coerce_failures"]
+            for engine in table_extract.ENGINES
+        }
+        counts["simple_app"] = simple_app.extract_tables_from_html(html).attrs["coerce_failures"]
+        return counts
+
+    def test_clean_statement_has_no_failures(self):
+        # The audit status and legal regulation rows are text, not failed amounts
+        for source, failed in self.failures(self.html).items():
+            self.assertEqual(failed, 0, source)
+
+    def test_each_bad_cell_is_counted_once(self):
+        for count in (1, 4, 7):
+            html = bad_statement(self.html, count)
+            self.assertEqual(html.count("abc") + html.count("--x--") + html.count("12 34"), count)
+            for source, failed in self.failures(html).items():
+                self.assertEqual(failed, count, source)
+
+    def test_first_period_column_is_counted(self):
+        html = statement_html(rows=5, years=1)
+        for source, failed in self.failures(bad_statement(html, 2)).items():
+            self.assertEqual(failed, 2, source)
+
+    def test_payload_reads_the_stored_count(self):
+        table = simple_app.extract_tables_from_html(bad_statement(self.html, 3))
+        payload = simple_app.tables_payload({"a.html": table}, "id")
+        self.assertEqual(payload["coerce_failures"], {"a.html": 3})
+
+    def test_count_survives_pickle_and_cache(self):
+        table = simple_app.extract_tables_from_html(bad_statement(self.html, 2))
+        self.assertEqual(pickle.loads(pickle.dumps(table)).attrs, {"coerce_failures": 2})
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = TableCache("records", directory=directory)
+            cache.put("k", table)
+            self.assertEqual(cache.get("k").attrs, {"coerce_failures": 2})
+            # A fresh cache reads it back from disk
+            self.assertEqual(TableCache("records", directory=directory).get("k").attrs, {"coerce_failures": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
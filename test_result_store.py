@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Tests for the on-disk result store: concurrent writes and the disk budget
+
+    python -m unittest test_result_store
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from result_store import ResultStore
+
+RESULT_ID = "0123456789abcdef0123456789abcdef"
+
+
+class ResultStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_threads_storing_the_same_id(self):
+        store = ResultStore("records", directory=self.directory)
+        errors = []
+
+        def put(i):
+            try:
+                for _ in range(20):
+                    store.put({"a.html": [{"n": i}] * 200}, RESULT_ID)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=put, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        # A fresh store reads one complete result back, and no temporary file is left
+        self.assertEqual(len(ResultStore("records", directory=self.directory).get(RESULT_ID)["a.html"]), 200)
+        self.assertEqual(os.listdir(self.directory), [f"records-{RESULT_ID}.pkl"])
+
+    def test_least_recently_used_results_are_evicted(self):
+        store = ResultStore("records", directory=self.directory, max_mb=1, hot_entries=0)
+        payload = {"a.html": os.urandom(300 * 1024)}
+        ids = []
+        for i in range(3):
+            ids.append(store.put(payload))
+            # Distinct mtimes so the eviction order is deterministic
+            past = time.time() - 100 + i
+            os.utime(store._path(ids[-1]), (past, past))
+        self.assertTrue(store.touch(ids[0]))
+
+        # A fourth result goes over 1MB, so the least recently used one goes
+        newest = store.put(payload)
+        self.assertIsNotNone(store.get(ids[0]))
+        self.assertIsNone(store.get(ids[1]))
+        self.assertIsNotNone(store.get(ids[2]))
+        self.assertIsNotNone(store.get(newest))
+
+    def test_result_larger_than_the_budget_is_kept(self):
+        store = ResultStore("records", directory=self.directory, max_mb=1, hot_entries=0)
+        result_id = store.put({"a.html": os.urandom(2 * 1024 * 1024)})
+        self.assertIsNotNone(store.get(result_id))
+
+
+if __name__ == "__main__":
+    unittest.main()
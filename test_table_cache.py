@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Tests for table cache keys and the two cache tiers
+
+    python -m unittest test_table_cache
+"""
+import functools
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from table_cache import CACHE_VERSION, TableCache, content_key, extractor_id
+
+DATA = b"<table><tr><th>L</th><th>2020</th></tr><tr><td>a</td><td>1</td></tr></table>"
+
+
+def extract(html_content, engine=None):
+    return html_content
+
+
+def other_extract(html_content):
+    return html_content
+
+
+def variant(name):
+    # Same module and qualname every time; only the variant differs
+    def extract_variant(html_content):
+        return html_content
+    extract_variant.cache_variant = name
+    return extract_variant
+
+
+class KeyTest(unittest.TestCase):
+
+    def test_extractor_id_is_stable(self):
+        self.assertEqual(extractor_id(extract), extractor_id(extract))
+        self.assertEqual(extractor_id(functools.partial(extract, engine="bs4")),
+                         extractor_id(functools.partial(extract, engine="bs4")))
+
+    def test_extractors_never_share_an_id(self):
+        ids = {
+            extractor_id(extract),
+            extractor_id(other_extract),
+            extractor_id(functools.partial(extract, engine="lxml")),
+            extractor_id(functools.partial(extract, engine="bs4")),
+            extractor_id(variant("lxml")),
+            extractor_id(variant("bs4")),
+        }
+        self.assertEqual(len(ids), 6)
+
+    def test_nested_partials_merge_keywords(self):
+        nested = functools.partial(functools.partial(extract, engine="lxml"), engine="bs4")
+        self.assertEqual(extractor_id(nested), extractor_id(functools.partial(extract, engine="bs4")))
+
+    def test_content_key(self):
+        key = content_key(DATA, "tables", extract)
+        self.assertTrue(key.startswith(f"tables-v{CACHE_VERSION}-{extractor_id(extract)}-"))
+        self.assertEqual(key, content_key(DATA, "tables", extract))
+        self.assertNotEqual(key, content_key(DATA, "records", extract))
+        self.assertNotEqual(key, content_key(DATA + b" ", "tables", extract))
+        self.assertNotEqual(key, content_key(DATA, "tables", other_extract))
+        self.assertEqual(content_key(DATA, "tables"), f"tables-v{CACHE_VERSION}-" + key.rsplit("-", 1)[1])
+
+
+class TableCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_dataframe_round_trip_through_disk(self):
+        df = pd.DataFrame({"L": ["a", "b"], "2020": [1.0, None]})
+        df.attrs["coerce_failures"] = 1
+        TableCache("tables", directory=self.directory).put("k", df)
+
+        stored = TableCache("tables", directory=self.directory).get("k")
+        pd.testing.assert_frame_equal(stored, df)
+        self.assertEqual(stored.attrs, {"coerce_failures": 1})
+
+    def test_copies_are_handed_out(self):
+        cache = TableCache("records", directory=self.directory)
+        cache.put("k", [{"L": "a", "2020": "1"}])
+        cache.get("k")[0]["L"] = "changed"
+        self.assertEqual(cache.get("k")[0]["L"], "a")
+
+    def test_errors_and_ragged_records_are_not_cached(self):
+        cache = TableCache("records", directory=self.directory)
+        cache.put("error", "Error reading table: boom")
+        cache.put("ragged", [{"L": "a", "2020": "1"}, {"L": "b"}])
+        self.assertIsNone(cache.get("error"))
+        self.assertIsNone(cache.get("ragged"))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_disk_budget(self):
+        cache = TableCache("records", directory=self.directory, max_mb=1, hot_entries=1)
+        big = [{"L": "x" * 1000, "2020": str(i)} for i in range(400)]
+        for i in range(5):
+            cache.put(f"k{i}", big)
+        total = sum(entry.stat().st_size for entry in os.scandir(self.directory))
+        self.assertLessEqual(total, 1024 * 1024)
+        self.assertIsNotNone(cache.get("k4"))
+
+    def test_without_disk_tier(self):
+        cache = TableCache("records", directory=os.path.join(self.directory, "none"), max_mb=0)
+        cache.put("k", [{"L": "a"}])
+        self.assertEqual(cache.get("k"), [{"L": "a"}])
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "none")))
+
+
+if __name__ == "__main__":
+    unittest.main()
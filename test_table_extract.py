@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Tests that the lxml table engine gives the same cleaned tables as the BeautifulSoup one
+
+    python -m unittest test_table_extract
+"""
+import unittest
+from io import BytesIO
+
+import pandas as pd
+
+import table_extract
+from benchmarks.generate import statement_html
+
+CASES = {
+    "spans": (
+        "<table><tr><th>Label</th><th colspan=2>2020</th></tr>"
+        "<tr><td rowspan=2>Revenue</td><td>1,000</td><td>2,000</td></tr>"
+        "<tr><td>3,000</td><td>(4,000)</td></tr></table>"
+    ),
+    "no_thead": "<table><tr><th>Label</th><th>2020</th></tr><tr><td>Revenue</td><td>1,000</td></tr></table>",
+    "hidden": (
+        "<table><style>td { color: red }</style><thead><tr><th>Label</th><th>2020</th></tr></thead><tbody>"
+        "<tr><td>Net<br>revenue</td><td>1,000</td></tr>"
+        "<tr style='display: none'><td>Hidden</td><td>9</td></tr>"
+        "<tr><td>Gross<span style='display:none'>x</span> profit</td><td>(2,000)</td></tr></tbody></table>"
+    ),
+    "missing": (
+        "<table><thead><tr><th>Label</th><th>2020</th></tr></thead><tbody>"
+        "<tr><td>NA</td><td>n/a</td></tr><tr><td>Revenue</td><td>-</td></tr><tr><td></td><td>N/A</td></tr></tbody></table>"
+    ),
+    "footer": (
+        "<table><thead><tr><th>Label</th><th>2020</th></tr></thead><tbody><tr><td>Revenue</td><td>1</td></tr></tbody>"
+        "<tfoot><tr><td>Total</td><td>2</td></tr></tfoot></table>"
+    ),
+}
+
+
+def extract_both(html):
+    return [table_extract.extract_tables_from_html(html, engine=engine) for engine in ("lxml", "bs4")]
+
+
+class EngineEquivalenceTest(unittest.TestCase):
+
+    def assertSameTables(self, lxml_df, bs4_df):
+        pd.testing.assert_frame_equal(lxml_df, bs4_df)
+        self.assertEqual(lxml_df.attrs, bs4_df.attrs)
+
+    def test_generated_statements(self):
+        for seed in range(5):
+            for multiindex in (True, False):
+                with self.subTest(seed=seed, multiindex=multiindex):
+                    html = statement_html(rows=30, years=4, multiindex=multiindex, seed=seed)
+                    self.assertSameTables(*extract_both(html))
+
+    def test_table_shapes(self):
+        for name, html in CASES.items():
+            with self.subTest(name):
+                self.assertSameTables(*extract_both(html))
+
+    def test_lxml_reads_a_file_object(self):
+        html = statement_html(rows=10, years=3)
+        from_text = table_extract.extract_tables_from_html(html, engine="lxml")
+        from_file = table_extract.extract_tables_from_html(BytesIO(html.encode("utf-8")), engine="lxml")
+        pd.testing.assert_frame_equal(from_text, from_file)
+
+    def test_no_table(self):
+        for engine in table_extract.ENGINES:
+            self.assertEqual(table_extract.extract_tables_from_html("<p>none</p>", engine=engine), "No tables found in HTML file.")
+
+
+if __name__ == "__main__":
+    unittest.main()
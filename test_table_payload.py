@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Tests for the columnar table payload and response compression
+
+    python -m unittest test_table_payload
+"""
+import gzip
+import json
+import math
+import unittest
+
+import pandas as pd
+
+from table_payload import (COLUMNAR, Records, accepted_encodings, columnar_table, encode_json, format_tables,
+                           records_from_table)
+
+RECORDS = [
+    {"Fiscal Year End": "Net revenue", "2020": 1234, "2021": -5.5},
+    {"Fiscal Year End": "Audit Status", "2020": "Audited", "2021": None},
+]
+
+
+class ColumnarTableTest(unittest.TestCase):
+
+    def test_records(self):
+        table = columnar_table(RECORDS)
+        self.assertEqual(table["columns"], ["Fiscal Year End", "2020", "2021"])
+        self.assertEqual(table["types"], ["string", "string", "number"])
+        self.assertEqual(table["data"], [["Net revenue", "Audit Status"], [1234, "Audited"], [-5.5, None]])
+
+    def test_records_round_trip(self):
+        self.assertEqual(records_from_table(columnar_table(RECORDS)), RECORDS)
+        self.assertEqual(records_from_table(Records(RECORDS)), RECORDS)
+
+    def test_dataframe(self):
+        df = pd.DataFrame({"Label": ["a", None], "2020": [1.0, math.nan], "2021": [3, 4]})
+        table = columnar_table(df)
+        self.assertEqual(table["columns"], ["Label", "2020", "2021"])
+        self.assertEqual(table["types"], ["string", "number", "number"])
+        self.assertEqual(table["data"], [["a", None], [1.0, None], [3, 4]])
+        # Missing values become null, so the payload is valid JSON
+        json.dumps(table, allow_nan=False)
+
+    def test_nan_in_records(self):
+        self.assertEqual(columnar_table([{"a": math.nan}])["data"], [[None]])
+
+    def test_other_tables_pass_through(self):
+        error = {"error": "No tables found in HTML file."}
+        self.assertIs(columnar_table(error), error)
+        self.assertEqual(columnar_table([]), {"columns": [], "types": [], "data": []})
+
+    def test_format_tables(self):
+        payload = {"tables": {"a.html": RECORDS}, "result_id": "x"}
+        self.assertIs(format_tables(payload), payload)
+        formatted = format_tables(payload, COLUMNAR)
+        self.assertEqual(formatted["result_id"], "x")
+        self.assertEqual(formatted["tables"]["a.html"], columnar_table(RECORDS))
+
+
+class EncodingTest(unittest.TestCase):
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings("gzip, deflate, br;q=0"), {"gzip", "deflate"})
+        self.assertEqual(accepted_encodings("GZip;q=0.5"), {"gzip"})
+        self.assertEqual(accepted_encodings(None), set())
+
+    def test_small_bodies_are_not_compressed(self):
+        body, headers = encode_json({"a": 1}, "gzip")
+        self.assertEqual(body, b'{"a":1}')
+        self.assertEqual(headers, {"Vary": "Accept-Encoding"})
+
+    def test_gzip_is_deterministic(self):
+        payload = {"tables": {"a.html": RECORDS * 100}}
+        body, headers = encode_json(payload, "gzip;q=1, br;q=0")
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(body)), payload)
+        self.assertEqual(body, encode_json(payload, "gzip")[0])
+
+    def test_identity_when_not_accepted(self):
+        payload = {"tables": {"a.html": RECORDS * 100}}
+        body, headers = encode_json(payload, "identity")
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual(json.loads(body), payload)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Tests that server-rendered table cells match the page's formatter (static/js/table-format.js)
+
+    python -m unittest test_table_render
+
+The comparison runs table-format.js in node; it is skipped without node.
+"""
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import unittest
+
+import table_render
+
+TABLE_FORMAT_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "js", "table-format.js")
+
+# Reads {"numbers": [...], "cells": [[value, fiscalYear], ...]} on stdin; non-finite numbers come as strings
+NODE_SCRIPT = """
+const fs = require('fs');
+const source = fs.readFileSync(process.argv[1], 'utf8');
+const { formatCell } = new Function(source + '\\nreturn { formatCell };')();
+const input = JSON.parse(fs.readFileSync(0, 'utf8'));
+const number = v => (typeof v === 'string' && /^-?Infinity$|^NaN$/.test(v)) ? Number(v) : v;
+process.stdout.write(JSON.stringify({
+    strings: input.numbers.map(v => String(number(v))),
+    cells: input.cells.map(([value, fiscalYear]) => formatCell(value, fiscalYear)),
+}));
+"""
+
+NUMBERS = [
+    1, -1, 100.0, 0.5, 0.1 + 0.2, 1234567.891, -0.004, 1e-4, 1e-5, 1.5e-7, 1e-6, 9.99e-7,
+    1e15, 1e16, 1.5e16, 123456789012345680.0, 9.99e20, 1e21, 1.2e22, 5e-324, 1.7976931348623157e308,
+    math.inf, -math.inf, math.nan,
+]
+
+
+def node_format(numbers, cells):
+    payload = {
+        "numbers": [v if math.isfinite(v) else repr(v).replace("inf", "Infinity").replace("nan", "NaN") for v in numbers],
+        "cells": cells,
+    }
+    result = subprocess.run(
+        ["node", "-e", NODE_SCRIPT, TABLE_FORMAT_JS],
+        input=json.dumps(payload), capture_output=True, text=True, check=True, timeout=60,
+    )
+    return json.loads(result.stdout)
+
+
+@unittest.skipUnless(shutil.which("node"), "node is not installed")
+class BrowserFormatTest(unittest.TestCase):
+
+    def test_number_strings(self):
+        rng = random.Random(0)
+        numbers = NUMBERS + [rng.uniform(-1e6, 1e6) for _ in range(200)]
+        numbers += [10 ** rng.uniform(-9, 24) for _ in range(200)]
+        expected = node_format(numbers, [])["strings"]
+        self.assertEqual([table_render._js_number_string(float(v)) for v in numbers], expected)
+        finite = [v for v in numbers if math.isfinite(v)]
+        self.assertEqual(list(table_render._js_number(finite)), [s for v, s in zip(numbers, expected) if math.isfinite(v)])
+
+    def test_cells(self):
+        values = [1234567.891, -0.004, 0.999, 1e-7, -1e-7, 1e21, 1.2345e22, "2.5e-3", "1,234", "(1,234)",
+                  "1234.5678", "-12", "abc & co", "AuditedAudited", "", 0, None, True, 2020]
+        cells = [[v, fiscal_year] for fiscal_year in (False, True) for v in values]
+        expected = node_format([], cells)["cells"]
+        rendered = []
+        for header in ("31-Dec-2020", "Fiscal Year"):
+            rendered.extend(table_render._browser_cells(values, header).tolist())
+        self.assertEqual(rendered, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Tests for the extraction pool: per-member timeouts and pool replacement
+
+    python -m unittest test_zip_processing
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest import mock
+
+import request_profile
+import zip_processing
+
+
+def extract(text):
+    # Module level so the pool can pickle it; "stuck" members never finish in time
+    if text.startswith("stuck"):
+        time.sleep(60)
+    if text.startswith("slow"):
+        time.sleep(0.3)
+    if text.startswith("nap"):
+        time.sleep(1.5)
+    return text.upper()
+
+
+def make_zip(contents):
+    archive = BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_ref:
+        for i, text in enumerate(contents):
+            zip_ref.writestr(f"member{i}.html", text)
+    archive.seek(0)
+    return archive
+
+
+def stop_pool():
+    with zip_processing._pool_lock:
+        pool, zip_processing._pool = zip_processing._pool, None
+    if pool is not None:
+        pool.terminate()
+
+
+class PoolTimeoutTest(unittest.TestCase):
+
+    def tearDown(self):
+        stop_pool()
+
+    def test_stuck_member_times_out_and_pool_is_replaced(self):
+        contents = ["ok a", "stuck", "ok b", "ok c"]
+        tables = zip_processing.process_zip_file(make_zip(contents), extract, parallel=True, workers=2, timeout=1)
+        self.assertTrue(tables["member1.html"].startswith("Timed out after 1s"))
+        self.assertEqual(tables["member0.html"], "OK A")
+        self.assertEqual(tables["member3.html"], "OK C")
+        self.assertEqual(tables["member2.html"], "OK B")
+
+        # The stuck pool was retired and a running one took its place
+        pool = zip_processing._pool
+        self.assertIsNotNone(pool)
+        self.assertNotIn(pool, zip_processing._retired)
+        self.assertEqual(pool.apply_async(extract, ("ok",)).get(5), "OK")
+
+    def test_timeout_counts_from_submission(self):
+        # Both members start together; the stuck one is not given 2s more after the nap ends
+        started = time.monotonic()
+        tables = zip_processing.process_zip_file(make_zip(["nap", "stuck"]), extract, parallel=True, workers=2, timeout=2)
+        elapsed = time.monotonic() - started
+        self.assertEqual(tables["member0.html"], "NAP")
+        self.assertTrue(tables["member1.html"].startswith("Timed out after 2s"))
+        self.assertLess(elapsed, 3.2)
+
+    def test_concurrent_request_survives_another_requests_timeout(self):
+        results = {}
+
+        def run(name, contents):
+            try:
+                results[name] = zip_processing.process_zip_file(
+                    make_zip(contents), extract, parallel=True, workers=2, timeout=1,
+                )
+            except Exception as e:
+                results[name] = e
+
+        slow = [f"slow {i}" for i in range(8)]
+        threads = [
+            threading.Thread(target=run, args=("stuck", ["stuck", "ok"])),
+            threading.Thread(target=run, args=("slow", slow)),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+
+        self.assertNotIsInstance(results["slow"], Exception)
+        self.assertEqual(list(results["slow"].values()), [text.upper() for text in slow])
+        self.assertTrue(results["stuck"]["member0.html"].startswith("Timed out"))
+
+    def test_submit_after_pool_was_retired(self):
+        pool = zip_processing._get_pool(2)
+        zip_processing._retire_pool(pool)
+        self.assertIsNot(zip_processing._pool, pool)
+
+        # A request still holding the old pool resubmits to the new one
+        new_pool, async_result = zip_processing._submit(2, extract, b"ok")
+        self.assertIs(new_pool, zip_processing._pool)
+        self.assertEqual(async_result.get(5)[0], "OK")
+
+        # Retiring a pool twice, or one that is no longer current, leaves the current pool alone
+        zip_processing._retire_pool(pool)
+        self.assertIs(zip_processing._pool, new_pool)
+
+    def test_serial_path_has_no_pool(self):
+        tables = zip_processing.process_zip_file(make_zip(["ok a", "ok b"]), extract, parallel=False)
+        self.assertEqual(tables, {"member0.html": "OK A", "member1.html": "OK B"})
+        self.assertIsNone(zip_processing._pool)
+
+
+class PoolProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(request_profile, "PROFILE_DIR", self.tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def tearDown(self):
+        stop_pool()
+
+    def profile_meta(self, profile):
+        with open(os.path.join(self.tmp.name, profile.id + request_profile.KINDS["meta"]), encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_pool_stage_times_are_in_the_profile(self):
+        with request_profile.RequestProfile("POST", "/upload") as profile:
+            zip_processing.process_zip_file(make_zip(["ok a", "ok b"]), extract, parallel=True, workers=2, timeout=10)
+        meta = self.profile_meta(profile)
+        self.assertEqual(meta["pool_members"], 2)
+        self.assertIn("member_decode", meta["pool_stage_seconds"])
+
+    def test_work_in_an_executor_thread(self):
+        def work():
+            return zip_processing.process_zip_file(make_zip(["ok a"]), extract, parallel=True, workers=1, timeout=10)
+
+        with request_profile.RequestProfile("POST", "/upload", track=False) as profile:
+            with ThreadPoolExecutor(1) as executor:
+                executor.submit(profile.traced(work)).result()
+        self.assertEqual(self.profile_meta(profile)["pool_members"], 1)
+        self.assertIsNone(request_profile.current())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+import multiprocessing
+import os
+import threading
+import time
+import weakref
+import zipfile
+from collections import deque
+from io import BytesIO
+
+import metrics
+import request_profile
+
+# Pool size; 0 means one worker per core
+MAX_WORKERS = int(os.environ.get("FS_ZIP_WORKERS", "0")) or os.cpu_count() or 1
+# Below this many HTML members, starting work in the pool costs more than it saves
+PARALLEL_MIN_MEMBERS = int(os.environ.get("FS_PARALLEL_MIN_MEMBERS", "8"))
+# Seconds one member may take in the pool before it is reported as failed.
+# Serial extraction runs in the request's thread and cannot be stopped; there
+# only the server's request timeout (FS_REQUEST_TIMEOUT under gunicorn) applies
+MEMBER_TIMEOUT = float(os.environ.get("FS_MEMBER_TIMEOUT", "60"))
+# Seconds between checks, while waiting on a member, that its pool is still running
+RETIRED_POLL = 0.5
+
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+# Pools terminated because a member got stuck; members still waiting on them are resubmitted
+_retired = weakref.WeakSet()
+
+
+class _PoolRetired(Exception):
+    pass
+
+
+def _get_pool(workers):
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != workers:
+            if _pool is not None:
+                # Other requests may still be waiting on it; it exits once their members are done
+                _pool.close()
+            _pool = multiprocessing.Pool(workers)
+            _pool_size = workers
+        return _pool
+
+
+def start_pool(workers=None):
+    """Start the extraction pool ahead of the first large archive; nothing to do with one worker"""
+    workers = workers or MAX_WORKERS
+    if workers > 1:
+        _get_pool(workers)
+
+
+def _retire_pool(pool):
+    """Kill a pool whose workers may be stuck, putting a fresh one in its place
+
+    Only the first request to give up on a pool terminates it; requests
+    with members still in it resubmit them to the new pool.
+    """
+    global _pool
+    with _pool_lock:
+        if pool in _retired:
+            return
+        _retired.add(pool)
+        if _pool is pool:
+            _pool = multiprocessing.Pool(_pool_size)
+    pool.terminate()
+
+
+def _submit(workers, extract, data):
+    """(pool, async result) of ``data`` sent to the current pool"""
+    while True:
+        pool = _get_pool(workers)
+        try:
+            return pool, pool.apply_async(_extract_member, (extract, data))
+        except ValueError:
+            # "Pool not running": another request retired it a moment ago
+            if pool not in _retired:
+                raise
+
+
+def _wait(pool, async_result, deadline):
+    """The member's result by ``deadline`` (time.monotonic); raises multiprocessing.TimeoutError,
+    or _PoolRetired if another request killed its pool"""
+    while True:
+        left = deadline - time.monotonic()
+        try:
+            # A result that is already there is taken even past the deadline
+            return async_result.get(max(0, min(left, RETIRED_POLL)))
+        except multiprocessing.TimeoutError:
+            if pool in _retired:
+                raise _PoolRetired
+            if left <= 0:
+                raise
+
+
+def _extract_member(extract, data):
+    # Runs in a worker: its timings go back to the serving process with the result
+    with metrics.collect() as observations:
+        with metrics.stage("member_decode"):
+            text = data.decode("utf-8")
+        result = extract(text)
+    return result, observations
+
+
+def _read_member(zip_ref, html_file, decode=False):
+    """A member's bytes inflated from the archive, or its text with ``decode``"""
+    with metrics.stage("member_decode"):
+        data = zip_ref.read(html_file)
+        size = len(data)
+        if decode:
+            data = data.decode("utf-8")
+    metrics.add_bytes("member_decode", size)
+    return data
+
+
+def open_zip(zip_file):
+    """zipfile.ZipFile over ``zip_file``, timed; raises zipfile.BadZipFile like it"""
+    with metrics.stage("zip_open"):
+        return zipfile.ZipFile(zip_file, "r")
+
+
+def html_members(zip_ref):
+    return [f for f in zip_ref.namelist() if f.lower().endswith(".html")]
+
+
+def iter_zip_tables(zip_ref, extract, parallel=None, workers=None, timeout=None, stream=False, cache=None):
+    """Yield (member name, extract result) for every HTML member, in archive order
+
+    ``extract`` must be a module-level function so it can be sent to the
+    pool. ``parallel=None`` picks the pool only for archives with at least
+    PARALLEL_MIN_MEMBERS HTML files. The per-member timeout only applies in
+    parallel mode and counts from when the member is sent to the pool (or,
+    for members queued behind ``workers`` others, from when a slot frees
+    up); a member that exceeds it yields an error message and its pool is
+    replaced. Serial extraction has no per-member limit.
+    With ``stream=True`` the serial path hands ``extract`` the open member
+    instead of its decoded text, so it can stop reading early.
+    With a TableCache, members whose content was seen before are not parsed.
+    """
+    members = html_members(zip_ref)
+    workers = workers or MAX_WORKERS
+    timeout = MEMBER_TIMEOUT if timeout is None else timeout
+    if parallel is None:
+        parallel = workers > 1 and len(members) >= PARALLEL_MIN_MEMBERS
+
+    if not parallel:
+        for html_file in members:
+            if cache is None and stream:
+                # Inflating the member is part of parsing here
+                with zip_ref.open(html_file) as file:
+                    result = extract(file)
+                metrics.count_table(result)
+                yield html_file, result
+                continue
+            if cache is None:
+                result = extract(_read_member(zip_ref, html_file, decode=True))
+                metrics.count_table(result)
+                yield html_file, result
+                continue
+            data = _read_member(zip_ref, html_file)
+            key = cache.key(data, extract)
+            result = cache.get(key)
+            if result is not None:
+                metrics.count_table(result, cached=True)
+                yield html_file, result
+                continue
+            result = extract(BytesIO(data) if stream else data.decode("utf-8"))
+            cache.put(key, result)
+            metrics.count_table(result)
+            yield html_file, result
+        return
+
+    # Keep only a few members in flight so the archive is never fully in memory
+    window = workers * 2
+    pending = deque()
+    remaining = iter(members)
+
+    def submit_next():
+        html_file = next(remaining, None)
+        if html_file is None:
+            return
+        data = _read_member(zip_ref, html_file)
+        key = cache.key(data, extract) if cache is not None else None
+        cached = cache.get(key) if key is not None else None
+        if cached is not None:
+            pending.append([html_file, key, None, None, None, None, cached])
+            return
+        pool, async_result = _submit(workers, extract, data)
+        pending.append([html_file, key, data, pool, async_result, None, None])
+
+    def start_clocks():
+        # A member's time starts when it is sent to the pool, not when the loop
+        # gets to it; members queued behind ``workers`` others wait for a slot first
+        running = 0
+        for entry in pending:
+            if entry[4] is None:
+                continue
+            if running == workers:
+                break
+            if entry[5] is None:
+                entry[5] = time.monotonic() + timeout
+            running += 1
+
+    for _ in range(window):
+        submit_next()
+    start_clocks()
+    while pending:
+        html_file, key, data, pool, async_result, deadline, result = pending.popleft()
+        submit_next()
+        while async_result is not None:
+            try:
+                result, observations = _wait(pool, async_result, deadline)
+            except _PoolRetired:
+                pool, async_result = _submit(workers, extract, data)
+                deadline = time.monotonic() + timeout
+                continue
+            except multiprocessing.TimeoutError:
+                _retire_pool(pool)
+                result = f"Timed out after {timeout:g}s while extracting {html_file}"
+            else:
+                metrics.record(observations)
+                request_profile.add_pool_observations(observations)
+                if key is not None:
+                    cache.put(key, result)
+            break
+        # Its slot in the pool is free for the next member
+        start_clocks()
+        metrics.count_table(result, cached=data is None)
+        yield html_file, result
+
+
+def process_zip_file(zip_file, extract, parallel=None, workers=None, timeout=None, stream=False, cache=None):
+    """Extract every HTML member of a ZIP; return {name: result} or None if it is not a ZIP
+
+    ``zip_file`` can be any seekable binary file, e.g. a spooled upload or
+    a memory-mapped download, so the archive is never copied into memory.
+    """
+    html_tables = {}
+    try:
+        with open_zip(zip_file) as zip_ref:
+            for html_file, result in iter_zip_tables(zip_ref, extract, parallel, workers, timeout, stream, cache):
+                html_tables[html_file] = result
+    except zipfile.BadZipFile:
+        return None
+    return html_tables